@@ -0,0 +1,114 @@
+"""Throughput of concurrent requests on the sync (threads + ConnectionPool) and async (asyncio +
+AsyncConnectionPool) data-access paths.
+
+A request loads a random user by ID and all of their messages. Both paths run the same number of
+requests with the same number of concurrent workers; the user cache is off. Needs a seeded database
+(e.g. python -m Fake_data.fack_data --bulk --records 100000) and psycopg 3 for the async path.
+
+Run from the repository root: python -m Benchmarks.bench_async [--requests N] [--concurrency 1 10 50]
+
+Przepustowość współbieżnych żądań w ścieżce synchronicznej (wątki + ConnectionPool) i asynchronicznej
+(asyncio + AsyncConnectionPool). Żądanie wczytuje losowego użytkownika i wszystkie jego wiadomości.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import random
+import time
+
+import connection_db
+from async_models import AsyncUser, AsyncMessage, connect as async_connect, close_pool
+from Benchmarks.stats import summarize
+from connection_db import connect
+from models import User, Message
+
+
+def sync_request(user_id):
+    started = time.perf_counter()
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            User.load_user_by_id(cursor, user_id)
+            Message.load_all_messages(cursor, user_id)
+    return time.perf_counter() - started
+
+
+def run_sync(user_ids, concurrency):
+    """Run the requests on a thread pool of `concurrency` workers; return (latencies, elapsed)."""
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(sync_request, user_ids))
+    return latencies, time.perf_counter() - started
+
+
+async def async_request(user_id):
+    started = time.perf_counter()
+    async with async_connect() as conn:
+        await AsyncUser.load_user_by_id(conn, user_id)
+        await AsyncMessage.load_all_messages(conn, user_id)
+    return time.perf_counter() - started
+
+
+async def run_async(user_ids, concurrency):
+    """Run the requests on `concurrency` worker tasks; return (latencies, elapsed)."""
+    queue = iter(user_ids)
+    latencies = []
+
+    async def worker():
+        for user_id in queue:  # Wspólny iterator - każde ID pobiera dokładnie jedno zadanie
+            latencies.append(await async_request(user_id))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+async def benchmark_async(levels):
+    results = {}
+    try:
+        for concurrency, user_ids in levels:
+            await run_async(user_ids[:concurrency], concurrency)  # rozgrzewka: otwarcie połączeń
+            results[concurrency] = summarize(*await run_async(user_ids, concurrency))
+    finally:
+        await close_pool()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Żądania współbieżne: ścieżka synchroniczna a asynchroniczna.")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    User.disable_cache()
+    AsyncUser.disable_cache()
+    # Obie pule mogą otworzyć tyle połączeń, ilu jest równoczesnych wykonawców
+    connection_db.pool_settings['max_size'] = max(args.concurrency)
+
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT min(id), max(id) FROM users")
+            min_id, max_id = cursor.fetchone()
+    if min_id is None:
+        raise SystemExit("Baza jest pusta - najpierw uruchom python -m Fake_data.fack_data.")
+
+    rng = random.Random(args.seed)
+    levels = [(concurrency, [rng.randint(min_id, max_id) for _ in range(args.requests)])
+              for concurrency in args.concurrency]
+
+    results = {'sync': {}, 'async': asyncio.run(benchmark_async(levels))}
+    for concurrency, user_ids in levels:
+        run_sync(user_ids[:concurrency], concurrency)  # rozgrzewka
+        results['sync'][concurrency] = summarize(*run_sync(user_ids, concurrency))
+
+    print(f"{'współbieżność':>14} {'sync ops/s':>12} {'async ops/s':>12} {'sync p95 ms':>12} {'async p95 ms':>13}")
+    for concurrency in args.concurrency:
+        sync, async_ = results['sync'][concurrency], results['async'][concurrency]
+        print(f"{concurrency:>14} {sync['ops_per_sec']:>12.0f} {async_['ops_per_sec']:>12.0f} "
+              f"{sync['p95_ms']:>12.2f} {async_['p95_ms']:>13.2f}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
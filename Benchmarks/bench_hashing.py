@@ -0,0 +1,48 @@
+"""Throughput of bulk password hashing and checking per number of worker processes.
+
+Needs no database.
+
+Run from the repository root: python -m Benchmarks.bench_hashing [--passwords N]
+
+Przepustowość masowego hashowania i sprawdzania haseł w zależności od liczby procesów.
+"""
+import argparse
+import os
+import time
+
+from models import hash_password, hash_passwords, check_passwords
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Przepustowość hash_passwords/check_passwords.")
+    parser.add_argument('--passwords', type=int, default=500_000)
+    args = parser.parse_args()
+
+    passwords = [f'password{i}' for i in range(args.passwords)]
+
+    started = time.perf_counter()
+    for password in passwords:
+        hash_password(password)
+    baseline = args.passwords / (time.perf_counter() - started)
+    print(f"hash_password w pętli: {baseline:12,.0f} haseł/s")
+
+    workers = 1
+    cpu_count = os.cpu_count() or 1
+    while True:
+        started = time.perf_counter()
+        hashed = hash_passwords(passwords, workers=workers)
+        hash_rate = args.passwords / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        assert all(check_passwords(zip(passwords, hashed), workers=workers))
+        check_rate = args.passwords / (time.perf_counter() - started)
+
+        print(f"procesy: {workers:3}  hash_passwords: {hash_rate:12,.0f} haseł/s  "
+              f"check_passwords: {check_rate:12,.0f} haseł/s")
+        if workers >= cpu_count:
+            break
+        workers = min(workers * 2, cpu_count)
+
+
+if __name__ == "__main__":
+    main()
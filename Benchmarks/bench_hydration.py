@@ -0,0 +1,64 @@
+"""Per-row cost of turning database rows into User and Message objects.
+
+Compares the way the load_* methods used to build objects (User() hashing an empty password,
+Message() calling datetime.now()) with the from_row constructors. Needs no database.
+
+Run from the repository root: python -m Benchmarks.bench_hydration [--rows N]
+
+Koszt zamiany wierszy z bazy na obiekty User i Message: dawny sposób a konstruktory from_row.
+"""
+import argparse
+import datetime
+import time
+
+from models import User, Message, hash_password
+
+
+def old_user(row):
+    id_, username, hashed_password = row
+    loaded_user = User()
+    loaded_user._id = id_
+    loaded_user.username = username
+    loaded_user._hashed_password = hashed_password
+    return loaded_user
+
+
+def old_message(row):
+    id_, from_id, to_id, text, creation_date, read_at = row
+    loaded_message = Message(from_id, to_id, text, creation_date)
+    loaded_message._id = id_
+    loaded_message.read_at = read_at
+    return loaded_message
+
+
+def per_row_cost(build, rows, repeat=3):
+    """Return the best-of-`repeat` time per row, in microseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for row in rows:
+            build(row)
+        best = min(best, time.perf_counter() - started)
+    return best / len(rows) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Koszt hydratacji wierszy User/Message.")
+    parser.add_argument('--rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    now = datetime.datetime.now()
+    user_rows = [(i, f'user{i}', hash_password(f'password{i}', 'salt')) for i in range(args.rows)]
+    message_rows = [(i, i % 1000, (i * 7) % 1000, f'message text {i}', now, None) for i in range(args.rows)]
+
+    for name, rows, before, after in (
+            ("User", user_rows, old_user, User.from_row),
+            ("Message", message_rows, old_message, Message.from_row)):
+        old_cost = per_row_cost(before, rows)
+        new_cost = per_row_cost(after, rows)
+        print(f"{name:8} przed: {old_cost:6.3f} us/wiersz  po (from_row): {new_cost:6.3f} us/wiersz  "
+              f"przyspieszenie: {old_cost / new_cost:4.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Memory per User and Message object: dict-backed classes versus the slotted models.
+
+The dict-backed classes below have the same attributes as the models had before __slots__.
+Needs no database.
+
+Run from the repository root: python -m Benchmarks.bench_memory [--objects N]
+
+Pamięć na obiekt User i Message: klasy z __dict__ a modele z __slots__.
+"""
+import argparse
+import datetime
+import tracemalloc
+
+from models import User, Message
+
+
+class DictUser:
+    def __init__(self, id_, username, hashed_password):
+        self._id = id_
+        self.username = username
+        self._hashed_password = hashed_password
+
+
+class DictMessage:
+    def __init__(self, id_, from_id, to_id, text, creation_date, read_at):
+        self._id = id_
+        self.from_id = from_id
+        self.to_id = to_id
+        self.text = text
+        self.creation_date = creation_date
+        self.read_at = read_at
+
+
+def bytes_per_object(build, rows):
+    """Return the memory allocated per object built from rows (the rows themselves are not counted)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [build(row) for row in rows]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Lista wskaźników na obiekty jest wspólna dla obu wariantów - odejmujemy ją
+    per_object = (after - before) / len(objects) - 8
+    del objects
+    return per_object
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pamięć na obiekt User/Message.")
+    parser.add_argument('--objects', type=int, default=200_000)
+    args = parser.parse_args()
+
+    now = datetime.datetime.now()
+    user_rows = [(i, f'user{i}', f'{i:016d}{"0" * 64}') for i in range(args.objects)]
+    message_rows = [(i, i % 1000, (i * 7) % 1000, f'message text {i}', now, None) for i in range(args.objects)]
+
+    for name, rows, before, after in (
+            ("User", user_rows, lambda row: DictUser(*row), User.from_row),
+            ("Message", message_rows, lambda row: DictMessage(*row), Message.from_row)):
+        dict_size = bytes_per_object(before, rows)
+        slots_size = bytes_per_object(after, rows)
+        print(f"{name:8} __dict__: {dict_size:6.1f} B/obiekt  __slots__: {slots_size:6.1f} B/obiekt  "
+              f"oszczędność: {(1 - slots_size / dict_size) * 100:4.1f}%")
+
+
+if __name__ == "__main__":
+    main()
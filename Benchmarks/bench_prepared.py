@@ -0,0 +1,70 @@
+"""Latency per call of the hot models.py queries with and without prepared statements.
+
+Needs a database seeded with users and messages (e.g. python -m Fake_data.fack_data --bulk --records 100000).
+Inserts done by the benchmark are rolled back at the end.
+
+Run from the repository root: python -m Benchmarks.bench_prepared [--calls N]
+
+Opóźnienie jednego wywołania gorących zapytań models.py z przygotowanymi zapytaniami i bez nich.
+"""
+import argparse
+import random
+import time
+
+from connection_db import connect, use_prepared_statements
+from models import User, Message
+
+
+def operations(cursor, rng, min_id, max_id, min_message_id, max_message_id):
+    """Return (name, callable) pairs exercising the prepared queries."""
+    return [
+        ("User.load_user_by_id", lambda: User.load_user_by_id(cursor, rng.randint(min_id, max_id))),
+        ("Message.load_message_by_id",
+         lambda: Message.load_message_by_id(cursor, rng.randint(min_message_id, max_message_id))),
+        ("Message.load_messages_page", lambda: Message.load_messages_page(cursor, rng.randint(min_id, max_id))),
+        ("Message.save_to_db (INSERT)",
+         lambda: Message(rng.randint(min_id, max_id), rng.randint(min_id, max_id), "benchmark").save_to_db(cursor)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PREPARE/EXECUTE a zapytania wysyłane jako tekst.")
+    parser.add_argument('--calls', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    User.disable_cache()
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT min(id), max(id) FROM users")
+            min_id, max_id = cursor.fetchone()
+            cursor.execute("SELECT min(id), max(id) FROM messages")
+            min_message_id, max_message_id = cursor.fetchone()
+        if min_id is None or min_message_id is None:
+            raise SystemExit("Baza jest pusta - najpierw uruchom python -m Fake_data.fack_data.")
+
+        # Jedna transakcja wycofywana na końcu - wiadomości wstawione przez benchmark nie zostają w bazie
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cursor:
+                results = {}
+                for enabled in (False, True):
+                    conn.statements.enabled = enabled
+                    rng = random.Random(args.seed)
+                    for name, operation in operations(cursor, rng, min_id, max_id, min_message_id, max_message_id):
+                        operation()  # rozgrzewka (i PREPARE przy włączonym rejestrze)
+                        started = time.perf_counter()
+                        for _ in range(args.calls):
+                            operation()
+                        results.setdefault(name, {})[enabled] = (time.perf_counter() - started) / args.calls
+        finally:
+            conn.rollback()
+            conn.autocommit = True
+            conn.statements.enabled = use_prepared_statements
+
+    for name, timings in results.items():
+        print(f"{name:30} tekst: {timings[False] * 1e6:8.1f} us  PREPARE/EXECUTE: "
+              f"{timings[True] * 1e6:8.1f} us  ({timings[False] / timings[True]:4.2f}x)")
+
+if __name__ == "__main__":
+    main()
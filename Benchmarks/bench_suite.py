@@ -0,0 +1,169 @@
+"""Benchmark suite for the data-access layer against a local PostgreSQL.
+
+For every size it creates (once) a database bench_<messages>, applies the migrations, seeds it with the
+Fake_data bulk loader and times the models.py operations and connect() overhead. Results are written
+as JSON (p50/p95/p99 latencies and throughput per operation) to compare commits.
+
+Run from the repository root:
+    python -m Benchmarks.bench_suite --sizes 10000 1000000 10000000 --output bench.json
+
+Zestaw benchmarków warstwy dostępu do danych na lokalnym PostgreSQL. Dla każdego rozmiaru tworzy (raz)
+bazę bench_<liczba wiadomości>, stosuje migracje, zasila ją danymi z Fake_data i mierzy operacje models.py.
+"""
+import argparse
+import datetime
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import psycopg2
+from psycopg2 import errors
+
+import connection_db
+from Benchmarks.stats import summarize
+from Creation_db.migrations import run_migrations
+from Fake_data.fack_data import bulk_insert_test_data, dummy_hash_password, settings as server_settings
+from models import User, Message
+
+DEFAULT_SIZES = (10_000, 1_000_000, 10_000_000)
+USERS_PER_MESSAGE = 0.1  # Liczba użytkowników względem liczby wiadomości
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_database(size, chunk_size, seed):
+    """Create, migrate and seed the database for a given number of messages; reuse it if already seeded."""
+    db_name = f"bench_{size}"
+    connection = psycopg2.connect(**server_settings)
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE {db_name}")
+    except errors.DuplicateDatabase:
+        pass
+    finally:
+        connection.close()
+
+    run_migrations(server_settings, db_name)
+
+    dsn = dict(server_settings, dbname=db_name)
+    connection = psycopg2.connect(**dsn)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM messages")
+            seeded = cursor.fetchone()[0] >= size
+    finally:
+        connection.close()
+    if not seeded:
+        users = max(1000, int(size * USERS_PER_MESSAGE))
+        bulk_insert_test_data(server_settings, db_name, dummy_hash_password, users, size, chunk_size, seed=seed)
+    return dsn
+
+
+def timed(operation, iterations):
+    """Run operation(i) `iterations` times and return per-call latencies in seconds and total time."""
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        operation(i)
+        samples.append(time.perf_counter() - call_started)
+    return samples, time.perf_counter() - started
+
+
+def run_size(dsn, iterations, full_scan_iterations, seed):
+    """Time every operation against one seeded database."""
+    rng = random.Random(seed)
+    pool = connection_db.ConnectionPool(dsn, **connection_db.pool_settings)
+    results = {}
+
+    def record(name, operation, count):
+        samples, elapsed = timed(operation, count)
+        results[name] = summarize(samples, elapsed)
+        print(f"  {name:32} p50 {results[name]['p50_ms']:9.3f} ms  p99 {results[name]['p99_ms']:9.3f} ms  "
+              f"{results[name]['ops_per_sec']:10.1f} op/s", file=sys.stderr, flush=True)
+
+    def new_connection(_):
+        psycopg2.connect(**dsn).close()
+
+    def pooled_connection(_):
+        with connection_db.DatabaseConnection(dsn, pool):
+            pass
+
+    record("connect (new connection)", new_connection, min(iterations, 200))
+    record("connect (pool)", pooled_connection, iterations)
+
+    with connection_db.DatabaseConnection(dsn, pool) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT min(id), max(id) FROM users")
+            min_id, max_id = cursor.fetchone()
+
+            created = []
+
+            def save_user(i):
+                user = User(f"bench_{time.time_ns()}_{i}", "password")
+                user.save_to_db(cursor)
+                created.append(user)
+
+            def save_message(_):
+                Message(rng.randint(min_id, max_id), rng.randint(min_id, max_id), "benchmark").save_to_db(cursor)
+
+            record("User.save_to_db", save_user, iterations)
+            record("Message.save_to_db", save_message, iterations)
+            record("User.load_user_by_id", lambda _: User.load_user_by_id(cursor, rng.randint(min_id, max_id)),
+                   iterations)
+            record("Message.load_all_messages",
+                   lambda _: Message.load_all_messages(cursor, rng.randint(min_id, max_id)), iterations)
+            record("Message.load_messages_page",
+                   lambda _: Message.load_messages_page(cursor, rng.randint(min_id, max_id)), iterations)
+            record("User.load_all_users", lambda _: User.load_all_users(cursor), full_scan_iterations)
+            record("User.delete", lambda i: created[i].delete(cursor), len(created))
+            cursor.execute("DELETE FROM messages WHERE text = 'benchmark'")
+    pool.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark warstwy dostępu do danych.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="liczby wiadomości w bazach")
+    parser.add_argument('--iterations', type=int, default=1000, help="liczba wywołań szybkich operacji")
+    parser.add_argument('--full-scan-iterations', type=int, default=5, help="liczba wywołań load_all_users")
+    parser.add_argument('--chunk-size', type=int, default=100_000, help="rozmiar porcji przy zasilaniu bazy")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_results.json',
+                        help="plik JSON z wynikami ('-' - standardowe wyjście)")
+    args = parser.parse_args()
+
+    User.disable_cache()
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'iterations': args.iterations,
+        'prepared_statements': connection_db.use_prepared_statements,
+        'sizes': {},
+    }
+    for size in args.sizes:
+        print(f"Rozmiar: {size} wiadomości", file=sys.stderr, flush=True)
+        dsn = prepare_database(size, args.chunk_size, args.seed)
+        report['sizes'][str(size)] = run_size(dsn, args.iterations, args.full_scan_iterations, args.seed)
+
+    output = json.dumps(report, indent=2)
+    if args.output != '-':
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+        print(f"Wyniki zapisano w {args.output}.")
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == "__main__":
+    main()
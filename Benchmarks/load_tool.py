@@ -0,0 +1,232 @@
+"""Concurrent load generator for the models.py operations.
+
+Simulates N users working at the same time, each in its own thread or process: they send messages,
+read their inbox and browse their messages. Senders and recipients are drawn from a power-law (Zipf)
+distribution, so a few users send and receive most of the traffic, as in a real messenger.
+Popularity ranks are assigned to user IDs with the seed, and every worker has its own generator
+derived from it, so runs with the same seed and the same number of workers issue the same sequence
+of operations. The run stops after --duration seconds or --ops operations; throughput and latency
+percentiles are reported per operation type.
+
+Connects with the Fake_data settings to the database seeded by Fake_data/fack_data.py. The sent
+messages stay in the database, so use a dedicated test database.
+
+Run from the repository root:
+    python -m Benchmarks.load_tool --workers 32 --duration 60 --mix send=0.3,inbox=0.5,page=0.2 --seed 1
+
+Generator obciążenia dla operacji models.py: N równoczesnych użytkowników (wątki lub procesy) wysyła
+wiadomości, czyta skrzynkę odbiorczą i przegląda wiadomości. Nadawcy i odbiorcy mają rozkład potęgowy
+(Zipfa); ziarno generatora sprawia, że przebiegi są porównywalne.
+"""
+import argparse
+import bisect
+import concurrent.futures
+import itertools
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+
+import psycopg2
+
+import connection_db
+from Benchmarks.stats import summarize
+from connection_db import DatabaseConnection
+from Fake_data.fack_data import settings as fake_data_settings, target_db_name
+from models import User, Message, Conversation
+
+DEFAULT_MIX = {'send': 0.3, 'inbox': 0.5, 'page': 0.2}
+DEFAULT_ZIPF_EXPONENT = 1.1
+
+
+def parse_mix(value):
+    """Parse 'send=0.3,inbox=0.5,page=0.2' into an operation -> weight dict."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"nieznana operacja {name!r} (dostępne: {', '.join(OPERATIONS)})")
+        mix[name] = float(weight)
+    return mix
+
+
+class ZipfUsers:
+    def __init__(self, min_id, max_id, exponent, seed):
+        """
+        Initialize a power-law distribution over the user IDs min_id..max_id.
+
+        The user of popularity rank k is drawn with probability proportional to 1 / k ** exponent.
+        Ranks are assigned to IDs by a shuffle with the seed, so popularity does not follow the IDs.
+
+        :param int min_id: The smallest user ID.
+        :param int max_id: The largest user ID.
+        :param float exponent: Skew of the distribution; 0 is uniform, larger values are more skewed.
+        :param seed: Seed of the rank assignment.
+
+        Inicjalizuje rozkład potęgowy na ID użytkowników min_id..max_id. Użytkownik o randze
+        popularności k jest losowany z prawdopodobieństwem proporcjonalnym do 1 / k ** exponent.
+        """
+        self.ids = list(range(min_id, max_id + 1))
+        random.Random(seed).shuffle(self.ids)
+        self.cum_weights = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, len(self.ids) + 1)))
+
+    def draw(self, rng):
+        """Draw one user ID with the given random generator."""
+        return self.ids[bisect.bisect(self.cum_weights, rng.random() * self.cum_weights[-1])]
+
+
+def op_send(cursor, rng, users):
+    Message(users.draw(rng), users.draw(rng), f"load test {rng.getrandbits(32):08x}").save_to_db(cursor)
+
+
+def op_inbox(cursor, rng, users):
+    Conversation.load_inbox(cursor, users.draw(rng))
+
+
+def op_page(cursor, rng, users):
+    Message.load_messages_page(cursor, users.draw(rng))
+
+
+OPERATIONS = {
+    'send': op_send,
+    'inbox': op_inbox,
+    'page': op_page,
+}
+
+
+def init_worker(pool_size):
+    """Prepare a worker process (or the main one for threads): no user cache, a pool big enough for all workers."""
+    User.disable_cache()
+    connection_db.pool_settings['max_size'] = max(connection_db.pool_settings['max_size'], pool_size)
+
+
+def run_worker(worker, dsn, users, mix, seed, deadline, ops_per_worker):
+    """
+    Run one simulated user until the deadline or until it has done ops_per_worker operations.
+
+    A worker takes a pooled connection per operation, like main.py does. Errors are counted,
+    not raised, so one failing operation does not stop the run.
+
+    :rtype: tuple
+    :return: (operation -> latencies in seconds, operation -> error count)
+
+    Uruchamia jednego symulowanego użytkownika do upływu czasu lub wykonania ops_per_worker operacji.
+    """
+    rng = random.Random(f"{seed}-{worker}")
+    names = list(mix)
+    cum_weights = list(itertools.accumulate(mix.values()))
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    done = 0
+    while (deadline is None or time.time() < deadline) and (ops_per_worker is None or done < ops_per_worker):
+        name = rng.choices(names, cum_weights=cum_weights)[0]
+        started = time.perf_counter()
+        try:
+            with DatabaseConnection(dsn) as conn:
+                with conn.cursor() as cursor:
+                    OPERATIONS[name](cursor, rng, users)
+        except Exception as e:
+            errors[name] += 1
+            print(f"Błąd operacji {name}: {e}", file=sys.stderr)
+        else:
+            latencies[name].append(time.perf_counter() - started)
+        done += 1
+    return dict(latencies), dict(errors)
+
+
+def user_id_range(dsn):
+    """Return (min, max) user ID, with a direct connection: a pool must not be created before forking workers."""
+    connection = psycopg2.connect(**dsn)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT min(id), max(id) FROM users")
+            return cursor.fetchone()
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generator obciążenia: równocześni użytkownicy wysyłający i czytający.")
+    parser.add_argument('--workers', type=int, default=16, help="liczba równoczesnych użytkowników")
+    parser.add_argument('--mode', choices=('thread', 'process'), default='thread',
+                        help="użytkownicy jako wątki (wspólna pula połączeń) lub procesy (bez GIL)")
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument('--duration', type=float, help="czas trwania w sekundach (domyślnie 30)")
+    limit.add_argument('--ops', type=int, help="łączna liczba operacji zamiast czasu trwania")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="udział operacji, np. send=0.3,inbox=0.5,page=0.2")
+    parser.add_argument('--zipf', type=float, default=DEFAULT_ZIPF_EXPONENT,
+                        help="wykładnik rozkładu potęgowego nadawców i odbiorców (0 - jednostajny)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', default=target_db_name, help="baza danych zasilona przez Fake_data")
+    parser.add_argument('--output', help="plik JSON z wynikami ('-' - standardowe wyjście)")
+    args = parser.parse_args()
+
+    dsn = dict(fake_data_settings, dbname=args.db)
+    min_id, max_id = user_id_range(dsn)
+    if min_id is None:
+        raise SystemExit("Baza jest pusta - najpierw uruchom python -m Fake_data.fack_data.")
+    users = ZipfUsers(min_id, max_id, args.zipf, args.seed)
+
+    duration = None if args.ops is not None else (args.duration or 30.0)
+    deadline = time.time() + duration if duration is not None else None
+    # Operacje dzielone równo między wykonawców, aby przebieg z tym samym ziarnem był powtarzalny
+    ops_per_worker = [args.ops // args.workers + (worker < args.ops % args.workers) for worker in range(args.workers)] \
+        if args.ops is not None else [None] * args.workers
+
+    if args.mode == 'thread':
+        init_worker(args.workers)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=args.workers)
+    else:
+        # Każdy proces ma własną pulę; wystarczy w niej jedno połączenie na proces
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                                          initargs=(1,))
+    print(f"{args.workers} użytkowników ({args.mode}), "
+          f"{f'{duration:.0f} s' if duration is not None else f'{args.ops} operacji'}, "
+          f"zakres ID {min_id}..{max_id}...", file=sys.stderr)
+    started = time.perf_counter()
+    with executor:
+        futures = [executor.submit(run_worker, worker, dsn, users, args.mix, args.seed, deadline,
+                                   ops_per_worker[worker])
+                   for worker in range(args.workers)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for worker_latencies, worker_errors in results:
+        for name, samples in worker_latencies.items():
+            latencies[name].extend(samples)
+        for name, count in worker_errors.items():
+            errors[name] += count
+
+    report = {
+        'workers': args.workers,
+        'mode': args.mode,
+        'seed': args.seed,
+        'zipf': args.zipf,
+        'mix': args.mix,
+        'elapsed': elapsed,
+        'operations': {name: dict(summarize(samples, elapsed), errors=errors.get(name, 0))
+                       for name, samples in sorted(latencies.items())},
+        'total': dict(summarize([sample for samples in latencies.values() for sample in samples], elapsed),
+                      errors=sum(errors.values())),
+    }
+
+    print(f"{'operacja':<10} {'liczba':>8} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'błędy':>6}")
+    for name, stats in list(report['operations'].items()) + [('razem', report['total'])]:
+        print(f"{name:<10} {stats['count']:>8} {stats['ops_per_sec']:>9.1f} {stats['p50_ms']:>9.2f} "
+              f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['errors']:>6}")
+    if args.output:
+        text = json.dumps(report, indent=2)
+        if args.output == '-':
+            print(text)
+        else:
+            with open(args.output, 'w', encoding='utf-8') as file:
+                file.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
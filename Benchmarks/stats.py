@@ -0,0 +1,36 @@
+"""Latency statistics shared by the benchmarks and the load tool.
+
+Statystyki opóźnień wspólne dla benchmarków i narzędzia obciążeniowego.
+"""
+
+
+def percentile(sorted_samples, fraction):
+    """Return the percentile (0 < fraction <= 1) of already sorted samples, by linear interpolation."""
+    if not sorted_samples:
+        return 0.0
+    position = (len(sorted_samples) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    return sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * (position - lower)
+
+
+def summarize(samples, elapsed=None):
+    """
+    Summarize latencies in seconds as milliseconds percentiles and throughput.
+
+    :param samples: Latencies of single operations, in seconds.
+    :param elapsed: Wall-clock time of the whole run; defaults to the sum of samples (sequential run).
+    :rtype: dict
+    """
+    ordered = sorted(samples)
+    total = sum(ordered)
+    elapsed = total if elapsed is None else elapsed
+    return {
+        'count': len(ordered),
+        'mean_ms': total / len(ordered) * 1000 if ordered else 0.0,
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p95_ms': percentile(ordered, 0.95) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+        'ops_per_sec': len(ordered) / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,66 @@
+"""Checks with EXPLAIN that the message queries of models.py use the indexes created by the migrations.
+
+Run from the repository root: python -m Creation_db.check_plans
+
+Sprawdza poleceniem EXPLAIN, czy zapytania o wiadomości z models.py korzystają z indeksów utworzonych
+przez migracje. Sekwencyjne skany są wyłączane na czas sprawdzenia (enable_seqscan = off), aby wynik
+nie zależał od rozmiaru tabeli: jeśli zapytanie w ogóle może użyć indeksu, planista go wybierze.
+"""
+import datetime
+import json
+import sys
+
+from connection_db import connect
+from models import USER_MESSAGES_QUERY, SEARCH_MESSAGES_QUERY, NEW_MESSAGES_QUERY, messages_page_query
+
+SAMPLE_USER_ID = 1
+
+CHECKED_QUERIES = [
+    ("Message.load_all_messages", USER_MESSAGES_QUERY, {'user_id': SAMPLE_USER_ID}),
+    ("Message.load_messages_page (first page)", messages_page_query(None),
+     {'user_id': SAMPLE_USER_ID, 'limit': 20}),
+    ("Message.load_messages_page (next page)", messages_page_query((datetime.datetime.now(), 0)),
+     {'user_id': SAMPLE_USER_ID, 'limit': 20, 'after_date': datetime.datetime.now(), 'after_id': 0}),
+    ("Message.load_messages_page (date range)",
+     messages_page_query(None, datetime.datetime(2000, 1, 1), datetime.datetime.now()),
+     {'user_id': SAMPLE_USER_ID, 'limit': 20,
+      'since': datetime.datetime(2000, 1, 1), 'until': datetime.datetime.now()}),
+    ("Message.load_new_messages", NEW_MESSAGES_QUERY, (SAMPLE_USER_ID, 0, 1000)),
+    ("Message.search", SEARCH_MESSAGES_QUERY, {'user_id': SAMPLE_USER_ID, 'query': 'message', 'limit': 20}),
+]
+
+
+def sequential_scans(plan):
+    """Return the names of relations read with a sequential scan anywhere in a JSON plan node."""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        found.extend(sequential_scans(child))
+    return found
+
+
+def check_plans(cursor):
+    """EXPLAIN every checked query and return the list of (name, seq-scanned relations) that failed."""
+    failures = []
+    cursor.execute("SET enable_seqscan = off")
+    try:
+        for name, query, values in CHECKED_QUERIES:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, values)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = sequential_scans(plan[0]['Plan'])
+            print(f"{'BŁĄD' if scans else 'OK'}: {name}"
+                  + (f" - skan sekwencyjny: {', '.join(scans)}" if scans else ""))
+            if scans:
+                failures.append((name, scans))
+    finally:
+        cursor.execute("RESET enable_seqscan")
+    return failures
+
+
+if __name__ == "__main__":
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            sys.exit(1 if check_plans(cursor) else 0)
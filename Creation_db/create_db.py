@@ -1,6 +1,11 @@
+import argparse
+import datetime
+
 import psycopg2
 from psycopg2 import OperationalError, errors
 
+from migrations import run_migrations, ensure_partitions, archive_partitions
+
 
 """Configuration data"""""
 settings = {
@@ -36,58 +41,41 @@ def create_database(settings, db_name):
             connection.close()
 
 
-""""Function to create tables"""
+"""Function creating upcoming partitions of messages and archiving old ones"""
 
 
-def create_tables(settings, db_name):
-    settings = settings.copy()
-    settings['dbname'] = db_name  # Switching to the newly created database
+def maintain_partitions(settings, db_name, archive_before=None, archive_dir='archive'):
+    config_settings = settings.copy()
+    config_settings['dbname'] = db_name
     connection = None
-    cursor = None
     try:
-        connection = psycopg2.connect(**settings)
+        connection = psycopg2.connect(**config_settings)
         connection.autocommit = True
-        cursor = connection.cursor()
-
-        """# Create a user table"""
-        try:
-            cursor.execute("""
-                CREATE TABLE users (
-                    id SERIAL PRIMARY KEY,
-                    username VARCHAR(255) UNIQUE,
-                    hashed_password VARCHAR(80)
-                );
-            """)
-            print("Tabela 'users' została stworzona.")
-        except errors.DuplicateTable:
-            print("Tabela 'users' już istnieje.")
-
-        """"Creating a message table"""
-        try:
-            cursor.execute("""
-                CREATE TABLE messages (
-                    id SERIAL PRIMARY KEY,
-                    from_id INTEGER REFERENCES users(id),
-                    to_id INTEGER REFERENCES users(id),
-                    creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP, 
-                    text VARCHAR(255)
-                );
-            """)
-            """creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  --JEżeli przy wstawianiu rekordu nie zostanie 
-            podana wartość dla tej kolumny, automatycznie zostanie użyta bieżąca data i godzina"""
-            print("Tabela 'messages' została stworzona.")
-        except errors.DuplicateTable:
-            print("Tabela 'messages' już istnieje.")
-
+        with connection.cursor() as cursor:
+            created = ensure_partitions(cursor)
+            print(f"Partycje tabeli messages są gotowe do {created[-1]}." if created else "Brak nowych partycji.")
+            if archive_before:
+                archived = archive_partitions(cursor, archive_before, archive_dir)
+                print(f"Zarchiwizowano partycji: {len(archived)}.")
     except OperationalError as e:
-        print(f"Błąd połączenia z bazą danych {db_name}: {e}")
+        print(f"Błąd połączenia: {e}")
     finally:
-        if cursor:
-            cursor.close()
         if connection:
             connection.close()
 
 
-"""Calling functions that create a database and tablesCalling functions that create a database and tables"""
-create_database(settings, target_db_name)
-create_tables(settings, target_db_name)
+"""Calling functions that create a database and apply the schema migrations"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tworzenie bazy danych, migracje i obsługa partycji messages.")
+    parser.add_argument('--ensure-partitions', action='store_true',
+                        help="tylko utwórz brakujące partycje na kolejne miesiące (np. z crona)")
+    parser.add_argument('--archive-before', type=datetime.datetime.fromisoformat, metavar='YYYY-MM-DD',
+                        help="odłącz, wyeksportuj i usuń partycje ze starszymi wiadomościami")
+    parser.add_argument('--archive-dir', default='archive', help="katalog na pliki .csv.gz z archiwum")
+    args = parser.parse_args()
+
+    if args.ensure_partitions or args.archive_before:
+        maintain_partitions(settings, target_db_name, args.archive_before, args.archive_dir)
+    else:
+        create_database(settings, target_db_name)
+        run_migrations(settings, target_db_name)
@@ -0,0 +1,686 @@
+"""Versioned schema migrations.
+
+Each migration is applied once and recorded in the schema_version table. Migrations marked
+transactional=False run in autocommit mode, which CREATE INDEX CONCURRENTLY requires; their steps must
+be idempotent, because a failure leaves the earlier steps applied and the migration unrecorded.
+A step is either an SQL string or a function taking a cursor.
+
+Wersjonowane migracje schematu. Każda migracja jest stosowana raz i zapisywana w tabeli schema_version.
+Migracje z transactional=False działają w trybie autocommit (wymaganym przez CREATE INDEX CONCURRENTLY),
+więc ich kroki muszą być idempotentne."""
+
+import contextlib
+import datetime
+import gzip
+import os
+import re
+
+import psycopg2
+from psycopg2 import OperationalError
+
+# Konfiguracja wyszukiwania pełnotekstowego; musi być zgodna z models.SEARCH_CONFIG
+SEARCH_CONFIG = 'simple'
+
+# Liczba wierszy aktualizowanych w jednej transakcji przy wypełnianiu nowych kolumn
+BACKFILL_BATCH_SIZE = 10000
+
+# Na ile miesięcy naprzód tworzyć partycje tabeli messages
+PARTITIONS_AHEAD = 3
+
+# Nazwa partycji przechowującej wszystkie wiadomości sprzed partycjonowania
+LEGACY_PARTITION = 'messages_legacy'
+
+# Ograniczenie CHECK odpowiadające zakresowi dawnej tabeli jako partycji; sprawdzone zawczasu pozwala
+# pominąć skanowanie tabeli przy SET NOT NULL i ATTACH PARTITION
+LEGACY_BOUND = 'messages_legacy_bound'
+
+# Partycja domyślna: przyjmuje wiadomości spoza zakresu istniejących partycji (np. gdy ensure_partitions
+# nie był uruchamiany lub data jest sprzed zarchiwizowanych partycji), zamiast odrzucać INSERT
+DEFAULT_PARTITION = 'messages_default'
+
+# Jak długo archiwizacja czeka na blokadę tabeli messages przy odłączaniu partycji
+ARCHIVE_LOCK_TIMEOUT = '5s'
+
+# Ile ID wiadomości wysyła jedno powiadomienie: 500 ID po najwyżej 11 znaków mieści się w limicie 8000 bajtów
+NOTIFY_IDS_PER_PAYLOAD = 500
+
+# Indeksy partycjonowanej tabeli messages; definicje są takie same jak indeksów dawnej tabeli,
+# dzięki czemu ATTACH PARTITION przejmuje istniejące indeksy zamiast budować je od nowa
+PARTITIONED_INDEXES = [
+    ("messages_part_from_id_creation_date_idx", "(from_id, creation_date DESC, id DESC)"),
+    ("messages_part_to_id_creation_date_idx", "(to_id, creation_date DESC, id DESC)"),
+    ("messages_part_unread_idx", "(to_id, from_id) WHERE read_at IS NULL"),
+    ("messages_part_from_id_text_tsv_idx", "USING gin (from_id, text_tsv)"),
+    ("messages_part_to_id_text_tsv_idx", "USING gin (to_id, text_tsv)"),
+]
+
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+_LOWER_BOUND = re.compile(r"FROM \('([^']+)'\)")
+
+# Dowolna stała, wspólna dla wszystkich uruchomień - chroni przed równoległym stosowaniem migracji
+MIGRATION_LOCK_ID = 7_300_415
+
+
+class Migration:
+    def __init__(self, version, description, steps, transactional=True):
+        self.version = version
+        self.description = description
+        self.steps = steps
+        self.transactional = transactional
+
+
+def drop_invalid_index(index_name):
+    """Return a step dropping an index left INVALID by an interrupted CREATE INDEX CONCURRENTLY,
+    so that the following CREATE INDEX CONCURRENTLY IF NOT EXISTS builds it again."""
+
+    def step(cursor):
+        cursor.execute("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s AND NOT i.indisvalid
+        """, (index_name,))
+        if cursor.fetchone():
+            print(f"Usuwanie niepoprawnego indeksu {index_name}.")
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+    return step
+
+
+def create_index_concurrently(index_name, definition, unique=False):
+    """Return the steps building an index (a UNIQUE one if `unique`) without blocking writes to the table."""
+    return [
+        drop_invalid_index(index_name),
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {definition}",
+    ]
+
+
+# Wyzwalacze na messages według nazwy; {table} to tabela, na której są tworzone. Wyzwalacze rozmów działają
+# raz na polecenie (FOR EACH STATEMENT) na tabelach przejściowych, więc wielowierszowy zapis lub usunięcie
+# aktualizuje podsumowanie jednym poleceniem zamiast wiersz po wierszu
+MESSAGE_TRIGGERS = {
+    'messages_conversations_insert': """
+        CREATE TRIGGER messages_conversations_insert AFTER INSERT ON {table}
+        REFERENCING NEW TABLE AS new_messages
+        FOR EACH STATEMENT EXECUTE FUNCTION messages_conversations_added()
+    """,
+    'messages_conversations_delete': """
+        CREATE TRIGGER messages_conversations_delete AFTER DELETE ON {table}
+        REFERENCING OLD TABLE AS old_messages
+        FOR EACH STATEMENT EXECUTE FUNCTION messages_conversations_changed()
+    """,
+    'messages_conversations_update': """
+        CREATE TRIGGER messages_conversations_update AFTER UPDATE ON {table}
+        REFERENCING OLD TABLE AS old_messages NEW TABLE AS new_messages
+        FOR EACH STATEMENT EXECUTE FUNCTION messages_conversations_changed()
+    """,
+    'messages_text_tsv': """
+        CREATE TRIGGER messages_text_tsv BEFORE INSERT OR UPDATE OF text ON {table}
+        FOR EACH ROW EXECUTE FUNCTION messages_update_text_tsv()
+    """,
+    'messages_notify_recipient': """
+        CREATE TRIGGER messages_notify_recipient AFTER INSERT ON {table}
+        REFERENCING NEW TABLE AS new_messages
+        FOR EACH STATEMENT EXECUTE FUNCTION messages_notify_recipient()
+    """,
+}
+
+
+def conversations_from(source):
+    """Return a query summarizing the messages of `source` per (user, partner): the newest message
+    and the number of unread ones, ordered by key, so that upserting its rows locks conversations
+    in a fixed order."""
+    return f"""
+        SELECT DISTINCT ON (user_id, partner_id) user_id, partner_id, id, from_id, text, creation_date, unread
+        FROM (
+            SELECT *, count(*) FILTER (WHERE is_unread) OVER (PARTITION BY user_id, partner_id) AS unread
+            FROM (
+                SELECT from_id AS user_id, to_id AS partner_id, id, from_id, text, creation_date, FALSE AS is_unread
+                FROM {source} WHERE from_id IS NOT NULL AND to_id IS NOT NULL
+                UNION ALL
+                SELECT to_id, from_id, id, from_id, text, creation_date, read_at IS NULL
+                FROM {source} WHERE from_id IS NOT NULL AND to_id IS NOT NULL AND from_id <> to_id
+            ) AS sides
+        ) AS counted
+        ORDER BY user_id, partner_id, creation_date DESC, id DESC
+    """
+
+
+def create_trigger(name, table='messages'):
+    """Return the steps (re)creating one of MESSAGE_TRIGGERS on a table."""
+    return [f"DROP TRIGGER IF EXISTS {name} ON {table}", MESSAGE_TRIGGERS[name].format(table=table)]
+
+
+def backfill_text_tsv(cursor):
+    """Fill messages.text_tsv for existing rows in id ranges, one short transaction per batch,
+    so that a large table is never locked or rewritten as a whole."""
+    cursor.execute("SELECT min(id), max(id) FROM messages")
+    min_id, max_id = cursor.fetchone()
+    if min_id is None:
+        return
+    for start in range(min_id, max_id + 1, BACKFILL_BATCH_SIZE):
+        cursor.execute(f"""
+            UPDATE messages SET text_tsv = to_tsvector('{SEARCH_CONFIG}', coalesce(text, ''))
+            WHERE id >= %s AND id < %s AND text_tsv IS NULL
+        """, (start, start + BACKFILL_BATCH_SIZE))
+        print(f"text_tsv: {min(start + BACKFILL_BATCH_SIZE, max_id + 1) - min_id}/{max_id + 1 - min_id}", flush=True)
+
+
+def next_month(date):
+    """Return the first moment of the month following `date`."""
+    return (date.replace(day=1, hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(days=32)).replace(day=1)
+
+
+@contextlib.contextmanager
+def transaction_block(cursor):
+    """Run a block in one transaction, also on a cursor in autocommit mode; a cursor already
+    inside a transaction simply joins it."""
+    if not cursor.connection.autocommit:
+        yield
+        return
+    if cursor.connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        yield  # Już wewnątrz jawnego BEGIN
+        return
+    cursor.execute("BEGIN")
+    try:
+        yield
+    except BaseException:
+        cursor.execute("ROLLBACK")
+        raise
+    cursor.execute("COMMIT")
+
+
+def list_partitions(cursor):
+    """Return (name, upper bound) of every partition of messages, oldest first; the default
+    partition comes last, with the upper bound datetime.max."""
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'messages'::regclass
+    """)
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = _UPPER_BOUND.search(bound)
+        upper = datetime.datetime.fromisoformat(match.group(1)) if match else datetime.datetime.max
+        partitions.append((name, upper))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def partitioned_range(cursor):
+    """Return the (lower, upper) bounds of creation_date covered by the range partitions of messages,
+    or None when messages is not partitioned. The default partition is not counted: rows outside the
+    range would end up there, out of reach of archive_partitions. The legacy partition starts at
+    MINVALUE, reported as datetime.min."""
+    cursor.execute("""
+        SELECT pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'messages'::regclass
+    """)
+    bounds = []
+    for (bound,) in cursor.fetchall():
+        upper = _UPPER_BOUND.search(bound)
+        if upper is None:
+            continue  # Partycja domyślna
+        lower = _LOWER_BOUND.search(bound)
+        bounds.append((datetime.datetime.fromisoformat(lower.group(1)) if lower else datetime.datetime.min,
+                       datetime.datetime.fromisoformat(upper.group(1))))
+    if not bounds:
+        return None
+    return min(lower for lower, _ in bounds), max(upper for _, upper in bounds)
+
+
+def create_partition(cursor, start, end):
+    """Create the partition of messages for [start, end). Messages of that range already stored
+    in the default partition are moved into the new table before it is attached; the default
+    partition is locked only while that happens, which is cheap when it holds no such rows."""
+    name = f"messages_p{start:%Y%m}"
+    cursor.execute(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE creation_date >= %s AND creation_date < %s LIMIT 1",
+                   (start, end))
+    if cursor.fetchone() is None:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF messages FOR VALUES FROM (%s) TO (%s)",
+                       (start, end))
+        return name
+    print(f"Przenoszenie wiadomości z {DEFAULT_PARTITION} do nowej partycji {name}.")
+    with transaction_block(cursor):
+        cursor.execute(f"CREATE TABLE {name} (LIKE messages INCLUDING DEFAULTS)")
+        cursor.execute(f"LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE")
+        # Usunięcie bezpośrednio z partycji nie uruchamia wyzwalaczy rozmów (są na tabeli messages),
+        # więc przeniesienie nie zmienia podsumowania rozmów
+        cursor.execute(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION} WHERE creation_date >= %s AND creation_date < %s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """, (start, end))
+        cursor.execute(f"ALTER TABLE messages ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (start, end))
+    return name
+
+
+def ensure_partitions(cursor, months_ahead=PARTITIONS_AHEAD):
+    """Create the default partition of messages and monthly partitions from the newest existing one
+    up to `months_ahead` months from now. Safe to run repeatedly, and meant to run daily from cron:
+    python create_db.py --ensure-partitions. Without it new messages still go to the default
+    partition, but every month moved out of it later costs a lock on that partition."""
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF messages DEFAULT")
+    partitions = [partition for partition in list_partitions(cursor) if partition[0] != DEFAULT_PARTITION]
+    now = datetime.datetime.now()
+    start = partitions[-1][1] if partitions else now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    until = now
+    for _ in range(months_ahead + 1):
+        until = next_month(until)
+    created = []
+    while start < until:
+        end = next_month(start)
+        created.append(create_partition(cursor, start, end))
+        start = end
+    return created
+
+
+def refresh_partition_conversations(cursor, partition):
+    """Recompute, in one set-based statement, the conversations of every (sender, recipient) pair
+    with messages in a detached partition. DETACH fires no DELETE trigger, so without this
+    the conversations would keep pointing at archived messages and counting them as unread."""
+    cursor.execute(f"""
+        SELECT conversations_refresh(array_agg(user_id), array_agg(partner_id)) FROM (
+            SELECT DISTINCT side.user_id, side.partner_id
+            FROM {partition} m
+            CROSS JOIN LATERAL (VALUES (m.from_id, m.to_id), (m.to_id, m.from_id)) AS side(user_id, partner_id)
+            WHERE m.from_id IS NOT NULL AND m.to_id IS NOT NULL
+        ) AS pairs
+    """)
+
+
+def archive_partitions(cursor, before, export_dir):
+    """Detach every partition of messages holding only messages older than `before`, export it
+    to <export_dir>/<partition>.csv.gz, recompute the conversations its messages belonged to and
+    drop it. If the export or the recomputation fails, the partition is attached back, so no
+    messages are left outside the table. Needs a cursor in autocommit mode, so that each step
+    commits on its own. DETACH PARTITION ... CONCURRENTLY is not allowed while the table has
+    a default partition, so the detach takes a short lock on messages and gives up after
+    ARCHIVE_LOCK_TIMEOUT instead of queueing writers behind a long query; just run it again."""
+    os.makedirs(export_dir, exist_ok=True)
+    archived = []
+    for name, upper in list_partitions(cursor):
+        if upper > before:
+            continue
+        cursor.execute("SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE oid = %s::regclass", (name,))
+        bound = cursor.fetchone()[0]
+        cursor.execute("SET lock_timeout = %s", (ARCHIVE_LOCK_TIMEOUT,))
+        try:
+            cursor.execute(f"ALTER TABLE messages DETACH PARTITION {name}")
+        finally:
+            cursor.execute("RESET lock_timeout")
+        path = os.path.join(export_dir, f"{name}.csv.gz")
+        try:
+            with gzip.open(path, 'wt', encoding='utf-8', newline='') as file:
+                cursor.copy_expert(f"COPY (SELECT id, from_id, to_id, creation_date, text, read_at FROM {name}) "
+                                   f"TO STDOUT WITH (FORMAT csv, HEADER)", file)
+            refresh_partition_conversations(cursor, name)
+        except BaseException:
+            print(f"Archiwizacja partycji {name} nie powiodła się - partycja zostaje ponownie dołączona.")
+            if os.path.exists(path):
+                os.remove(path)
+            cursor.execute(f"ALTER TABLE messages ATTACH PARTITION {name} {bound}")
+            raise
+        cursor.execute(f"DROP TABLE {name}")
+        print(f"Partycja {name} została zarchiwizowana w {path}.")
+        archived.append(path)
+    return archived
+
+
+def partition_messages(cursor):
+    """Turn messages into a table partitioned by month of creation_date. The existing table becomes
+    the first partition (everything before next month) with its indexes and data kept in place,
+    so nothing is copied. A CHECK constraint matching that range is added NOT VALID and validated
+    first, which scans the table while reads and writes go on; SET NOT NULL and ATTACH PARTITION
+    then rely on it instead of scanning, so the ACCESS EXCLUSIVE lock covers only catalog changes.
+    Needs a cursor in autocommit mode: the validation commits on its own, the conversion runs
+    as one transaction."""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'messages'::regclass")
+    if cursor.fetchone()[0] == 'p':
+        return
+    cursor.execute("SELECT pg_get_serial_sequence('messages', 'id')")
+    sequence = cursor.fetchone()[0]
+    boundary = next_month(datetime.datetime.now())
+
+    # Ograniczenie z przerwanej wcześniejszej próby mogło mieć inną granicę
+    cursor.execute(f"ALTER TABLE messages DROP CONSTRAINT IF EXISTS {LEGACY_BOUND}")
+    cursor.execute(f"ALTER TABLE messages ADD CONSTRAINT {LEGACY_BOUND} "
+                   f"CHECK (creation_date IS NOT NULL AND creation_date < %s) NOT VALID", (boundary,))
+    cursor.execute(f"ALTER TABLE messages VALIDATE CONSTRAINT {LEGACY_BOUND}")
+
+    with transaction_block(cursor):
+        cursor.execute("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE")
+        cursor.execute("ALTER TABLE messages ALTER COLUMN creation_date SET NOT NULL")
+        cursor.execute("ALTER TABLE messages ADD CONSTRAINT messages_id_creation_date_key "
+                       "UNIQUE USING INDEX messages_id_creation_date_key")
+        # Przenoszone są tylko wyzwalacze istniejące w chwili partycjonowania (późniejsze migracje dodają kolejne)
+        cursor.execute("SELECT tgname FROM pg_trigger WHERE tgrelid = 'messages'::regclass AND NOT tgisinternal")
+        triggers = [name for (name,) in cursor.fetchall() if name in MESSAGE_TRIGGERS]
+        for name in triggers:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON messages")
+        cursor.execute(f"ALTER TABLE messages RENAME TO {LEGACY_PARTITION}")
+
+        cursor.execute(f"CREATE TABLE messages (LIKE {LEGACY_PARTITION} INCLUDING DEFAULTS) "
+                       f"PARTITION BY RANGE (creation_date)")
+        cursor.execute("ALTER TABLE messages ADD FOREIGN KEY (from_id) REFERENCES users(id)")
+        cursor.execute("ALTER TABLE messages ADD FOREIGN KEY (to_id) REFERENCES users(id)")
+        # Klucz unikalny tabeli partycjonowanej musi zawierać klucz partycjonowania. Wyszukiwanie po samym id
+        # sprawdza indeks (id, creation_date) każdej partycji; z creation_date trafia do jednej (models.py)
+        cursor.execute("ALTER TABLE messages ADD CONSTRAINT messages_part_id_creation_date_key "
+                       "UNIQUE (id, creation_date)")
+        for name, definition in PARTITIONED_INDEXES:
+            cursor.execute(f"CREATE INDEX {name} ON messages {definition}")
+        # Sekwencja należy teraz do nowej tabeli, aby przetrwała archiwizację dawnej partycji
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY messages.id")
+        cursor.execute(f"ALTER TABLE messages ATTACH PARTITION {LEGACY_PARTITION} "
+                       f"FOR VALUES FROM (MINVALUE) TO (%s)", (boundary,))
+        # Od teraz zakres pilnuje ograniczenie partycji
+        cursor.execute(f"ALTER TABLE {LEGACY_PARTITION} DROP CONSTRAINT {LEGACY_BOUND}")
+        for name in triggers:
+            for step in create_trigger(name):
+                cursor.execute(step)
+        ensure_partitions(cursor)
+
+
+def create_messages_index(index_name, definition):
+    """Return a step building an index on the partitioned messages table without blocking writes.
+    CREATE INDEX CONCURRENTLY does not work on a partitioned table, so the index is created on the
+    parent only (ON ONLY, invalid at first), built concurrently on every partition and attached;
+    the parent index becomes valid once all partitions are attached. Partitions created later
+    get the index automatically."""
+    suffix = index_name[len('messages_'):] if index_name.startswith('messages_') else index_name
+
+    def step(cursor):
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'messages'::regclass")
+        if cursor.fetchone()[0] != 'p':
+            steps = create_index_concurrently(index_name, f"messages {definition}")
+        else:
+            steps = [f"CREATE INDEX IF NOT EXISTS {index_name} ON ONLY messages {definition}"]
+            for partition, _ in list_partitions(cursor):
+                partition_index = f"{partition}_{suffix}"
+                steps += create_index_concurrently(partition_index, f"{partition} {definition}")
+                steps.append(f"ALTER INDEX {index_name} ATTACH PARTITION {partition_index}")
+        for part in steps:
+            if callable(part):
+                part(cursor)
+            else:
+                cursor.execute(part)
+
+    return step
+
+
+MIGRATIONS = [
+    Migration(1, "create users and messages tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(255) UNIQUE,
+            hashed_password VARCHAR(80)
+        )
+        """,
+        # creation_date: jeżeli przy wstawianiu rekordu nie zostanie podana wartość,
+        # automatycznie zostanie użyta bieżąca data i godzina
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id SERIAL PRIMARY KEY,
+            from_id INTEGER REFERENCES users(id),
+            to_id INTEGER REFERENCES users(id),
+            creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            text VARCHAR(255)
+        )
+        """,
+    ]),
+    # Indeksy pod Message.load_all_messages/iter_messages/load_messages_page: każda gałąź UNION ALL
+    # (wiadomości wysłane i odebrane) jest skanem indeksu w kolejności (creation_date, id) malejąco
+    Migration(2, "index messages by sender and recipient", [
+        *create_index_concurrently("messages_from_id_creation_date_idx",
+                                   "messages (from_id, creation_date DESC, id DESC)"),
+        *create_index_concurrently("messages_to_id_creation_date_idx",
+                                   "messages (to_id, creation_date DESC, id DESC)"),
+        "ANALYZE messages",
+    ], transactional=False),
+    # Skrzynka odbiorcza: jeden wiersz na parę (użytkownik, rozmówca) z ostatnią wiadomością i liczbą
+    # nieprzeczytanych, aktualizowany przyrostowo przez wyzwalacze na messages
+    Migration(3, "conversations summary maintained by triggers", [
+        "ALTER TABLE messages ADD COLUMN IF NOT EXISTS read_at TIMESTAMP",
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            user_id INTEGER NOT NULL,
+            partner_id INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            last_from_id INTEGER NOT NULL,
+            last_text VARCHAR(255),
+            last_date TIMESTAMP NOT NULL,
+            unread_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, partner_id)
+        )
+        """,
+        # Pełne przeliczenie wybranych rozmów (pary p_users[i], p_partners[i]) - po usunięciu lub zmianie
+        # wiadomości. Wiersze są blokowane i wstawiane w kolejności klucza, aby równoległe przeliczenia
+        # i dopisania nie zakleszczały się.
+        """
+        CREATE OR REPLACE FUNCTION conversations_refresh(p_users INTEGER[], p_partners INTEGER[]) RETURNS void AS $$
+        BEGIN
+            PERFORM 1 FROM conversations c
+            JOIN unnest(p_users, p_partners) AS p(user_id, partner_id)
+              ON c.user_id = p.user_id AND c.partner_id = p.partner_id
+            ORDER BY c.user_id, c.partner_id
+            FOR UPDATE OF c;
+            DELETE FROM conversations c USING unnest(p_users, p_partners) AS p(user_id, partner_id)
+            WHERE c.user_id = p.user_id AND c.partner_id = p.partner_id;
+            INSERT INTO conversations (user_id, partner_id, last_message_id, last_from_id, last_text, last_date,
+                                       unread_count)
+            SELECT p.user_id, p.partner_id, m.id, m.from_id, m.text, m.creation_date,
+                   (SELECT count(*) FROM messages u
+                    WHERE u.to_id = p.user_id AND u.from_id = p.partner_id AND u.read_at IS NULL
+                      AND p.user_id <> p.partner_id)
+            FROM (SELECT DISTINCT user_id, partner_id FROM unnest(p_users, p_partners) AS p(user_id, partner_id)) AS p
+            CROSS JOIN LATERAL (
+                SELECT * FROM (
+                    (SELECT id, from_id, text, creation_date FROM messages
+                     WHERE from_id = p.user_id AND to_id = p.partner_id ORDER BY creation_date DESC, id DESC LIMIT 1)
+                    UNION ALL
+                    (SELECT id, from_id, text, creation_date FROM messages
+                     WHERE from_id = p.partner_id AND to_id = p.user_id ORDER BY creation_date DESC, id DESC LIMIT 1)
+                ) AS last
+                ORDER BY creation_date DESC, id DESC
+                LIMIT 1
+            ) AS m
+            ORDER BY p.user_id, p.partner_id
+            ON CONFLICT (user_id, partner_id) DO UPDATE SET
+                last_message_id = EXCLUDED.last_message_id, last_from_id = EXCLUDED.last_from_id,
+                last_text = EXCLUDED.last_text, last_date = EXCLUDED.last_date, unread_count = EXCLUDED.unread_count;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        # Dopisanie wstawionych wiadomości: jedno polecenie na całe INSERT, w kolejności klucza rozmowy.
+        # Ostatnia wiadomość zmienia się tylko na nowszą, licznik nieprzeczytanych rośnie zawsze.
+        f"""
+        CREATE OR REPLACE FUNCTION messages_conversations_added() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO conversations AS c (user_id, partner_id, last_message_id, last_from_id, last_text,
+                                            last_date, unread_count)
+            {conversations_from('new_messages')}
+            ON CONFLICT (user_id, partner_id) DO UPDATE SET
+                last_message_id = CASE WHEN (EXCLUDED.last_date, EXCLUDED.last_message_id)
+                                            > (c.last_date, c.last_message_id)
+                                       THEN EXCLUDED.last_message_id ELSE c.last_message_id END,
+                last_from_id = CASE WHEN (EXCLUDED.last_date, EXCLUDED.last_message_id)
+                                         > (c.last_date, c.last_message_id)
+                                    THEN EXCLUDED.last_from_id ELSE c.last_from_id END,
+                last_text = CASE WHEN (EXCLUDED.last_date, EXCLUDED.last_message_id) > (c.last_date, c.last_message_id)
+                                 THEN EXCLUDED.last_text ELSE c.last_text END,
+                last_date = GREATEST(EXCLUDED.last_date, c.last_date),
+                unread_count = c.unread_count + EXCLUDED.unread_count;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        # Usunięte lub zmienione wiadomości: przeliczenie rozmów obu stron, raz na polecenie.
+        # Zmiana samego read_at (oznaczanie jako przeczytane) nie przelicza rozmowy - robi to Message.mark_read.
+        """
+        CREATE OR REPLACE FUNCTION messages_conversations_changed() RETURNS trigger AS $$
+        DECLARE
+            users INTEGER[];
+            partners INTEGER[];
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                SELECT array_agg(user_id), array_agg(partner_id) INTO users, partners FROM (
+                    SELECT DISTINCT side.user_id, side.partner_id
+                    FROM old_messages o
+                    CROSS JOIN LATERAL (VALUES (o.from_id, o.to_id), (o.to_id, o.from_id)) AS side(user_id, partner_id)
+                    WHERE o.from_id IS NOT NULL AND o.to_id IS NOT NULL
+                ) AS pairs;
+            ELSE
+                SELECT array_agg(user_id), array_agg(partner_id) INTO users, partners FROM (
+                    SELECT DISTINCT side.user_id, side.partner_id
+                    FROM old_messages o JOIN new_messages n ON n.id = o.id
+                    CROSS JOIN LATERAL (VALUES (o.from_id, o.to_id), (o.to_id, o.from_id),
+                                               (n.from_id, n.to_id), (n.to_id, n.from_id)) AS side(user_id, partner_id)
+                    WHERE (o.from_id, o.to_id, o.text, o.creation_date)
+                          IS DISTINCT FROM (n.from_id, n.to_id, n.text, n.creation_date)
+                      AND side.user_id IS NOT NULL AND side.partner_id IS NOT NULL
+                ) AS pairs;
+            END IF;
+            IF users IS NOT NULL THEN
+                PERFORM conversations_refresh(users, partners);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        *create_trigger("messages_conversations_insert"),
+        *create_trigger("messages_conversations_delete"),
+        *create_trigger("messages_conversations_update"),
+        # Wypełnienie podsumowania istniejącymi wiadomościami (wszystkie dotychczasowe są nieprzeczytane)
+        f"""
+        INSERT INTO conversations (user_id, partner_id, last_message_id, last_from_id, last_text, last_date,
+                                   unread_count)
+        {conversations_from('messages')}
+        ON CONFLICT (user_id, partner_id) DO NOTHING
+        """,
+    ]),
+    Migration(4, "index unread messages", [
+        *create_index_concurrently("messages_unread_idx", "messages (to_id, from_id) WHERE read_at IS NULL"),
+    ], transactional=False),
+    # Wyszukiwanie pełnotekstowe: kolumna tsvector utrzymywana wyzwalaczem i indeksy GIN (btree_gin)
+    # na (from_id, text_tsv) i (to_id, text_tsv), tak aby ograniczenie do wiadomości użytkownika
+    # było częścią skanu indeksu, a nie filtrem po przeszukaniu całej tabeli
+    Migration(5, "full-text search over message text", [
+        "CREATE EXTENSION IF NOT EXISTS btree_gin",
+        "ALTER TABLE messages ADD COLUMN IF NOT EXISTS text_tsv tsvector",
+        f"""
+        CREATE OR REPLACE FUNCTION messages_update_text_tsv() RETURNS trigger AS $$
+        BEGIN
+            NEW.text_tsv := to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.text, ''));
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        *create_trigger("messages_text_tsv"),
+        backfill_text_tsv,
+        *create_index_concurrently("messages_from_id_text_tsv_idx", "messages USING gin (from_id, text_tsv)"),
+        *create_index_concurrently("messages_to_id_text_tsv_idx", "messages USING gin (to_id, text_tsv)"),
+        "ANALYZE messages",
+    ], transactional=False),
+    # Przygotowanie do partycjonowania: klucz unikalny (id, creation_date) budowany bez blokowania zapisów
+    Migration(6, "unique index on messages (id, creation_date)", [
+        *create_index_concurrently("messages_id_creation_date_key", "messages (id, creation_date)", unique=True),
+    ], transactional=False),
+    Migration(7, "partition messages by month of creation_date", [
+        partition_messages,
+    ], transactional=False),
+    # Powiadomienia o nowych wiadomościach na kanale inbox_<to_id>, wysyłane przy zatwierdzeniu. Ładunek to ID
+    # wstawionych wiadomości po przecinku - jedno powiadomienie na odbiorcę i polecenie, po NOTIFY_IDS_PER_PAYLOAD
+    # ID (ładunek ma limit 8000 bajtów). Subskrybent pobiera wiadomości po tych ID, korzystając z indeksu (to_id, id),
+    # więc wiadomość o mniejszym ID zatwierdzona później niż większa nie zostanie pominięta.
+    Migration(8, "notify recipients of new messages", [
+        f"""
+        CREATE OR REPLACE FUNCTION messages_notify_recipient() RETURNS trigger AS $$
+        DECLARE
+            batch RECORD;
+        BEGIN
+            FOR batch IN
+                SELECT to_id, string_agg(id::text, ',' ORDER BY id) AS ids
+                FROM (
+                    SELECT to_id, id,
+                           (row_number() OVER (PARTITION BY to_id ORDER BY id) - 1) / {NOTIFY_IDS_PER_PAYLOAD} AS chunk
+                    FROM new_messages
+                    WHERE to_id IS NOT NULL
+                ) AS numbered
+                GROUP BY to_id, chunk
+            LOOP
+                PERFORM pg_notify('inbox_' || batch.to_id, batch.ids);
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        *create_trigger('messages_notify_recipient'),
+        create_messages_index("messages_to_id_id_idx", "(to_id, id)"),
+    ], transactional=False),
+]
+
+
+def applied_versions(cursor):
+    """Return the set of migration versions already recorded in schema_version."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migration(connection, cursor, migration):
+    """Apply a single migration and record it in schema_version."""
+    connection.autocommit = not migration.transactional
+    try:
+        for step in migration.steps:
+            if callable(step):
+                step(cursor)
+            else:
+                cursor.execute(step)
+        cursor.execute("INSERT INTO schema_version(version, description) VALUES(%s, %s)",
+                       (migration.version, migration.description))
+        if migration.transactional:
+            connection.commit()
+    except Exception:
+        if migration.transactional:
+            connection.rollback()
+        raise
+    finally:
+        connection.autocommit = True
+
+
+def run_migrations(settings, db_name, migrations=MIGRATIONS):
+    """Apply all pending migrations, in version order, to the given database."""
+    settings = settings.copy()
+    settings['dbname'] = db_name
+    connection = None
+    cursor = None
+    try:
+        connection = psycopg2.connect(**settings)
+        connection.autocommit = True
+        cursor = connection.cursor()
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            done = applied_versions(cursor)
+            pending = [m for m in sorted(migrations, key=lambda m: m.version) if m.version not in done]
+            if not pending:
+                print(f"Schemat bazy {db_name} jest aktualny.")
+            for migration in pending:
+                print(f"Migracja {migration.version}: {migration.description}...")
+                apply_migration(connection, cursor, migration)
+                print(f"Migracja {migration.version} została zastosowana.")
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+    except OperationalError as e:
+        print(f"Błąd połączenia z bazą danych {db_name}: {e}")
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
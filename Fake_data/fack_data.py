@@ -1,6 +1,16 @@
-import psycopg2
-from psycopg2 import OperationalError, errors
+"""Test data seeder. Run from the repository root: python -m Fake_data.fack_data --bulk --records 100000
+
+Generator danych testowych; uruchamiaj z katalogu głównego repozytorium (python -m Fake_data.fack_data).
+"""
+import argparse
 import random
+import time
+
+import psycopg2
+from psycopg2 import OperationalError
+from psycopg2.extras import execute_values
+
+from bulk_copy import copy_rows
 
 
 # Функция-заглушка для хеширования пароля
@@ -62,5 +72,168 @@ def insert_test_data(settings, db_name, hash_function, num_records=30):
             connection.close()
 
 
-# Wywołanie функции wstawiającej testowe dane с заглушкой функции хеширования__________________________________________
-insert_test_data(settings, target_db_name, dummy_hash_password)
+# Tryb masowy: generatory wierszy i ładowanie porcjami______________________________________________________________
+def generate_users(num_records, hash_function, start=0):
+    """
+    Lazily generate (username, hashed_password) rows for test users.
+
+    Leniwie generuje wiersze (username, hashed_password) dla użytkowników testowych.
+    """
+    for i in range(start, start + num_records):
+        yield f'user{i}', hash_function(f'password{i}')
+
+
+def generate_messages(cursor, num_records, min_user_id, max_user_id, rng=random, batch_size=10_000):
+    """
+    Lazily generate (from_id, to_id, text) rows for test messages between existing users.
+
+    Senders and recipients are drawn from [min_user_id, max_user_id]; each batch of draws is checked
+    against users with one query and draws that land on gaps left by deleted users are drawn again,
+    so memory depends on batch_size, not on the number of users.
+
+    Leniwie generuje wiersze (from_id, to_id, text) dla wiadomości między istniejącymi użytkownikami.
+    ID są losowane z zakresu [min_user_id, max_user_id], każda porcja losowań jest sprawdzana w users
+    jednym zapytaniem, a ID trafiające w luki po usuniętych użytkownikach są losowane ponownie.
+    """
+    for first in range(0, num_records, batch_size):
+        count = min(batch_size, num_records - first)
+        ids = []
+        while len(ids) < 2 * count:
+            draws = [rng.randint(min_user_id, max_user_id) for _ in range(2 * count - len(ids))]
+            cursor.execute("SELECT id FROM users WHERE id = ANY(%s)", (list(set(draws)),))
+            existing = {id_ for (id_,) in cursor.fetchall()}
+            ids.extend(id_ for id_ in draws if id_ in existing)
+        for i in range(count):
+            yield ids[2 * i], ids[2 * i + 1], f'message text {first + i}'
+
+
+def chunked(rows, chunk_size):
+    """
+    Split an iterable into lists of at most chunk_size rows without materializing the whole input.
+
+    Dzieli iterowalny obiekt na listy po co najwyżej chunk_size wierszy, nie budując całości w pamięci.
+    """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert_rows(cursor, table, columns, rows):
+    """
+    Load a chunk of rows into a table with a multi-row INSERT (fallback when COPY is not available).
+
+    Ładuje porcję wierszy wielowierszowym INSERT (zamiennik, gdy COPY nie jest dostępne).
+    """
+    execute_values(cursor, f"INSERT INTO {table}({', '.join(columns)}) VALUES %s", rows, page_size=len(rows))
+
+
+def load_in_chunks(connection, table, columns, rows, total, chunk_size, method='copy'):
+    """
+    Stream rows into a table in chunks, committing one transaction per chunk and reporting progress.
+
+    :param connection: Open connection (not in autocommit mode).
+    :param str table: Target table.
+    :param columns: Target column names.
+    :param rows: Iterable of row tuples, consumed lazily.
+    :param int total: Expected number of rows, used for progress reporting.
+    :param int chunk_size: Number of rows per chunk and transaction.
+    :param str method: 'copy' for COPY FROM STDIN, 'values' for multi-row INSERT.
+    :return: Number of loaded rows.
+
+    Ładuje wiersze do tabeli porcjami, zatwierdzając jedną transakcję na porcję i raportując postęp.
+    """
+    load_chunk = copy_rows if method == 'copy' else insert_rows
+    loaded = 0
+    started = time.perf_counter()
+    with connection.cursor() as cursor:
+        for chunk in chunked(rows, chunk_size):
+            try:
+                load_chunk(cursor, table, columns, chunk)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            loaded += len(chunk)
+            elapsed = time.perf_counter() - started
+            rate = loaded / elapsed if elapsed else 0.0
+            print(f"{table}: {loaded}/{total} ({loaded * 100 // max(total, 1)}%), {rate:,.0f} wierszy/s", flush=True)
+    return loaded
+
+
+def bulk_insert_test_data(settings, db_name, hash_function, num_records=1_000_000, num_messages=None,
+                          chunk_size=50_000, method='copy', seed=None):
+    """
+    Seed the database with generated users and messages using COPY (or batched INSERTs) in chunks.
+
+    Rows are generated lazily and message senders and recipients are checked against users one chunk of draws
+    at a time, so memory use depends on chunk_size, not on num_records or the number of users.
+
+    Zasila bazę wygenerowanymi użytkownikami i wiadomościami przez COPY (lub INSERT porcjami).
+
+    Wiersze są generowane leniwie, a nadawcy i odbiorcy wiadomości są sprawdzani w users porcjami losowań,
+    więc zużycie pamięci zależy od chunk_size, a nie od num_records ani liczby użytkowników.
+    """
+    settings = settings.copy()
+    settings['dbname'] = db_name
+    num_messages = num_records if num_messages is None else num_messages
+    rng = random.Random(seed)
+    connection = None
+
+    try:
+        connection = psycopg2.connect(**settings)
+        started = time.perf_counter()
+
+        # Zaczynamy numerację za największym istniejącym numerem userN, aby nie łamać UNIQUE(username) -
+        # liczba użytkowników jest za mała, gdy część z nich usunięto
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT coalesce(max(substring(username FROM '^user([0-9]+)$')::bigint) + 1, 0) FROM users")
+            start = cursor.fetchone()[0]
+        connection.commit()
+        users = load_in_chunks(connection, 'users', ('username', 'hashed_password'),
+                               generate_users(num_records, hash_function, start), num_records, chunk_size, method)
+
+        # Wiadomości odwołują się tylko do istniejących identyfikatorów użytkowników
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT min(id), max(id) FROM users")
+            min_id, max_id = cursor.fetchone()
+        connection.commit()
+        messages = 0
+        if min_id is not None:
+            with connection.cursor() as lookup:
+                messages = load_in_chunks(connection, 'messages', ('from_id', 'to_id', 'text'),
+                                          generate_messages(lookup, num_messages, min_id, max_id, rng, chunk_size),
+                                          num_messages, chunk_size, method)
+
+        elapsed = time.perf_counter() - started
+        print(f"Wstawiono {users} użytkowników i {messages} wiadomości w {elapsed:.1f} s "
+              f"({(users + messages) / elapsed if elapsed else 0:,.0f} wierszy/s).")
+
+    except OperationalError as e:
+        print(f"Błąd połączenia z bazą danych {db_name}: {e}")
+    finally:
+        if connection:
+            connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wstawia testowe dane do bazy danych.")
+    parser.add_argument('--records', type=int, default=30, help="liczba użytkowników (i wiadomości)")
+    parser.add_argument('--messages', type=int, default=None, help="liczba wiadomości (domyślnie = --records)")
+    parser.add_argument('--bulk', action='store_true', help="tryb masowy: COPY porcjami z raportem postępu")
+    parser.add_argument('--method', choices=('copy', 'values'), default='copy',
+                        help="sposób ładowania w trybie masowym")
+    parser.add_argument('--chunk-size', type=int, default=50_000, help="liczba wierszy na porcję/transakcję")
+    parser.add_argument('--seed', type=int, default=None, help="ziarno generatora losowego")
+    args = parser.parse_args()
+
+    # Wywołanie funkcji wstawiającej testowe dane z zaślepką funkcji hashowania
+    if args.bulk:
+        bulk_insert_test_data(settings, target_db_name, dummy_hash_password, args.records, args.messages,
+                              args.chunk_size, args.method, args.seed)
+    else:
+        insert_test_data(settings, target_db_name, dummy_hash_password, args.records)
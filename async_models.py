@@ -0,0 +1,216 @@
+"""asyncio counterpart of the User and Message data access in models.py.
+
+Runs on psycopg 3 and its AsyncConnectionPool, so many concurrent requests share a few connections
+without a thread per request. The SQL and the row hydration (from_row) are the ones of models.py;
+AsyncUser and AsyncMessage only replace the methods doing round trips with coroutines. psycopg 3
+prepares a query by itself after it has been executed a few times on a connection
+(prepare_threshold), which replaces connection_db.StatementCache here.
+
+Requires: pip install "psycopg[binary,pool]"
+
+    async with connect() as conn:
+        user = await AsyncUser.load_user_by_id(conn, 1)
+
+Asynchroniczny odpowiednik dostępu do danych User i Message z models.py, oparty na psycopg 3
+i AsyncConnectionPool. Zapytania SQL i tworzenie obiektów z wierszy (from_row) są wspólne z models.py.
+"""
+import contextlib
+
+try:
+    from psycopg_pool import AsyncConnectionPool
+except ImportError as e:
+    raise ImportError("async_models wymaga psycopg 3 z pulą połączeń: pip install \"psycopg[binary,pool]\"") from e
+
+from connection_db import settings, pool_settings
+from models import (User, Message, USER_INSERT_QUERY, USER_UPDATE_QUERY, USER_BY_ID_QUERY, ALL_USERS_QUERY,
+                    USER_DELETE_QUERY, MESSAGE_INSERT_QUERY, MESSAGE_UPDATE_QUERY, MESSAGE_BY_ID_QUERY,
+                    USER_MESSAGES_QUERY)
+
+_pool = None
+
+
+def connection_kwargs(dsn):
+    """
+    Convert connection_db-style settings into psycopg 3 connection arguments.
+
+    Zamienia ustawienia w stylu connection_db na argumenty połączenia psycopg 3.
+    """
+    kwargs = dict(dsn)
+    if 'database' in kwargs:
+        kwargs['dbname'] = kwargs.pop('database')  # psycopg2 przyjmuje oba klucze, libpq tylko dbname
+    kwargs['autocommit'] = True  # Jak w puli synchronicznej: każde polecenie to osobna transakcja
+    return kwargs
+
+
+async def get_pool(dsn=None):
+    """
+    Return the shared async pool, opening it on first use with the sizes from connection_db.pool_settings.
+
+    :param dsn: Connection parameters (default: connection_db.settings).
+    :rtype: AsyncConnectionPool
+
+    Zwraca wspólną asynchroniczną pulę, otwierając ją przy pierwszym użyciu.
+    """
+    global _pool
+    if _pool is None:
+        pool = AsyncConnectionPool(
+            kwargs=connection_kwargs(dsn or settings),
+            min_size=pool_settings['min_size'],
+            max_size=pool_settings['max_size'],
+            max_idle=pool_settings['idle_timeout'],
+            timeout=pool_settings['checkout_timeout'],
+            check=AsyncConnectionPool.check_connection if pool_settings['health_check'] else None,
+            open=False,
+        )
+        await pool.open()
+        _pool = pool
+    return _pool
+
+
+async def close_pool():
+    """Close the shared async pool. / Zamyka wspólną asynchroniczną pulę."""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+@contextlib.asynccontextmanager
+async def connect():
+    """
+    Take a connection from the shared async pool for the duration of the block.
+
+    Pobiera połączenie ze wspólnej asynchronicznej puli na czas trwania bloku.
+    """
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+class AsyncUser(User):
+    # Osobna pamięć podręczna: obiekty AsyncUser mają metody asynchroniczne i nie mogą trafić do User.cache
+    cache = None
+
+    __slots__ = ()
+
+    async def save_to_db(self, conn):
+        """
+                Saves the user to the database; see User.save_to_db.
+
+                :param conn: An async connection from the pool.
+                :rtype: bool
+                """
+        try:
+            async with conn.cursor() as cursor:
+                if self._id == -1:
+                    await cursor.execute(USER_INSERT_QUERY, (self.username, self.hashed_password))
+                    self._id = (await cursor.fetchone())[0]
+                else:
+                    await cursor.execute(USER_UPDATE_QUERY, (self.username, self.hashed_password, self.id))
+        except BaseException:
+            if AsyncUser.cache is not None:
+                AsyncUser.cache.invalidate(self._id)
+            raise
+        if AsyncUser.cache is not None:
+            AsyncUser.cache.put(self)
+        # Pamięć nieistniejących nazw jest wspólna z User - zapisana nazwa nie może dalej uchodzić za nieistniejącą
+        if AsyncUser.missing_usernames is not None:
+            AsyncUser.missing_usernames.discard(self.username)
+        return True
+
+    @staticmethod
+    async def load_user_by_id(conn, id_):
+        """
+               Loads a user by ID, from AsyncUser.cache when it is enabled; see User.load_user_by_id.
+
+               :param conn: An async connection from the pool.
+               :param int id_: The ID of the user to load.
+               :rtype: AsyncUser or None
+               """
+        if AsyncUser.cache is not None:
+            cached_user = AsyncUser.cache.get(id_)
+            if cached_user is not None:
+                return cached_user
+        async with conn.cursor() as cursor:
+            await cursor.execute(USER_BY_ID_QUERY, (id_,))
+            data = await cursor.fetchone()
+        if data:
+            loaded_user = AsyncUser.from_row(data)
+            if AsyncUser.cache is not None:
+                AsyncUser.cache.put(loaded_user)
+            return loaded_user
+        return None
+
+    @staticmethod
+    async def load_all_users(conn):
+        """
+               Loads all users; see User.load_all_users.
+
+               :param conn: An async connection from the pool.
+               :rtype: list[AsyncUser]
+               """
+        async with conn.cursor() as cursor:
+            await cursor.execute(ALL_USERS_QUERY)
+            return [AsyncUser.from_row(row) for row in await cursor.fetchall()]
+
+    async def delete(self, conn):
+        """
+               Deletes the user and resets its ID to -1; see User.delete.
+
+               :param conn: An async connection from the pool.
+               :rtype: bool
+               """
+        if AsyncUser.cache is not None:
+            AsyncUser.cache.invalidate(self._id)
+        async with conn.cursor() as cursor:
+            await cursor.execute(USER_DELETE_QUERY, (self.id,))
+        self._id = -1
+        return True
+
+
+class AsyncMessage(Message):
+    __slots__ = ()
+
+    async def save_to_db(self, conn):
+        """
+               Saves the message to the database; see Message.save_to_db.
+
+               :param conn: An async connection from the pool.
+               :rtype: bool
+               """
+        async with conn.cursor() as cursor:
+            if self._id == -1:
+                await cursor.execute(MESSAGE_INSERT_QUERY, (self.from_id, self.to_id, self.text, self.creation_date))
+                self._id = (await cursor.fetchone())[0]
+            else:
+                await cursor.execute(MESSAGE_UPDATE_QUERY, (self.from_id, self.to_id, self.text, self.creation_date,
+                                                            self._id, self._stored_date))
+        self._stored_date = self.creation_date
+        return True
+
+    @staticmethod
+    async def load_message_by_id(conn, id_):
+        """
+               Loads a message by ID; see Message.load_message_by_id.
+
+               :param conn: An async connection from the pool.
+               :param int id_: The ID of the message to load.
+               :rtype: AsyncMessage or None
+               """
+        async with conn.cursor() as cursor:
+            await cursor.execute(MESSAGE_BY_ID_QUERY, (id_,))
+            data = await cursor.fetchone()
+        return AsyncMessage.from_row(data) if data else None
+
+    @staticmethod
+    async def load_all_messages(conn, user_id):
+        """
+               Loads all messages sent or received by a user; see Message.load_all_messages.
+
+               :param conn: An async connection from the pool.
+               :param int user_id: The ID of the user whose messages to retrieve.
+               :rtype: list[AsyncMessage]
+               """
+        async with conn.cursor() as cursor:
+            await cursor.execute(USER_MESSAGES_QUERY, {'user_id': user_id})
+            return [AsyncMessage.from_row(row) for row in await cursor.fetchall()]
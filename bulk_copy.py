@@ -0,0 +1,31 @@
+"""Loading rows into a table with COPY FROM STDIN, shared by the test data seeder and the import.
+
+Ładowanie wierszy do tabeli poleceniem COPY FROM STDIN, wspólne dla generatora danych testowych i importu.
+"""
+import io
+
+
+def _copy_value(value):
+    """
+    Format a single value for COPY ... FROM STDIN text format.
+
+    Formatuje pojedynczą wartość dla formatu tekstowego COPY ... FROM STDIN.
+    """
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_rows(cursor, table, columns, rows):
+    """
+    Load a chunk of rows into a table with COPY FROM STDIN.
+
+    Ładuje porcję wierszy do tabeli poleceniem COPY FROM STDIN.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table}({', '.join(columns)}) FROM STDIN", buffer)
@@ -1,71 +1,924 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+
+# Ustawienia połączenia z bazą danych
+settings = {
+    'host': 'localhost',  # Adres hosta
+    'user': 'postgres',  # Nazwa użytkownika
+    'password': 'Citro123456ok',  # Hasło
+    'database': 'my_db'  # Nazwa bazy danych
+}
+
+# Repliki tylko do odczytu; każda pozycja nadpisuje wybrane ustawienia połączenia (np. host, port).
+# Można je też podać w zmiennej środowiskowej DB_REPLICAS jako listę host[:port] oddzieloną przecinkami,
+# np. DB_REPLICAS=localhost:5433,localhost:5434
+replica_settings = []
+
+# Ustawienia kierowania zapytań tylko do odczytu na repliki
+routing_settings = {
+    'read_your_writes_window': 5.0,  # Ile sekund po zapisie odczyty tego wątku idą na serwer główny
+    'replica_retry_interval': 30.0,  # Po ilu sekundach ponownie próbować repliki uznanej za niedostępną
+}
+
+# Ustawienia puli połączeń
+pool_settings = {
+    'min_size': 1,  # Liczba połączeń otwieranych od razu i utrzymywanych w puli
+    'max_size': 10,  # Maksymalna liczba jednocześnie otwartych połączeń
+    'idle_timeout': 300.0,  # Po ilu sekundach bezczynności zamknąć nadmiarowe połączenie
+    'checkout_timeout': 30.0,  # Ile sekund czekać na wolne połączenie
+    'health_check': True,  # Czy sprawdzać połączenie (SELECT 1) przy pobieraniu z puli
+}
+
+# Czy przygotowywać (PREPARE) gorące zapytania raz na połączenie i potem je wykonywać (EXECUTE)
+use_prepared_statements = True
+
+# Ustawienia instrumentacji zapytań. Domyślnie wyłączona - każde zapytanie płaciłoby za pomiar i ustalenie
+# miejsca wywołania; włącza się ją tutaj lub zmienną środowiskową DB_QUERY_STATS=1 (np. do profilowania)
+instrumentation_settings = {
+    'enabled': os.environ.get('DB_QUERY_STATS', '') not in ('', '0'),  # Czy mierzyć czas i wiersze zapytań
+    'slow_query_ms': 200.0,  # Od ilu milisekund zapytanie trafia do dziennika wolnych zapytań
+    # Plik dziennika wolnych zapytań (None - tylko logging); ścieżka także ze zmiennej DB_SLOW_QUERY_LOG
+    'slow_query_log_file': os.environ.get('DB_SLOW_QUERY_LOG') or None,
+    'explain': False,  # Czy dołączać plan (EXPLAIN) wolnego zapytania do dziennika
+    'explain_analyze': False,  # Czy dla wolnych SELECT wykonywać EXPLAIN ANALYZE (zapytanie wykona się ponownie)
+}
+
+slow_query_log = logging.getLogger('connection_db.slow_queries')
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+def to_positional(query):
+    """
+    Convert a query with psycopg2 placeholders (%s or %(name)s) to PREPARE syntax ($1, $2, ...).
+
+    :param str query: The query with psycopg2 placeholders.
+    :return: The converted query and the parameter keys in $n order (positions for %s, names for %(name)s).
+    :rtype: tuple
+
+    Zamienia zapytanie z symbolami psycopg2 (%s lub %(nazwa)s) na składnię PREPARE ($1, $2, ...).
+
+    :param str query: Zapytanie z symbolami psycopg2.
+    :return: Zamienione zapytanie i klucze parametrów w kolejności $n (pozycje dla %s, nazwy dla %(nazwa)s).
+    :rtype: tuple
+    """
+    keys = []
+
+    def replace(match):
+        if match.group(0) == '%%':
+            return '%'
+        key = match.group(1) if match.group(1) is not None else len(keys)
+        if key not in keys:
+            keys.append(key)
+        return f"${keys.index(key) + 1}"
+
+    return _PLACEHOLDER.sub(replace, query), keys
+
+
+def _execute_aside(connection, statement):
+    """Run a statement on a separate cursor, leaving the results of the caller's cursor intact."""
+    with connection.cursor() as cursor:
+        cursor.execute(statement)
+
+
+class StatementCache:
+    def __init__(self, enabled=True):
+        """
+        Initialize the registry of statements prepared on one connection.
+
+        :param bool enabled: When False, queries are sent as plain text every time.
+
+        Inicjalizuje rejestr zapytań przygotowanych na jednym połączeniu.
+
+        :param bool enabled: Gdy False, zapytania są za każdym razem wysyłane jako tekst.
+        """
+        self.enabled = enabled
+        self._prepared = {}  # nazwa -> klucze parametrów w kolejności $n
+        # Polecenia wykonane już w bieżącej transakcji - kolejne ich wykonania nie potrzebują punktu zapisu
+        self._checked = set()
+
+    def execute(self, cursor, name, query, values=None):
+        """
+        Execute a query through a prepared statement, preparing it on first use on this connection.
+
+        The server parses and plans the query once per connection; later calls only send EXECUTE
+        with the parameter values. If the server has lost the statement (DEALLOCATE ALL, DISCARD ALL,
+        a pooler switching server connections), it is prepared again and executed once more. Inside
+        a transaction the first execution of each statement runs under a savepoint, so that this retry
+        does not abort the transaction; later executions in the same transaction skip it.
+
+        :param cursor: A cursor of the connection owning this registry.
+        :param str name: Statement name, unique per query text.
+        :param str query: The query with psycopg2 placeholders.
+        :param values: Query parameters (sequence for %s, mapping for %(name)s).
+
+        Wykonuje zapytanie przez przygotowane polecenie, przygotowując je przy pierwszym użyciu.
+
+        Serwer analizuje i planuje zapytanie raz na połączenie; kolejne wywołania wysyłają tylko
+        EXECUTE z wartościami parametrów. Jeśli serwer utracił polecenie, jest ono przygotowywane ponownie
+        i wykonywane jeszcze raz; w transakcji pierwsze wykonanie polecenia działa w punkcie zapisu, aby
+        ponowienie nie przerwało transakcji.
+
+        :param cursor: Kursor połączenia, do którego należy rejestr.
+        :param str name: Nazwa polecenia, unikalna dla treści zapytania.
+        :param str query: Zapytanie z symbolami psycopg2.
+        :param values: Parametry zapytania (sekwencja dla %s, słownik dla %(nazwa)s).
+        """
+        if not self.enabled:
+            cursor.execute(query, values)
+            return
+        connection = cursor.connection
+        status = connection.info.transaction_status
+        if status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            self._checked.clear()  # Poprzednia transakcja się zakończyła
+        guarded = status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS and name not in self._checked
+        if guarded:
+            _execute_aside(connection, "SAVEPOINT statement_cache")
+        try:
+            self._execute_prepared(cursor, name, query, values)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # Polecenie zniknęło z sesji - przygotuj je ponownie i spróbuj jeszcze raz
+            self._prepared.pop(name, None)
+            if guarded:
+                _execute_aside(connection, "ROLLBACK TO SAVEPOINT statement_cache")
+            elif status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+                raise  # Transakcja jest już przerwana - ponowienie jest niemożliwe
+            elif not connection.autocommit:
+                connection.rollback()  # Niejawna transakcja zawierała tylko nieudane polecenie
+            self._execute_prepared(cursor, name, query, values)
+        if guarded:
+            _execute_aside(connection, "RELEASE SAVEPOINT statement_cache")
+        if connection.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+            self._checked.add(name)
+
+    def _execute_prepared(self, cursor, name, query, values):
+        keys = self._prepared.get(name)
+        if keys is None:
+            sql, keys = to_positional(query)
+            cursor.execute(f"PREPARE {name} AS {sql}")
+            self._prepared[name] = keys
+        params = [values[key] for key in keys]
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    def clear(self):
+        """
+        Forget all statements, e.g. after DEALLOCATE ALL or DISCARD ALL on the connection.
+
+        Zapomina wszystkie polecenia, np. po DEALLOCATE ALL lub DISCARD ALL na połączeniu.
+        """
+        self._prepared.clear()
+        self._checked.clear()
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|(?<!\$)\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+_EXECUTE_ARGS = re.compile(r"^(EXECUTE \w+) \(.*\)$", re.IGNORECASE | re.DOTALL)
+
+# Funkcje pomocnicze, które nie są właściwym miejscem wywołania zapytania
+CALL_SITE_SKIP = {'execute_statement', 'iter_query'}
+
+
+def normalize_query(query):
+    """
+    Reduce a query to the form its statistics are aggregated under: single spaces, literals as ?.
+
+    :param query: Query text (str or bytes) with psycopg2 placeholders.
+    :rtype: str
+
+    Sprowadza zapytanie do postaci, pod którą agregowane są statystyki: pojedyncze spacje, literały jako ?.
+
+    :param query: Treść zapytania (str lub bytes) z symbolami psycopg2.
+    :rtype: str
+    """
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    query = _WHITESPACE.sub(' ', str(query)).strip()
+    query = _EXECUTE_ARGS.sub(r"\1 (...)", query)
+    return _LITERALS.sub('?', query)
+
+
+def _call_site():
+    """
+    Return "file:line function" of the first frame outside this module, psycopg2 and query helpers.
+
+    Zwraca "plik:linia funkcja" pierwszej ramki spoza tego modułu, psycopg2 i funkcji pomocniczych.
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename != __file__ and f"{os.sep}psycopg2{os.sep}" not in filename
+                and not filename.endswith('contextlib.py') and frame.f_code.co_name not in CALL_SITE_SKIP):
+            return f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+class QueryStats:
+    def __init__(self):
+        """
+        Initialize thread-safe counters of executed queries, aggregated per normalized query.
+
+        Inicjalizuje bezpieczne wątkowo liczniki wykonanych zapytań, agregowane według znormalizowanego zapytania.
+        """
+        self._lock = threading.Lock()
+        self._queries = {}
+
+    def record(self, query, duration, rows, call_site):
+        """
+        Add one execution of a query.
+
+        Dodaje jedno wykonanie zapytania.
+        """
+        with self._lock:
+            entry = self._queries.get(query)
+            if entry is None:
+                entry = self._queries[query] = {'calls': 0, 'total_time': 0.0, 'max_time': 0.0, 'rows': 0,
+                                                'call_sites': {}}
+            entry['calls'] += 1
+            entry['total_time'] += duration
+            entry['max_time'] = max(entry['max_time'], duration)
+            entry['rows'] += max(rows, 0)
+            entry['call_sites'][call_site] = entry['call_sites'].get(call_site, 0) + 1
+
+    def snapshot(self):
+        """
+        Return a copy of the statistics, sorted by total time, most expensive first.
+
+        :rtype: list of dict
+
+        Zwraca kopię statystyk posortowaną malejąco według łącznego czasu.
+
+        :rtype: list of dict
+        """
+        with self._lock:
+            entries = [dict(entry, query=query, call_sites=dict(entry['call_sites']))
+                       for query, entry in self._queries.items()]
+        for entry in entries:
+            entry['mean_time'] = entry['total_time'] / entry['calls']
+        return sorted(entries, key=lambda entry: entry['total_time'], reverse=True)
+
+    def reset(self):
+        """
+        Clear all counters.
+
+        Zeruje wszystkie liczniki.
+        """
+        with self._lock:
+            self._queries.clear()
+
+    def report(self, limit=20):
+        """
+        Format the most expensive queries as text, for printing.
+
+        :param int limit: Number of queries to include.
+        :rtype: str
+
+        Formatuje najdroższe zapytania jako tekst do wyświetlenia.
+
+        :param int limit: Liczba uwzględnionych zapytań.
+        :rtype: str
+        """
+        lines = []
+        for entry in self.snapshot()[:limit]:
+            lines.append(f"{entry['calls']:8} wyw.  {entry['total_time'] * 1000:10.1f} ms łącznie  "
+                         f"{entry['mean_time'] * 1000:8.2f} ms śr.  {entry['max_time'] * 1000:8.2f} ms maks.  "
+                         f"{entry['rows']:8} wierszy")
+            lines.append(f"    {entry['query'][:200]}")
+            for call_site, calls in sorted(entry['call_sites'].items(), key=lambda item: -item[1])[:3]:
+                lines.append(f"    <- {call_site} ({calls})")
+        return "\n".join(lines) if lines else "Brak zarejestrowanych zapytań."
+
+
+query_stats = QueryStats()  # Statystyki wszystkich zapytań wykonanych w tym procesie
+
+
+def _slow_query_logger():
+    """
+    Return the slow query logger, attaching the configured log file on first use.
+
+    Zwraca logger wolnych zapytań, dołączając skonfigurowany plik przy pierwszym użyciu.
+    """
+    log_file = instrumentation_settings['slow_query_log_file']
+    if log_file and not slow_query_log.handlers:
+        handler = logging.FileHandler(log_file, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_query_log.addHandler(handler)
+        slow_query_log.setLevel(logging.INFO)
+    return slow_query_log
+
+
+def _explain(cursor, query, vars):
+    """
+    Return the plan of a slow query, or None for statements that cannot be explained safely.
+
+    EXPLAIN ANALYZE executes the query again, so it is only used for SELECT statements.
+
+    Zwraca plan wolnego zapytania lub None dla poleceń, których nie da się bezpiecznie objaśnić.
+
+    EXPLAIN ANALYZE wykonuje zapytanie ponownie, więc jest używany tylko dla poleceń SELECT.
+    """
+    text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    keyword = text.lstrip().split(None, 1)[0].upper() if text.strip() else ''
+    if keyword not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'EXECUTE'):
+        return None
+    analyze = instrumentation_settings['explain_analyze'] and keyword == 'SELECT'
+    options = "(ANALYZE, BUFFERS) " if analyze else ""
+    try:
+        with cursor.connection.cursor(cursor_factory=psycopg2.extensions.cursor) as explain_cursor:
+            explain_cursor.execute(f"EXPLAIN {options}{text}", vars)
+            return "\n".join(row[0] for row in explain_cursor.fetchall())
+    except psycopg2.Error as e:
+        return f"(EXPLAIN nieudany: {e})"
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """
+    Cursor recording duration, row count and call site of every statement in query_stats,
+    and logging statements slower than instrumentation_settings['slow_query_ms'].
+
+    Kursor zapisujący w query_stats czas, liczbę wierszy i miejsce wywołania każdego polecenia
+    oraz zapisujący w dzienniku polecenia wolniejsze niż instrumentation_settings['slow_query_ms'].
+    """
+
+    def _record(self, query, vars, duration, explainable):
+        call_site = _call_site()
+        query_stats.record(normalize_query(query), duration, self.rowcount, call_site)
+        if duration * 1000 < instrumentation_settings['slow_query_ms']:
+            return
+        text = self.query.decode('utf-8', 'replace') if self.query else str(query)
+        message = f"{duration * 1000:.1f} ms, {self.rowcount} wierszy, {call_site}: {_WHITESPACE.sub(' ', text)}"
+        # Plan tylko dla udanych poleceń zwykłego kursora i poza przerwaną transakcją
+        if (instrumentation_settings['explain'] and explainable and self.name is None
+                and self.connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_INERROR):
+            plan = _explain(self, query, vars)
+            if plan:
+                message += "\n" + plan
+        _slow_query_logger().warning(message)
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        succeeded = False
+        try:
+            result = super().execute(query, vars)
+            succeeded = True
+            return result
+        finally:
+            self._record(query, vars, time.perf_counter() - started, succeeded)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, None, time.perf_counter() - started, False)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._record(sql, None, time.perf_counter() - started, False)
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        """
+        A psycopg2 connection carrying its own prepared statement registry and,
+        when enabled, instrumented cursors.
+
+        Połączenie psycopg2 z własnym rejestrem przygotowanych zapytań i, jeśli włączone,
+        kursorami z instrumentacją.
+        """
+        super().__init__(*args, **kwargs)
+        self.statements = StatementCache(use_prepared_statements)
+        if instrumentation_settings['enabled']:
+            self.cursor_factory = InstrumentedCursor
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection becomes available within the checkout timeout.
+
+    Zgłaszany, gdy w czasie oczekiwania nie zwolniło się żadne połączenie.
+    """
+
+
+class ConnectionPool:
+    def __init__(self, dsn, min_size=1, max_size=10, idle_timeout=300.0, checkout_timeout=30.0,
+                 health_check=True):
+        """
+        Initialize a thread-safe pool of database connections.
+
+        :param dsn: A dictionary containing connection parameters.
+        :param int min_size: Number of connections kept open at all times.
+        :param int max_size: Maximum number of connections open at the same time.
+        :param float idle_timeout: Seconds after which an idle connection above min_size is closed.
+        :param float checkout_timeout: Seconds to wait for a free connection before giving up.
+        :param bool health_check: Whether to run SELECT 1 on a connection before handing it out.
+
+        Inicjalizuje bezpieczną wątkowo pulę połączeń z bazą danych.
+
+        :param dsn: Słownik zawierający parametry połączenia.
+        :param int min_size: Liczba połączeń utrzymywanych przez cały czas.
+        :param int max_size: Maksymalna liczba jednocześnie otwartych połączeń.
+        :param float idle_timeout: Po ilu sekundach zamknąć bezczynne połączenie ponad min_size.
+        :param float checkout_timeout: Ile sekund czekać na wolne połączenie.
+        :param bool health_check: Czy wykonać SELECT 1 przed wydaniem połączenia.
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Nieprawidłowy rozmiar puli: wymagane 0 <= min_size <= max_size i max_size >= 1")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check = health_check
+        self._idle = []  # Lista par (połączenie, czas zwrotu do puli), najnowsze na końcu
+        self._in_use = set()  # id() połączeń wydanych z puli
+        self._opening = 0  # Połączenia w trakcie otwierania (liczone do max_size)
+        self._lock = threading.Condition()
+        self._closed = False
+        # Statystyki
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._discarded = 0
+        for _ in range(min_size):
+            self._idle.append((self._open(), time.monotonic()))
+
+    def _open(self):
+        """
+        Open a new physical connection in autocommit mode.
+
+        Otwiera nowe fizyczne połączenie w trybie autocommit.
+        """
+        try:
+            # Użyj parametrów z dsn do nawiązania połączenia
+            conn = psycopg2.connect(connection_factory=PooledConnection, **self.dsn)
+        except psycopg2.OperationalError as e:
+            raise Exception(f"Nie można nawiązać połączenia z bazą danych: {e}")  # Wyjątek gdy połączenie nieudane
+        conn.autocommit = True  # Ustaw tryb autocommit dla połączenia
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _is_healthy(self, conn):
+        """
+        Check that a pooled connection is still usable.
+
+        Sprawdza, czy połączenie z puli nadal działa.
+        """
+        if conn.closed:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _evict_idle(self, now):
+        """
+        Close connections idle for longer than idle_timeout, keeping min_size open. Call with the lock held.
+
+        Zamyka połączenia bezczynne dłużej niż idle_timeout, zostawiając min_size. Wywoływać pod blokadą.
+        """
+        if self.idle_timeout is None:
+            return
+        total = len(self._idle) + len(self._in_use) + self._opening
+        # Najstarsze połączenia są na początku listy
+        while self._idle and total > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.pop(0)
+            self._close_quietly(conn)
+            total -= 1
+
+    def getconn(self):
+        """
+        Take a connection out of the pool, opening a new one if the pool is not full.
+
+        :return: A psycopg2 connection in autocommit mode.
+        :raises PoolTimeout: If no connection became free within checkout_timeout.
+
+        Pobiera połączenie z puli, otwierając nowe, jeśli pula nie jest pełna.
+
+        :return: Połączenie psycopg2 w trybie autocommit.
+        :raises PoolTimeout: Jeśli w czasie checkout_timeout nie zwolniło się żadne połączenie.
+        """
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise Exception("Pula połączeń została zamknięta.")
+                self._evict_idle(time.monotonic())
+                conn = None
+                if self._idle:
+                    conn, _ = self._idle.pop()  # Najświeższe połączenie - najmniej prawdopodobne, że zerwane
+                    self._in_use.add(id(conn))
+                elif len(self._in_use) + self._opening < self.max_size:
+                    self._opening += 1
+                else:
+                    remaining = None
+                    if self.checkout_timeout is not None:
+                        remaining = self.checkout_timeout - (time.monotonic() - started)
+                        if remaining <= 0:
+                            raise PoolTimeout(f"Brak wolnego połączenia w puli po {self.checkout_timeout} s.")
+                    waited = True
+                    self._lock.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                finally:
+                    with self._lock:
+                        self._opening -= 1
+                        if conn is not None:
+                            self._in_use.add(id(conn))
+                        else:
+                            self._lock.notify()
+            elif not self._is_healthy(conn):
+                # Zerwane połączenie - wyrzuć je i spróbuj ponownie
+                with self._lock:
+                    self._in_use.discard(id(conn))
+                    self._discarded += 1
+                    self._lock.notify()
+                self._close_quietly(conn)
+                continue
+
+            with self._lock:
+                wait_time = time.monotonic() - started
+                self._checkouts += 1
+                if waited:
+                    self._waits += 1
+                self._wait_time += wait_time
+                self._max_wait_time = max(self._max_wait_time, wait_time)
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """
+        Return a connection to the pool.
+
+        :param conn: The connection obtained from getconn().
+        :param bool discard: Close the connection instead of keeping it (e.g. after a fatal error).
+
+        Zwraca połączenie do puli.
+
+        :param conn: Połączenie pobrane przez getconn().
+        :param bool discard: Zamknij połączenie zamiast je zachować (np. po krytycznym błędzie).
+        """
+        if not discard and not conn.closed:
+            try:
+                if not conn.autocommit:
+                    conn.rollback()  # Nie oddawaj do puli niezakończonej transakcji
+                    conn.autocommit = True
+            except psycopg2.Error:
+                discard = True
+        with self._lock:
+            self._in_use.discard(id(conn))
+            if discard or conn.closed or self._closed:
+                self._discarded += 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def stats(self):
+        """
+        Return pool statistics useful for sizing the pool.
+
+        :return: Dictionary with connection counts and checkout wait times (in seconds).
+        :rtype: dict
+
+        Zwraca statystyki puli przydatne przy doborze jej rozmiaru.
+
+        :return: Słownik z liczbą połączeń i czasami oczekiwania na połączenie (w sekundach).
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'total_wait_time': self._wait_time,
+                'avg_wait_time': self._wait_time / self._checkouts if self._checkouts else 0.0,
+                'max_wait_time': self._max_wait_time,
+                'discarded': self._discarded,
+            }
+
+    def close(self):
+        """
+        Close all idle connections and refuse further checkouts.
+
+        Zamyka wszystkie bezczynne połączenia i blokuje dalsze pobieranie.
+        """
+        with self._lock:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+            self._idle = []
+            self._lock.notify_all()
+
+
+_pools = {}  # Pule połączeń według parametrów połączenia
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn):
+    """
+    Return the shared pool for the given connection parameters, creating it on first use.
+
+    :param dsn: A dictionary containing connection parameters.
+    :rtype: ConnectionPool
+
+    Zwraca wspólną pulę dla podanych parametrów połączenia, tworząc ją przy pierwszym użyciu.
+
+    :param dsn: Słownik zawierający parametry połączenia.
+    :rtype: ConnectionPool
+    """
+    key = tuple(sorted(dsn.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(dsn, **pool_settings)
+            _pools[key] = pool
+        return pool
+
+
+def pool_stats():
+    """
+    Return statistics of every pool created in this process.
+
+    :return: List of dictionaries, one per pool, with the database host and name added.
+    :rtype: list of dict
+
+    Zwraca statystyki wszystkich pul utworzonych w tym procesie.
+
+    :return: Lista słowników, po jednym na pulę, z dodanym hostem i nazwą bazy.
+    :rtype: list of dict
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    result = []
+    for pool in pools:
+        stats = pool.stats()
+        stats['host'] = pool.dsn.get('host')
+        stats['port'] = pool.dsn.get('port')
+        stats['database'] = pool.dsn.get('database', pool.dsn.get('dbname'))
+        result.append(stats)
+    return result
 
 
 class DatabaseConnection:
-    def __init__(self, dsn):
+    def __init__(self, dsn, pool=None):
         """
         Initialize a new database connection instance.
 
         :param dsn: A dictionary containing connection parameters.
+        :param pool: The pool to take the connection from (default: the shared pool for dsn).
 
         Inicjalizuje nową instancję połączenia z bazą danych.
 
         :param dsn: Słownik zawierający parametry połączenia.
+        :param pool: Pula, z której pobrać połączenie (domyślnie wspólna pula dla dsn).
         """
         self.dsn = dsn  # Data Source Name - szczegóły połączenia
+        self.pool = pool
         self.conn = None  # Przechowuje połączenie z bazą danych
 
     def __enter__(self):
         """
-        Establish the database connection.
+        Take a connection from the pool.
 
         :return: The connection object.
         :raises Exception: If connection cannot be established.
 
-        Nawiązuje połączenie z bazą danych.
+        Pobiera połączenie z puli.
 
         :return: Obiekt połączenia.
         :raises Exception: Jeśli nie można nawiązać połączenia.
         """
-        try:
-            self.conn = psycopg2.connect(**self.dsn)  # Użyj parametrów z dsn do nawiązania połączenia
-            self.conn.autocommit = True  # Ustaw tryb autocommit dla połączenia
-            return self.conn  # Zwróć obiekt połączenia
-        except psycopg2.OperationalError as e:
-            raise Exception(f"Nie można nawiązać połączenia z bazą danych: {e}")  # Wyjątek gdy połączenie nieudane
+        if self.pool is None:
+            self.pool = get_pool(self.dsn)
+        self.conn = self.pool.getconn()
+        return self.conn  # Zwróć obiekt połączenia
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
-        Close the database connection on exit.
+        Return the connection to the pool on exit.
 
         :param exc_type: The exception type.
         :param exc_val: The exception value.
         :param exc_tb: The traceback object.
 
-        Zamyka połączenie z bazą danych przy wyjściu.
+        Zwraca połączenie do puli przy wyjściu.
 
         :param exc_type: Typ wyjątku.
         :param exc_val: Wartość wyjątku.
         :param exc_tb: Obiekt traceback.
         """
         if self.conn:
-            self.conn.close()  # Zamknij połączenie jeśli istnieje
+            # Połączenie zerwane w trakcie pracy nie wraca do puli
+            discard = isinstance(exc_val, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            self.pool.putconn(self.conn, discard=discard)
+            self.conn = None
+            if not isinstance(self, ReadOnlyConnection):
+                # Każde połączenie z serwerem głównym traktujemy jako zapis (read-your-writes)
+                _routing.last_write = time.monotonic()
+
+
+def replicas_from_env(value):
+    """
+    Parse a DB_REPLICAS value (comma-separated host[:port] entries) into replica settings.
+
+    :param str value: The environment variable value.
+    :rtype: list of dict
+
+    Zamienia wartość DB_REPLICAS (host[:port] oddzielone przecinkami) na ustawienia replik.
+    """
+    replicas = []
+    for entry in filter(None, (part.strip() for part in value.split(','))):
+        host, _, port = entry.partition(':')
+        replica = {'host': host}
+        if port:
+            replica['port'] = int(port)
+        replicas.append(replica)
+    return replicas
+
+
+class ReplicaRouter:
+    def __init__(self, primary, replicas, retry_interval=30.0):
+        """
+        Initialize the routing of read-only connections over replicas of a primary.
+
+        :param dict primary: Connection parameters of the primary.
+        :param replicas: Settings of each replica, applied on top of the primary's parameters.
+        :param float retry_interval: Seconds before a replica that failed is tried again.
+
+        Inicjalizuje kierowanie połączeń tylko do odczytu na repliki serwera głównego.
+
+        :param dict primary: Parametry połączenia z serwerem głównym.
+        :param replicas: Ustawienia każdej repliki, nakładane na parametry serwera głównego.
+        :param float retry_interval: Po ilu sekundach ponownie próbować repliki, która zawiodła.
+        """
+        self.primary = primary
+        self.replicas = [{**primary, **replica} for replica in replicas]
+        self.retry_interval = retry_interval
+        self._next = 0  # Indeks repliki, od której zacznie się następny wybór (round-robin)
+        self._down = {}  # Indeks repliki -> czas (monotonic), w którym uznano ją za niedostępną
+        self._lock = threading.Lock()
+
+    def candidates(self):
+        """
+        Return the replicas to try, in round-robin order, skipping those marked down recently.
+
+        :rtype: list of tuple
+        :return: (index, connection parameters) pairs.
+
+        Zwraca repliki do wypróbowania w kolejności round-robin, pomijając niedawno niedostępne.
+        """
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas) if self.replicas else 0
+            order = [(start + offset) % len(self.replicas) for offset in range(len(self.replicas))]
+            return [(index, self.replicas[index]) for index in order
+                    if now - self._down.get(index, -self.retry_interval) >= self.retry_interval]
+
+    def mark_down(self, index):
+        with self._lock:
+            self._down[index] = time.monotonic()
+
+    def mark_up(self, index):
+        with self._lock:
+            self._down.pop(index, None)
+
+    def getconn(self):
+        """
+        Take a connection from the pool of the first healthy replica, or from the primary's pool
+        when no replica is available.
+
+        :return: The pool and the connection taken from it.
+        :rtype: tuple
+
+        Pobiera połączenie z puli pierwszej działającej repliki albo serwera głównego, gdy żadna
+        replika nie jest dostępna.
+        """
+        for index, dsn in self.candidates():
+            try:
+                pool = get_pool(dsn)  # Nowa pula od razu otwiera min_size połączeń
+                conn = pool.getconn()  # Pula sprawdza połączenie (SELECT 1), jeśli health_check jest włączone
+            except PoolTimeout:
+                continue  # Replika działa, ale jest zajęta - spróbuj kolejnej
+            except Exception:
+                self.mark_down(index)
+                continue
+            self.mark_up(index)
+            return pool, conn
+        pool = get_pool(self.primary)
+        return pool, pool.getconn()
+
+
+_routing = threading.local()  # Czas ostatniego zapisu w danym wątku (read-your-writes)
+_routers = {}  # Routery replik według parametrów serwera głównego
+_routers_lock = threading.Lock()
+
+
+def get_router(dsn):
+    """
+    Return the shared replica router for the given primary, creating it on first use.
+
+    Zwraca wspólny router replik dla podanego serwera głównego, tworząc go przy pierwszym użyciu.
+    """
+    key = tuple(sorted(dsn.items()))
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is None:
+            replicas = replica_settings or replicas_from_env(os.environ.get('DB_REPLICAS', ''))
+            router = ReplicaRouter(dsn, replicas, routing_settings['replica_retry_interval'])
+            _routers[key] = router
+        return router
+
+
+def wrote_recently():
+    """
+    Tell whether the current thread used a read-write connection within the read-your-writes window.
+
+    Sprawdza, czy bieżący wątek korzystał z połączenia do zapisu w oknie read-your-writes.
+    """
+    last_write = getattr(_routing, 'last_write', None)
+    return last_write is not None and time.monotonic() - last_write < routing_settings['read_your_writes_window']
+
+
+class ReadOnlyConnection(DatabaseConnection):
+    def __init__(self, dsn, router=None):
+        """
+        Initialize a read-only connection routed to a replica of the given primary.
+
+        :param dsn: Connection parameters of the primary.
+        :param router: The replica router to use (default: the shared router for dsn).
+
+        Inicjalizuje połączenie tylko do odczytu kierowane na replikę podanego serwera głównego.
+
+        :param dsn: Parametry połączenia z serwerem głównym.
+        :param router: Router replik (domyślnie wspólny router dla dsn).
+        """
+        super().__init__(dsn)
+        self.router = router
+
+    def __enter__(self):
+        """
+        Take a connection from a replica, or from the primary right after this thread wrote to it,
+        so that the thread reads its own writes despite replication lag.
+
+        Pobiera połączenie z repliki albo z serwera głównego tuż po zapisie tego wątku, aby wątek
+        widział własne zmiany mimo opóźnienia replikacji.
+        """
+        if self.router is None:
+            self.router = get_router(self.dsn)
+        if not self.router.replicas or wrote_recently():
+            self.pool = get_pool(self.dsn)
+            self.conn = self.pool.getconn()
+        else:
+            self.pool, self.conn = self.router.getconn()
+        return self.conn
 
 
-def connect():
+def connect(readonly=False):
     """
     Connect to the database using predefined settings.
 
+    :param bool readonly: Route the connection to a read-only replica when one is configured.
     :return: An instance of DatabaseConnection.
 
     Łączy się z bazą danych używając predefiniowanych ustawień.
 
+    :param bool readonly: Kieruj połączenie na replikę tylko do odczytu, jeśli jest skonfigurowana.
     :return: Instancja DatabaseConnection.
     """
-    settings = {
-        'host': 'localhost',  # Adres hosta
-        'user': 'postgres',  # Nazwa użytkownika
-        'password': 'Citro123456ok',  # Hasło
-        'database': 'my_db'  # Nazwa bazy danych
-    }
+    if readonly:
+        return ReadOnlyConnection(settings)
     return DatabaseConnection(settings)  # Zwróć nową instancję DatabaseConnection
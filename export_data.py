@@ -0,0 +1,167 @@
+"""Streaming export of users and messages with COPY TO STDOUT.
+
+Rows go from the server straight into the output file (optionally gzip-compressed) in chunks, without
+building Python objects, so memory use does not depend on the size of the export.
+
+Run from the repository root:
+    python export_data.py messages --format jsonl --gzip --user 42 --since 2024-01-01 -o messages.jsonl.gz
+
+Strumieniowy eksport użytkowników i wiadomości poleceniem COPY TO STDOUT. Wiersze trafiają z serwera
+prosto do pliku (opcjonalnie skompresowanego gzipem), bez tworzenia obiektów Pythona, więc zużycie
+pamięci nie zależy od wielkości eksportu.
+"""
+import argparse
+import datetime
+import gzip
+import sys
+import time
+
+from connection_db import connect
+from models import MESSAGE_COLUMNS, date_range_filter, user_messages_query
+
+USER_EXPORT_COLUMNS = "id, username"  # Hasła (skróty) nie są eksportowane
+
+FORMATS = ('csv', 'jsonl')
+
+# JSON Lines przez COPY w formacie csv z separatorem i cudzysłowem, które nie występują w tekście JSON
+# (row_to_json zamienia znaki sterujące na sekwencje \uXXXX), dzięki czemu wiersz jest wypisywany bez zmian.
+# Format text podwajałby ukośniki wsteczne.
+JSONL_OPTIONS = "FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02'"
+CSV_OPTIONS = "FORMAT csv, HEADER"
+
+
+class CountingWriter:
+    def __init__(self, file):
+        """
+        Wrap a binary file and count the bytes written to it.
+
+        :param file: The file object receiving the COPY data.
+
+        Opakowuje plik binarny i zlicza zapisane do niego bajty.
+        """
+        self.file = file
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        return self.file.write(data)
+
+
+def users_query(user_id=None):
+    """
+    Build the export query for users.
+
+    :param user_id: Export only this user, or None for all users.
+    :rtype: str
+    :return: Query taking the user_id parameter when it is given.
+    """
+    where = " WHERE id = %(user_id)s" if user_id is not None else ""
+    return f"SELECT {USER_EXPORT_COLUMNS} FROM users{where} ORDER BY id"
+
+
+def messages_query(user_id=None, since=None, until=None):
+    """
+    Build the export query for messages, sent or received by one user or all of them.
+
+    :param user_id: Export only messages of this user, or None for all messages.
+    :param since: Lower bound (inclusive) of creation_date, or None.
+    :param until: Upper bound (exclusive) of creation_date, or None.
+    :rtype: str
+    :return: Query taking the user_id and since/until parameters when they are given.
+    """
+    if user_id is not None:
+        return user_messages_query(since, until)
+    dates = date_range_filter(since, until)
+    return f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE TRUE{dates}"
+
+
+def copy_query(cursor, query, values, fmt):
+    """
+    Build the COPY TO STDOUT statement for a query in the given format.
+
+    COPY takes no parameters, so the values are bound client-side with mogrify.
+
+    :rtype: str
+    """
+    query = cursor.mogrify(query, values).decode()
+    if fmt == 'jsonl':
+        return f"COPY (SELECT row_to_json(r) FROM ({query}) AS r) TO STDOUT WITH ({JSONL_OPTIONS})"
+    return f"COPY ({query}) TO STDOUT WITH ({CSV_OPTIONS})"
+
+
+def export(cursor, table, path, fmt='csv', compress=False, user_id=None, since=None, until=None):
+    """
+    Stream users or messages into a CSV or JSON Lines file.
+
+    EN: Runs COPY TO STDOUT and writes its output straight to the file; '-' writes to standard output.
+    PL: Wykonuje COPY TO STDOUT i zapisuje wynik bezpośrednio do pliku; '-' oznacza standardowe wyjście.
+
+    :param cursor: The database cursor to use for the export.
+    :param table: 'users' or 'messages'.
+    :param path: Output file path, or '-' for standard output.
+    :param fmt: 'csv' or 'jsonl'.
+    :param compress: Whether to gzip the output.
+    :param user_id: Export only this user (or messages sent or received by them).
+    :param since: Export only messages created at or after this time.
+    :param until: Export only messages created before this time.
+    :type cursor: cursor
+    :type table: str
+    :type path: str
+    :type fmt: str
+    :type compress: bool
+    :type user_id: int or None
+    :type since: datetime or None
+    :type until: datetime or None
+
+    :rtype: dict
+    :return: The number of rows and bytes exported, elapsed seconds and throughput.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Nieznany format eksportu: {fmt}")
+    values = {'user_id': user_id, 'since': since, 'until': until}
+    query = users_query(user_id) if table == 'users' else messages_query(user_id, since, until)
+    sql = copy_query(cursor, query, values, fmt)
+
+    output = sys.stdout.buffer if path == '-' else open(path, 'wb')
+    try:
+        target = gzip.GzipFile(fileobj=output, mode='wb') if compress else output
+        writer = CountingWriter(target)
+        start = time.perf_counter()
+        cursor.copy_expert(sql, writer)
+        if compress:
+            target.close()
+        elapsed = time.perf_counter() - start
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    rows = cursor.rowcount
+    return {
+        'table': table,
+        'rows': rows,
+        'bytes': writer.bytes,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else 0.0,
+        'mb_per_sec': writer.bytes / elapsed / 1_000_000 if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Strumieniowy eksport użytkowników i wiadomości (COPY TO).")
+    parser.add_argument('table', choices=('users', 'messages'))
+    parser.add_argument('-o', '--output', default='-', help="plik wynikowy ('-' - standardowe wyjście)")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--gzip', action='store_true', help="kompresuj wynik gzipem")
+    parser.add_argument('--user', type=int, help="tylko ten użytkownik / jego wiadomości")
+    parser.add_argument('--since', type=datetime.datetime.fromisoformat, metavar='YYYY-MM-DD',
+                        help="tylko wiadomości od tej daty")
+    parser.add_argument('--until', type=datetime.datetime.fromisoformat, metavar='YYYY-MM-DD',
+                        help="tylko wiadomości sprzed tej daty")
+    args = parser.parse_args()
+
+    with connect(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            result = export(cursor, args.table, args.output, args.format, args.gzip, args.user, args.since, args.until)
+    # Raport na stderr, aby nie mieszał się z danymi wypisywanymi na standardowe wyjście
+    print(f"Wyeksportowano {result['rows']} wierszy ({result['bytes'] / 1_000_000:.1f} MB nieskompresowanych) "
+          f"w {result['seconds']:.2f} s: {result['rows_per_sec']:.0f} wierszy/s, {result['mb_per_sec']:.1f} MB/s",
+          file=sys.stderr)
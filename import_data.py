@@ -0,0 +1,297 @@
+"""Validated bulk import of users and messages from CSV or JSON Lines files.
+
+Rows are read in chunks and loaded with COPY into an unlogged staging table, validated there with
+set-based SQL and merged into users/messages with a single INSERT ... SELECT. Rows that fail
+validation are not imported; they are written with the reason to a CSV file of rejected rows.
+
+Expected columns: users - username, password (plain text, hashed on import);
+messages - from_id, to_id, text and optionally creation_date (ISO format), within the range of the monthly
+partitions of messages.
+
+Run from the repository root:
+    python import_data.py users legacy_users.csv --rejects users_rejected.csv
+
+Zweryfikowany import użytkowników i wiadomości z plików CSV lub JSON Lines. Wiersze są ładowane
+poleceniem COPY do nielogowanej tabeli pomocniczej, sprawdzane w niej zapytaniami SQL i dołączane do
+users/messages jednym poleceniem INSERT ... SELECT. Odrzucone wiersze trafiają z przyczyną do pliku CSV.
+"""
+import argparse
+import csv
+import datetime
+import functools
+import itertools
+import json
+import os
+import sys
+import time
+
+from bulk_copy import copy_rows
+from connection_db import connect
+from Creation_db.migrations import partitioned_range
+from models import PARALLEL_HASH_THRESHOLD, hash_passwords, transaction
+
+FORMATS = ('csv', 'jsonl')
+# Hasła są haszowane porcja po porcji, a hash_passwords używa puli procesów dopiero od PARALLEL_HASH_THRESHOLD
+# haseł - porcja musi być co najmniej tak duża (z zapasem na odrzucone wiersze), inaczej import haszuje
+# w jednym procesie
+DEFAULT_CHUNK_SIZE = 2 * PARALLEL_HASH_THRESHOLD
+
+# Ograniczenia kolumn zgodne ze schematem w Creation_db/migrations.py (VARCHAR(255))
+MAX_USERNAME_LENGTH = 255
+MAX_TEXT_LENGTH = 255
+# Zakres kolumn INTEGER (from_id, to_id); ID spoza niego przerwałoby COPY całej porcji
+MAX_ID = 2 ** 31 - 1
+
+STAGING_COLUMNS = {
+    'users': ('record', 'username', 'hashed_password', 'reason'),
+    'messages': ('record', 'from_id', 'to_id', 'text', 'creation_date', 'reason'),
+}
+
+STAGING_TABLES = {
+    'users': """
+        CREATE UNLOGGED TABLE {name} (
+            record INTEGER PRIMARY KEY,
+            username TEXT,
+            hashed_password TEXT,
+            reason TEXT
+        )
+    """,
+    'messages': """
+        CREATE UNLOGGED TABLE {name} (
+            record INTEGER PRIMARY KEY,
+            from_id INTEGER,
+            to_id INTEGER,
+            text TEXT,
+            creation_date TIMESTAMP,
+            reason TEXT
+        )
+    """,
+}
+
+# Kolejne reguły oznaczają wiersze, które nie mają jeszcze przyczyny odrzucenia, więc każdy wiersz
+# dostaje pierwszą niespełnioną regułę. {name} to tabela pomocnicza.
+VALIDATION_RULES = {
+    'users': [
+        ("missing username", "username IS NULL OR username = ''"),
+        ("username too long", f"length(username) > {MAX_USERNAME_LENGTH}"),
+        ("duplicate username in file",
+         "EXISTS (SELECT 1 FROM {name} AS first WHERE first.username = s.username AND first.record < s.record)"),
+        ("username already exists", "EXISTS (SELECT 1 FROM users AS u WHERE u.username = s.username)"),
+    ],
+    'messages': [
+        ("unknown from_id", "NOT EXISTS (SELECT 1 FROM users AS u WHERE u.id = s.from_id)"),
+        ("unknown to_id", "NOT EXISTS (SELECT 1 FROM users AS u WHERE u.id = s.to_id)"),
+        ("text too long", f"length(s.text) > {MAX_TEXT_LENGTH}"),
+    ],
+}
+
+# Dołączenie poprawnych wierszy jednym poleceniem. Nazwy zajęte w międzyczasie przez inną sesję
+# (ON CONFLICT) są oznaczane jako odrzucone, zamiast przerywać cały import.
+MERGE_QUERIES = {
+    'users': """
+        WITH inserted AS (
+            INSERT INTO users(username, hashed_password)
+            SELECT username, hashed_password FROM {name} WHERE reason IS NULL ORDER BY record
+            ON CONFLICT (username) DO NOTHING
+            RETURNING username
+        )
+        UPDATE {name} AS s SET reason = 'username already exists'
+        WHERE s.reason IS NULL AND NOT EXISTS (SELECT 1 FROM inserted WHERE inserted.username = s.username)
+    """,
+    'messages': """
+        INSERT INTO messages(from_id, to_id, text, creation_date)
+        SELECT from_id, to_id, text, COALESCE(creation_date, LOCALTIMESTAMP) FROM {name}
+        WHERE reason IS NULL ORDER BY record
+    """,
+}
+
+
+def read_records(path, fmt):
+    """
+    Read dict records from a CSV file (with a header row) or a JSON Lines file.
+
+    :param path: Input file path, or '-' for standard input.
+    :param fmt: 'csv' or 'jsonl'.
+    :return: Iterator of (record number, dict or None) pairs; None marks a line that could not be parsed.
+    """
+    file = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+    try:
+        if fmt == 'csv':
+            for number, record in enumerate(csv.DictReader(file), 1):
+                yield number, record
+        else:
+            for number, line in enumerate((line for line in file if line.strip()), 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield number, record if isinstance(record, dict) else None
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+def _optional_id(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, (bool, float)):
+        raise ValueError(f"not an integer ID: {value!r}")  # int() przyjąłby True lub obciął 1.5
+    id_ = int(value)
+    if not 0 < id_ <= MAX_ID:
+        raise ValueError(f"ID out of range: {id_}")
+    return id_
+
+
+def _optional_date(value):
+    return None if value in (None, '') else datetime.datetime.fromisoformat(value)
+
+
+def user_rows(chunk):
+    """
+    Convert a chunk of user records into staging rows, hashing all passwords in one batch.
+
+    Przekształca porcję rekordów użytkowników w wiersze tabeli pomocniczej, haszując hasła zbiorczo.
+    """
+    rows = []
+    passwords = []
+    for number, record in chunk:
+        if record is None:
+            rows.append((number, None, None, "malformed record"))
+        elif record.get('username') is not None and not isinstance(record['username'], str):
+            # Liczba lub lista z JSON Lines nie może trafić do users jako tekst po str()
+            rows.append((number, None, None, "invalid username"))
+        elif not record.get('password'):
+            rows.append((number, record.get('username'), None, "missing password"))
+        elif not isinstance(record['password'], str):
+            # JSON Lines może zawierać liczbę lub listę - hash_passwords przyjmuje tylko tekst
+            rows.append((number, record.get('username'), None, "invalid password"))
+        else:
+            rows.append((number, record.get('username'), None, None))
+            passwords.append(record['password'])
+    hashed = iter(hash_passwords(passwords)) if passwords else iter(())
+    return [(number, username, next(hashed) if reason is None else None, reason)
+            for number, username, _, reason in rows]
+
+
+def message_rows(chunk, date_range=None):
+    """
+    Convert a chunk of message records into staging rows; values of the wrong type and IDs outside
+    the INTEGER range are rejected here, and so are creation dates outside `date_range`, the (lower, upper)
+    bounds of partitioned_range().
+
+    Przekształca porcję rekordów wiadomości w wiersze tabeli pomocniczej; wartości złego typu, ID spoza
+    zakresu INTEGER oraz daty utworzenia spoza zakresu partycji `date_range` są odrzucane.
+    """
+    rows = []
+    for number, record in chunk:
+        if record is None:
+            rows.append((number, None, None, None, None, "malformed record"))
+            continue
+        try:
+            from_id = _optional_id(record.get('from_id'))
+            to_id = _optional_id(record.get('to_id'))
+            creation_date = _optional_date(record.get('creation_date'))
+        except (TypeError, ValueError) as e:
+            rows.append((number, None, None, None, None, f"invalid value: {e}"))
+            continue
+        reason = "missing from_id or to_id" if from_id is None or to_id is None else None
+        text = record.get('text')
+        if text is not None and not isinstance(text, str):
+            text, reason = None, reason or "invalid text"
+        if (reason is None and creation_date is not None and date_range is not None
+                and not date_range[0] <= creation_date.replace(tzinfo=None) < date_range[1]):
+            reason = f"creation_date outside partitions [{date_range[0]}, {date_range[1]})"
+        rows.append((number, from_id, to_id, text, creation_date, reason))
+    return rows
+
+
+def import_file(connection, table, path, fmt='csv', rejects_path=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import users or messages from a file, rejecting invalid rows.
+
+    EN: Loads the file into an unlogged staging table with COPY, validates it with VALIDATION_RULES and
+    merges the valid rows in one transaction. Rejected rows are written to `rejects_path` as CSV.
+    PL: Ładuje plik do nielogowanej tabeli pomocniczej poleceniem COPY, sprawdza ją regułami VALIDATION_RULES
+    i dołącza poprawne wiersze w jednej transakcji. Odrzucone wiersze są zapisywane do `rejects_path` (CSV).
+
+    :param connection: Database connection in autocommit mode (as handed out by the pool).
+    :param table: 'users' or 'messages'.
+    :param path: Input file path, or '-' for standard input.
+    :param fmt: 'csv' or 'jsonl'.
+    :param rejects_path: Where to write rejected rows, None to skip the report.
+    :param chunk_size: Records read, hashed and copied at a time. Passwords are hashed in parallel only when
+        a chunk holds at least models.PARALLEL_HASH_THRESHOLD of them.
+    :type table: str
+    :type path: str
+    :type fmt: str
+    :type rejects_path: str or None
+    :type chunk_size: int
+
+    :rtype: dict
+    :return: Numbers of read, imported and rejected rows and elapsed seconds.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Nieznany format importu: {fmt}")
+    name = f"import_{table}_{os.getpid()}"
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        if table == 'users':
+            to_rows = user_rows
+        else:
+            to_rows = functools.partial(message_rows, date_range=partitioned_range(cursor))
+        cursor.execute(STAGING_TABLES[table].format(name=name))
+        try:
+            read = 0
+            records = read_records(path, fmt)
+            while True:
+                chunk = list(itertools.islice(records, chunk_size))
+                if not chunk:
+                    break
+                copy_rows(cursor, name, STAGING_COLUMNS[table], to_rows(chunk))
+                read += len(chunk)
+            cursor.execute(f"ANALYZE {name}")
+
+            with transaction(connection):
+                for reason, condition in VALIDATION_RULES[table]:
+                    cursor.execute(f"UPDATE {name} AS s SET reason = %s "
+                                   f"WHERE s.reason IS NULL AND ({condition.format(name=name)})", (reason,))
+                cursor.execute(MERGE_QUERIES[table].format(name=name))
+            cursor.execute(f"SELECT count(*) FROM {name} WHERE reason IS NOT NULL")
+            rejected = cursor.fetchone()[0]
+
+            if rejects_path and rejected:
+                key_columns = 'username' if table == 'users' else 'from_id, to_id'
+                with open(rejects_path, 'w', encoding='utf-8', newline='') as file:
+                    cursor.copy_expert(f"COPY (SELECT record, {key_columns}, reason FROM {name} "
+                                       f"WHERE reason IS NOT NULL ORDER BY record) TO STDOUT WITH (FORMAT csv, HEADER)",
+                                       file)
+        finally:
+            cursor.execute(f"DROP TABLE IF EXISTS {name}")
+    return {
+        'table': table,
+        'read': read,
+        'imported': read - rejected,
+        'rejected': rejected,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Zweryfikowany import użytkowników i wiadomości z pliku.")
+    parser.add_argument('table', choices=('users', 'messages'))
+    parser.add_argument('input', help="plik wejściowy ('-' - standardowe wejście)")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="format pliku (domyślnie według rozszerzenia, .jsonl - JSON Lines, inne - CSV)")
+    parser.add_argument('--rejects', default='rejected.csv', help="plik CSV na odrzucone wiersze")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"liczba wierszy na porcję (domyślnie %(default)s); hasła są haszowane równolegle "
+                             f"tylko w porcjach od {PARALLEL_HASH_THRESHOLD} haseł")
+    args = parser.parse_args()
+    fmt = args.format or ('jsonl' if args.input.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+    with connect() as conn:
+        result = import_file(conn, args.table, args.input, fmt, args.rejects, args.chunk_size)
+    print(f"Wczytano {result['read']} wierszy: zaimportowano {result['imported']}, "
+          f"odrzucono {result['rejected']} w {result['seconds']:.2f} s.")
+    if result['rejected']:
+        print(f"Odrzucone wiersze zapisano w pliku {args.rejects}.")
@@ -1,5 +1,21 @@
-from connection_db import connect
-from models import User, Message
+import argparse
+import datetime
+import shlex
+import sys
+import time
+from collections import defaultdict
+
+from connection_db import connect, instrumentation_settings, pool_stats, query_stats
+from models import User, Message, Conversation
+from notifications import InboxSubscriber
+from session import Session
+
+PAGE_SIZE = 20  # Liczba pozycji na stronie przy przeglądaniu
+BATCH_SIZE = 100  # Liczba poleceń w jednej transakcji w trybie wsadowym
+USER_CACHE_SIZE = 1024  # Liczba użytkowników trzymanych w pamięci podręcznej
+USER_CACHE_TTL = 60.0  # Po ilu sekundach użytkownik w pamięci podręcznej jest odczytywany z bazy ponownie
+MISSING_USERNAMES_SIZE = 10000  # Liczba zapamiętanych nieistniejących nazw użytkowników
+MISSING_USERNAMES_TTL = 30.0  # Po ilu sekundach nieistniejąca nazwa jest ponownie sprawdzana w bazie
 
 
 def main_menu():
@@ -9,6 +25,7 @@ def main_menu():
         """
     print("1. Zarządzaj użytkownikami")
     print("2. Zarządzaj wiadomościami")
+    print("3. Pokaż statystyki zapytań")
     print("0. Wyjście")
 
     choice = input("Wybierz opcję: ")
@@ -16,12 +33,37 @@ def main_menu():
         manage_users()
     elif choice == "2":
         manage_messages()
+    elif choice == "3":
+        show_statistics()
     elif choice == "0":
         exit()
     else:
         print("Nieprawidłowa opcja!")
 
 
+def show_statistics():
+    """
+        Wyświetla statystyki zapytań, puli połączeń i pamięci podręcznej użytkowników.
+        Displays query, connection pool and user cache statistics.
+        """
+    if instrumentation_settings['enabled']:
+        print(query_stats.report())
+    else:
+        print("Statystyki zapytań są wyłączone - uruchom z DB_QUERY_STATS=1, aby je zbierać.")
+    for stats in pool_stats():
+        print(f"Pula {stats['host']}:{stats['port'] or 5432}/{stats['database']}: w użyciu {stats['in_use']}, "
+              f"wolne {stats['idle']}, pobrań {stats['checkouts']}, "
+              f"śr. czekanie {stats['avg_wait_time'] * 1000:.2f} ms")
+    if User.cache is not None:
+        stats = User.cache.stats()
+        print(f"Pamięć podręczna użytkowników: {stats['size']}/{stats['maxsize']}, trafienia {stats['hits']}, "
+              f"chybienia {stats['misses']}")
+    if User.missing_usernames is not None:
+        stats = User.missing_usernames.stats()
+        print(f"Nieistniejące nazwy: {stats['size']}/{stats['maxsize']}, trafienia {stats['hits']}, "
+              f"chybienia {stats['misses']}")
+
+
 def manage_users():
     """
         Wyświetla menu zarządzania użytkownikami.
@@ -31,6 +73,8 @@ def manage_users():
     print("2. Zmodyfikuj użytkownika")
     print("3. Usuń użytkownika")
     print("4. Pokaż wszystkich użytkowników")
+    print("5. Przeglądaj użytkowników stronami")
+    print("6. Zaloguj się")
     print("0. Powrót do głównego menu")
 
     choice = input("Wybierz opcję: ")
@@ -42,6 +86,10 @@ def manage_users():
         delete_user()
     elif choice == "4":
         list_users()
+    elif choice == "5":
+        browse_users()
+    elif choice == "6":
+        login()
     elif choice == "0":
         return
     else:
@@ -98,18 +146,71 @@ def delete_user():
                 print("Nie znaleziono użytkownika.")
 
 
+def login():
+    """
+        Sprawdza nazwę użytkownika i hasło.
+        Checks a username and password.
+        """
+    username = input("Podaj nazwę użytkownika: ")
+    password = input("Podaj hasło: ")
+    # Serwer główny, nie replika: nazwa nieznaleziona na opóźnionej replice trafiłaby do pamięci nieistniejących nazw
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            user = User.authenticate(cursor, username, password)
+    if user:
+        print(f"Zalogowano jako {user.username} (ID: {user.id}).")
+    else:
+        print("Nieprawidłowa nazwa użytkownika lub hasło.")
+
+
 def list_users():
     """
         Wyświetla listę wszystkich użytkowników.
         Displays a list of all users.
         """
-    with connect() as conn:
+    with connect(readonly=True) as conn:
         with conn.cursor() as cursor:
-            users = User.load_all_users(cursor)
-            for user in users:
+            for user in User.iter_all_users(cursor):
                 print(f"ID: {user.id}, Nazwa użytkownika: {user.username}")
 
 
+def next_page_requested(page):
+    """
+        Pyta, czy pokazać następną stronę. Zwraca False, gdy strona była ostatnia.
+        Asks whether to show the next page. Returns False when the page was the last one.
+        """
+    if len(page) < PAGE_SIZE:
+        print("Koniec listy.")
+        return False
+    return input("n - następna strona, inny klawisz - powrót: ").strip().lower() == "n"
+
+
+def input_date(prompt):
+    """
+        Pyta o datę w formacie RRRR-MM-DD. Zwraca None, gdy użytkownik nic nie poda.
+        Asks for a date in YYYY-MM-DD format. Returns None when the user enters nothing.
+        """
+    value = input(prompt).strip()
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def browse_users():
+    """
+        Wyświetla użytkowników strona po stronie.
+        Displays users page by page.
+        """
+    after = None
+    with connect(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            while True:
+                users = User.load_users_page(cursor, after, PAGE_SIZE)
+                for user in users:
+                    print(f"ID: {user.id}, Nazwa użytkownika: {user.username}")
+                if not next_page_requested(users):
+                    break
+                after = users[-1].id
+
+
 def manage_messages():
     """
        Wyświetla menu zarządzania wiadomościami.
@@ -117,6 +218,10 @@ def manage_messages():
        """
     print("1. Wyślij wiadomość")
     print("2. Pokaż moje wiadomości")
+    print("3. Przeglądaj moje wiadomości stronami")
+    print("4. Skrzynka odbiorcza")
+    print("5. Szukaj w moich wiadomościach")
+    print("6. Obserwuj skrzynkę odbiorczą")
     print("0. Powrót do głównego menu")
 
     choice = input("Wybierz opcję: ")
@@ -124,6 +229,14 @@ def manage_messages():
         send_message()
     elif choice == "2":
         list_messages()
+    elif choice == "3":
+        browse_messages()
+    elif choice == "4":
+        show_inbox()
+    elif choice == "5":
+        search_messages()
+    elif choice == "6":
+        watch_inbox()
     elif choice == "0":
         return
     else:
@@ -151,17 +264,448 @@ def list_messages():
        Displays all messages for a given user.
        """
     user_id = int(input("Podaj swoje ID, aby zobaczyć wiadomości: "))
-    with connect() as conn:
+    with connect(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            for msg in Message.iter_messages(cursor, user_id):
+                print(f"Od: {msg.from_id}, Do: {msg.to_id}, Wiadomość: {msg.text}, Data: {msg.creation_date}")
+
+
+def browse_messages():
+    """
+       Wyświetla wiadomości danego użytkownika strona po stronie, od najnowszych.
+       Displays messages of a given user page by page, newest first.
+       """
+    user_id = int(input("Podaj swoje ID, aby zobaczyć wiadomości: "))
+    since = input_date("Od dnia RRRR-MM-DD (Enter - bez ograniczenia): ")
+    until = input_date("Przed dniem RRRR-MM-DD (Enter - bez ograniczenia): ")
+    after = None
+    with connect(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            while True:
+                messages = Message.load_messages_page(cursor, user_id, after, PAGE_SIZE, since, until)
+                for msg in messages:
+                    print(f"Od: {msg.from_id}, Do: {msg.to_id}, Wiadomość: {msg.text}, Data: {msg.creation_date}")
+                if not next_page_requested(messages):
+                    break
+                after = messages[-1].page_key()
+
+
+def show_inbox():
+    """
+       Wyświetla skrzynkę odbiorczą: rozmowy z ostatnią wiadomością i liczbą nieprzeczytanych.
+       Displays the inbox: conversations with their last message and unread count.
+       """
+    user_id = int(input("Podaj swoje ID, aby zobaczyć skrzynkę odbiorczą: "))
+    with connect(readonly=True) as conn:
         with conn.cursor() as cursor:
-            messages = Message.load_all_messages(cursor, user_id)
+            for conversation in Conversation.load_inbox(cursor, user_id):
+                print(f"Rozmówca: {conversation.partner_id}, Nieprzeczytane: {conversation.unread_count}, "
+                      f"Ostatnia: {conversation.last_text} ({conversation.last_date})")
+    partner_id = input("Podaj ID rozmówcy, aby oznaczyć rozmowę jako przeczytaną (Enter - powrót): ")
+    if partner_id.strip():
+        with connect() as conn:
+            with conn.cursor() as cursor:
+                marked = Message.mark_read(cursor, user_id, int(partner_id))
+        print(f"Oznaczono jako przeczytane: {marked}.")
+
+
+def watch_inbox():
+    """
+       Wyświetla nowe wiadomości użytkownika od razu po ich nadejściu, aż do naciśnięcia Ctrl+C.
+       Displays the user's new messages as soon as they arrive, until Ctrl+C is pressed.
+       """
+    user_id = int(input("Podaj swoje ID, aby obserwować skrzynkę odbiorczą: "))
+    print("Czekam na nowe wiadomości (Ctrl+C - powrót)...")
+    try:
+        # Serwer główny: powiadomienia (NOTIFY) są wysyłane tylko tam, repliki ich nie przekazują
+        with connect() as conn:
+            with InboxSubscriber(conn, user_id) as subscriber:
+                for msg in subscriber.listen():
+                    print(f"Od: {msg.from_id}, Wiadomość: {msg.text}, Data: {msg.creation_date}")
+    except KeyboardInterrupt:
+        print()
+
+
+def search_messages():
+    """
+       Wyszukuje tekst w wiadomościach wysłanych i odebranych przez użytkownika.
+       Searches the text of messages sent and received by the user.
+       """
+    user_id = int(input("Podaj swoje ID: "))
+    query = input("Czego szukasz? ")
+    with connect(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            messages = Message.search(cursor, user_id, query, PAGE_SIZE)
             for msg in messages:
                 print(f"Od: {msg.from_id}, Do: {msg.to_id}, Wiadomość: {msg.text}, Data: {msg.creation_date}")
+            if not messages:
+                print("Nie znaleziono wiadomości.")
+
+
+# Tryb wsadowy_________________________________________________________________________________________________________
+# Polecenia wsadowe przyjmują sesję (session.Session) i argumenty z argparse; wszystkie działają na jednym
+# połączeniu. Zapisy trafiają do sesji i są wysyłane zbiorczo przy zatwierdzaniu porcji, odczyty - od razu.
+# Polecenia odroczone (DEFERRED_COMMANDS) zwracają obiekt dodany do sesji.
+
+def print_message(msg):
+    print(f"Od: {msg.from_id}, Do: {msg.to_id}, Wiadomość: {msg.text}, Data: {msg.creation_date}")
+
+
+def cmd_add_user(session, args):
+    return session.add(User(username=args.username, password=args.password))
+
+
+def cmd_modify_user(session, args):
+    user = session.get(User, args.id)
+    if not user:
+        raise LookupError(f"Nie znaleziono użytkownika {args.id}.")
+    user.username = args.username
+    user.set_password(args.password)
+
+
+def cmd_delete_user(session, args):
+    user = session.get(User, args.id)
+    if not user:
+        raise LookupError(f"Nie znaleziono użytkownika {args.id}.")
+    session.delete(user)
+
+
+def cmd_login(session, args):
+    user = User.authenticate(session.cursor, args.username, args.password)
+    if not user:
+        raise LookupError("Nieprawidłowa nazwa użytkownika lub hasło.")
+    print(f"Zalogowano jako {user.username} (ID: {user.id}).")
+
+
+def cmd_list_users(session, args):
+    for user in User.iter_all_users(session.cursor):
+        print(f"ID: {user.id}, Nazwa użytkownika: {user.username}")
+
+
+def cmd_send(session, args):
+    return session.add(Message(from_id=args.from_id, to_id=args.to_id, text=args.text))
+
+
+def cmd_list_messages(session, args):
+    for msg in Message.iter_messages(session.cursor, args.user_id, since=args.since, until=args.until):
+        print_message(msg)
+
+
+def cmd_inbox(session, args):
+    for conversation in Conversation.load_inbox(session.cursor, args.user_id):
+        print(f"Rozmówca: {conversation.partner_id}, Nieprzeczytane: {conversation.unread_count}, "
+              f"Ostatnia: {conversation.last_text} ({conversation.last_date})")
+
+
+def cmd_mark_read(session, args):
+    print(f"Oznaczono jako przeczytane: {Message.mark_read(session.cursor, args.user_id, args.partner_id)}.")
+
+
+def cmd_search(session, args):
+    for msg in Message.search(session.cursor, args.user_id, args.query, args.limit):
+        print_message(msg)
+
+
+# Polecenia, które tylko rejestrują obiekty w sesji i nie wysyłają zapytań -> komunikat po zapisaniu obiektu
+DEFERRED_COMMANDS = {
+    'add-user': "Dodano użytkownika {0.id}.",
+    'send': None,
+}
+
+
+class CommandError(Exception):
+    """Niepoprawne polecenie w skrypcie wsadowym."""
+
+
+class CommandParser(argparse.ArgumentParser):
+    def error(self, message):
+        # Błąd w jednej linii skryptu nie może kończyć całego programu
+        raise CommandError(message)
+
+    def exit(self, status=0, message=None):
+        # -h/--help wypisuje pomoc i woła exit(); w skrypcie to błąd linii, a nie koniec programu
+        raise CommandError(message.strip() if message else "polecenie w skrypcie nie może kończyć programu (-h)")
+
+
+def build_parser(parser_class=argparse.ArgumentParser):
+    """
+        Tworzy parser poleceń wsadowych; ten sam parser czyta argumenty programu i linie skryptu.
+        Builds the batch command parser; the same parser reads program arguments and script lines.
+        """
+    parser = parser_class(prog='main.py', description="Warsztat - tryb wsadowy. Bez argumentów uruchamia menu.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help="liczba poleceń w jednej transakcji (domyślnie %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True, parser_class=parser_class)
+
+    command = commands.add_parser('add-user', help="dodaj użytkownika")
+    command.add_argument('username')
+    command.add_argument('password')
+    command.set_defaults(handler=cmd_add_user)
+
+    command = commands.add_parser('modify-user', help="zmień nazwę i hasło użytkownika")
+    command.add_argument('id', type=int)
+    command.add_argument('username')
+    command.add_argument('password')
+    command.set_defaults(handler=cmd_modify_user)
+
+    command = commands.add_parser('delete-user', help="usuń użytkownika")
+    command.add_argument('id', type=int)
+    command.set_defaults(handler=cmd_delete_user)
+
+    command = commands.add_parser('login', help="sprawdź nazwę użytkownika i hasło")
+    command.add_argument('username')
+    command.add_argument('password')
+    command.set_defaults(handler=cmd_login)
+
+    command = commands.add_parser('list-users', help="pokaż wszystkich użytkowników")
+    command.set_defaults(handler=cmd_list_users)
+
+    command = commands.add_parser('send', help="wyślij wiadomość")
+    command.add_argument('from_id', type=int)
+    command.add_argument('to_id', type=int)
+    command.add_argument('text')
+    command.set_defaults(handler=cmd_send)
+
+    command = commands.add_parser('list-messages', help="pokaż wiadomości użytkownika")
+    command.add_argument('user_id', type=int)
+    command.add_argument('--since', type=datetime.datetime.fromisoformat, metavar='YYYY-MM-DD')
+    command.add_argument('--until', type=datetime.datetime.fromisoformat, metavar='YYYY-MM-DD')
+    command.set_defaults(handler=cmd_list_messages)
+
+    command = commands.add_parser('inbox', help="pokaż skrzynkę odbiorczą")
+    command.add_argument('user_id', type=int)
+    command.set_defaults(handler=cmd_inbox)
+
+    command = commands.add_parser('mark-read', help="oznacz rozmowę jako przeczytaną")
+    command.add_argument('user_id', type=int)
+    command.add_argument('partner_id', type=int)
+    command.set_defaults(handler=cmd_mark_read)
+
+    command = commands.add_parser('search', help="szukaj w wiadomościach użytkownika")
+    command.add_argument('user_id', type=int)
+    command.add_argument('query')
+    command.add_argument('--limit', type=int, default=PAGE_SIZE)
+    command.set_defaults(handler=cmd_search)
+
+    command = commands.add_parser('run-script', help="wykonaj polecenia z pliku (po jednym w linii) lub ze stdin")
+    command.add_argument('file', nargs='?', default='-', help="plik ze skryptem ('-' - standardowe wejście)")
+    command.set_defaults(handler=None)
+    return parser
+
+
+def read_script(path):
+    """
+        Zwraca kolejne polecenia skryptu jako listy argumentów; pomija puste linie i komentarze (#).
+        Yields the script's commands as argument lists; skips blank lines and comments (#).
+        """
+    file = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for number, line in enumerate(file, 1):
+            try:
+                tokens = shlex.split(line, comments=True)
+            except ValueError as e:
+                yield number, None, str(e)
+                continue
+            if tokens:
+                yield number, tokens, None
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+class BatchRunner:
+    def __init__(self, connection, batch_size=BATCH_SIZE):
+        """
+        Initialize the execution of commands over one connection, batch_size commands per transaction.
+
+        :param connection: The database connection used for all commands.
+        :param int batch_size: Number of commands committed together.
+
+        Inicjalizuje wykonywanie poleceń na jednym połączeniu, po batch_size poleceń w transakcji.
+
+        :param connection: Połączenie z bazą danych używane przez wszystkie polecenia.
+        :param int batch_size: Liczba poleceń zatwierdzanych razem.
+        """
+        self.session = Session(connection)
+        self.batch_size = max(1, batch_size)
+        self.pending = 0  # Polecenia w bieżącej, niezatwierdzonej porcji
+        self.deferred = []  # (etykieta, polecenie, obiekt) polecenia odroczone, jeszcze niezapisane
+        self.commits = 0
+        self.errors = 0
+        self.timings = defaultdict(list)  # Nazwa polecenia -> czasy wykonania w sekundach
+
+    def __enter__(self):
+        self.session.begin()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.session.rollback()
+        finally:
+            self.session.close()
+        self.elapsed = time.perf_counter() - self.started
+
+    def report(self, label, command, error):
+        self.errors += 1
+        print(f"Błąd{f' ({label})' if label else ''}: {command}: {error}", file=sys.stderr)
+
+    def write_failed(self, error):
+        """
+        Roll back the current batch after it could not be committed; all its commands count as failed.
+
+        Wycofuje bieżącą porcję, gdy nie udało się jej zatwierdzić; wszystkie jej polecenia są liczone jako błędne.
+        """
+        self.session.rollback()
+        self.errors += self.pending
+        print(f"Błąd zapisu porcji, wycofano {self.pending} poleceń: {error}", file=sys.stderr)
+        self.pending = 0
+        self.deferred = []
+
+    def flush_deferred(self):
+        """
+        Write the objects of the deferred commands together. If that fails, write them again one by one,
+        each in its own savepoint, so that only the offending commands fail and are reported by their line.
+
+        Zapisuje razem obiekty poleceń odroczonych. Jeśli się to nie uda, zapisuje je ponownie pojedynczo,
+        każdy w osobnym punkcie zapisu, aby błąd zgłosiło i wycofało tylko polecenie, które go spowodowało.
+        """
+        if not self.deferred:
+            return
+        deferred, self.deferred = self.deferred, []
+        try:
+            with self.session.savepoint():
+                self.session.flush()
+            written = deferred
+        except Exception:
+            for _, _, obj in deferred:
+                self.session.delete(obj)
+            written = []
+            for label, command, obj in deferred:
+                self.session.add(obj)
+                try:
+                    with self.session.savepoint():
+                        self.session.flush()
+                except Exception as e:
+                    self.session.delete(obj)
+                    self.pending -= 1
+                    self.report(label, command, e)
+                else:
+                    written.append((label, command, obj))
+        for _, command, obj in written:
+            if DEFERRED_COMMANDS[command]:
+                print(DEFERRED_COMMANDS[command].format(obj))
+
+    def commit(self):
+        """Write the batch's changes in one round trip per table and commit them. / Zatwierdza porcję."""
+        if not self.pending:
+            return
+        start = time.perf_counter()
+        self.flush_deferred()
+        try:
+            self.session.commit()
+        except Exception as e:
+            self.write_failed(e)
+        else:
+            self.commits += 1
+            self.pending = 0
+        self.timings['(zatwierdzenie)'].append(time.perf_counter() - start)
+
+    def run(self, args, label=None):
+        """
+        Execute one parsed command; a failing command is undone alone, without losing the rest of its batch.
+        Commands that only register new objects in the session are written together by flush_deferred(),
+        before the next other command (so that it sees them) or at commit. The other commands run and
+        write their changes inside a savepoint.
+
+        Wykonuje jedno polecenie; błędne polecenie jest wycofywane samo, bez utraty reszty porcji.
+        Polecenia, które tylko rejestrują nowe obiekty w sesji, są zapisywane razem przez flush_deferred()
+        przed kolejnym innym poleceniem (aby je widziało) lub przy zatwierdzaniu. Pozostałe polecenia działają
+        i zapisują swoje zmiany w punkcie zapisu (SAVEPOINT).
+        """
+        start = time.perf_counter()
+        deferred = args.command in DEFERRED_COMMANDS
+        try:
+            if deferred:
+                obj = args.handler(self.session, args)
+            else:
+                self.flush_deferred()
+                with self.session.savepoint():
+                    args.handler(self.session, args)
+                    self.session.flush()
+        except Exception as e:
+            self.report(label, args.command, e)
+        else:
+            if deferred:
+                self.deferred.append((label, args.command, obj))
+            self.pending += 1
+        self.timings[args.command].append(time.perf_counter() - start)
+        if self.pending >= self.batch_size:
+            self.commit()
+
+    def run_script(self, parser, path):
+        for number, tokens, error in read_script(path):
+            label = f"linia {number}"
+            if error is None:
+                try:
+                    args = parser.parse_args(tokens)
+                except CommandError as e:
+                    error = str(e)
+            if error is None and args.handler is None:
+                error = "skrypt nie może uruchamiać kolejnego skryptu"
+            if error is not None:
+                self.errors += 1
+                print(f"Błąd ({label}): {error}", file=sys.stderr)
+                continue
+            self.run(args, label)
+
+    def summary(self):
+        """
+        Return the timing summary: per command count, total and mean time, then totals.
+
+        Zwraca podsumowanie czasów: liczbę, łączny i średni czas każdego polecenia oraz sumy.
+        """
+        lines = []
+        for command, times in sorted(self.timings.items()):
+            total = sum(times)
+            lines.append(f"{command:<15} {len(times):>8} x  łącznie {total:8.3f} s  "
+                         f"średnio {total / len(times) * 1000:8.3f} ms")
+        executed = sum(len(times) for command, times in self.timings.items() if command != '(zatwierdzenie)')
+        rate = executed / self.elapsed if self.elapsed else 0.0
+        lines.append(f"Poleceń: {executed}, błędów: {self.errors}, transakcji: {self.commits}, "
+                     f"czas: {self.elapsed:.3f} s ({rate:.0f} poleceń/s)")
+        return "\n".join(lines)
+
+
+def run_batch(argv):
+    """
+        Wykonuje polecenie (lub skrypt poleceń) podane w argumentach programu i wypisuje podsumowanie czasów.
+        Runs the command (or command script) given as program arguments and prints a timing summary.
+        """
+    args = build_parser().parse_args(argv)
+    with connect() as conn:
+        with BatchRunner(conn, args.batch_size) as runner:
+            if args.handler is None:
+                runner.run_script(build_parser(CommandParser), args.file)
+            else:
+                runner.run(args)
+    print(runner.summary(), file=sys.stderr)
+    return 1 if runner.errors else 0
 
 
 if __name__ == "__main__":
     """
-        Główny punkt wejścia do aplikacji. Wywołuje główne menu w pętli.
-        The main entry point of the application. Calls the main menu in a loop.
+        Główny punkt wejścia do aplikacji. Z argumentami działa w trybie wsadowym, bez nich wywołuje
+        główne menu w pętli.
+        The main entry point of the application. With arguments it runs in batch mode, without them
+        it calls the main menu in a loop.
         """
+    User.enable_cache(USER_CACHE_SIZE, USER_CACHE_TTL)
+    User.enable_missing_cache(MISSING_USERNAMES_SIZE, MISSING_USERNAMES_TTL)
+    if len(sys.argv) > 1:
+        sys.exit(run_batch(sys.argv[1:]))
     while True:
         main_menu()
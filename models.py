@@ -1,10 +1,144 @@
+import concurrent.futures
+import contextlib
 import hashlib
-import random
+import hmac
+import os
 import datetime
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from psycopg2.extras import execute_values
 
 # Определите ALPHABET где-то в начале файла/# Define ALPHABET at the beginning of the file
 ALPHABET = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
 
+# Liczba haseł hashowanych w jednym zadaniu puli procesów/Passwords hashed per process pool task
+DEFAULT_HASH_CHUNK = 5000
+
+# Poniżej tej liczby haseł koszt uruchomienia procesów przewyższa zysk/Below this, process start-up costs more
+PARALLEL_HASH_THRESHOLD = 20000
+
+# Liczba wierszy pobieranych naraz z kursora po stronie serwera/Rows fetched per round trip by server-side cursors
+DEFAULT_ITERSIZE = 2000
+
+# Domyślny rozmiar strony przy stronicowaniu/Default page size for keyset pagination
+DEFAULT_PAGE_SIZE = 20
+
+# Liczba wierszy w jednym wielowierszowym INSERT/UPDATE/Rows per multi-row INSERT/UPDATE statement
+DEFAULT_BATCH_SIZE = 1000
+
+_cursor_names = itertools.count()
+
+USER_COLUMNS = "id, username, hashed_password"
+MESSAGE_COLUMNS = "id, from_id, to_id, text, creation_date, read_at"
+
+# Zapytania wspólne dla modeli synchronicznych (models.py) i asynchronicznych (async_models.py)
+USER_INSERT_QUERY = "INSERT INTO users(username, hashed_password) VALUES(%s, %s) RETURNING id"
+USER_UPDATE_QUERY = "UPDATE users SET username=%s, hashed_password=%s WHERE id=%s"
+USER_BY_ID_QUERY = f"SELECT {USER_COLUMNS} FROM users WHERE id=%s"
+USER_BY_USERNAME_QUERY = f"SELECT {USER_COLUMNS} FROM users WHERE username=%s"
+ALL_USERS_QUERY = f"SELECT {USER_COLUMNS} FROM users"
+USER_DELETE_QUERY = "DELETE FROM users WHERE id=%s"
+MESSAGE_INSERT_QUERY = "INSERT INTO messages(from_id, to_id, text, creation_date) VALUES(%s, %s, %s, %s) RETURNING id"
+# messages jest partycjonowana po creation_date i nie ma indeksu na samym id: warunek "id=%s" sprawdza
+# indeks (id, creation_date) każdej partycji, a "id=%s AND creation_date=%s" tylko jednej
+MESSAGE_UPDATE_QUERY = ("UPDATE messages SET from_id=%s, to_id=%s, text=%s, creation_date=%s "
+                        "WHERE id=%s AND creation_date=%s")
+MESSAGE_BY_ID_QUERY = f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE id=%s"
+MESSAGE_BY_KEY_QUERY = f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE id=%s AND creation_date=%s"
+# Wiadomości odebrane po danym ID, z indeksu (to_id, id) - pobieranie tylko nowych wiadomości po powiadomieniu
+NEW_MESSAGES_QUERY = f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE to_id=%s AND id > %s ORDER BY id LIMIT %s"
+MESSAGES_BY_IDS_QUERY = f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE to_id=%s AND id = ANY(%s) ORDER BY id"
+
+
+def date_range_filter(since=None, until=None):
+    """
+    Build the creation_date condition of a message query.
+
+    A literal range on creation_date lets the planner skip the monthly partitions of messages
+    that cannot hold matching rows.
+
+    :param since: Lower bound (inclusive) or None.
+    :param until: Upper bound (exclusive) or None.
+    :rtype: str
+    :return: SQL fragment taking the since/until parameters, empty when neither bound is given.
+    """
+    condition = ""
+    if since is not None:
+        condition += " AND creation_date >= %(since)s"
+    if until is not None:
+        condition += " AND creation_date < %(until)s"
+    return condition
+
+
+def date_range_suffix(since=None, until=None):
+    """Return the prepared statement name suffix of a date range variant of a query."""
+    return ("_since" if since is not None else "") + ("_until" if until is not None else "")
+
+
+def user_messages_query(since=None, until=None):
+    """
+    Build the query for all messages sent or received by a user, optionally within a date range.
+
+    :rtype: str
+    :return: Query taking the user_id and (when the bounds are given) since/until parameters.
+    """
+    # Wiadomości wysłane i odebrane przez użytkownika jako dwa skany indeksów (from_id, ...) i (to_id, ...)
+    # połączone UNION ALL - warunek "from_id=%s OR to_id=%s" wymusza skan całej tabeli lub BitmapOr.
+    # Druga gałąź pomija wiadomości wysłane do samego siebie, które zwraca już pierwsza.
+    dates = date_range_filter(since, until)
+    return f"""SELECT {MESSAGE_COLUMNS} FROM messages WHERE from_id=%(user_id)s{dates}
+    UNION ALL
+    SELECT {MESSAGE_COLUMNS} FROM messages WHERE to_id=%(user_id)s AND from_id IS DISTINCT FROM %(user_id)s{dates}"""
+
+
+USER_MESSAGES_QUERY = user_messages_query()
+
+
+# Konfiguracja wyszukiwania pełnotekstowego (musi być zgodna z Creation_db/migrations.py)
+SEARCH_CONFIG = 'simple'
+
+# Wyszukiwanie w wiadomościach użytkownika: każda gałąź UNION ALL korzysta z indeksu GIN (from_id, text_tsv)
+# lub (to_id, text_tsv), więc przeglądane są tylko pasujące wiadomości tego użytkownika
+SEARCH_MESSAGES_QUERY = f"""SELECT {MESSAGE_COLUMNS} FROM (
+        SELECT {MESSAGE_COLUMNS}, text_tsv FROM messages
+        WHERE from_id=%(user_id)s AND text_tsv @@ websearch_to_tsquery('{SEARCH_CONFIG}', %(query)s)
+        UNION ALL
+        SELECT {MESSAGE_COLUMNS}, text_tsv FROM messages
+        WHERE to_id=%(user_id)s AND from_id IS DISTINCT FROM %(user_id)s
+          AND text_tsv @@ websearch_to_tsquery('{SEARCH_CONFIG}', %(query)s)
+    ) AS found
+    ORDER BY ts_rank(text_tsv, websearch_to_tsquery('{SEARCH_CONFIG}', %(query)s)) DESC,
+             creation_date DESC, id DESC
+    LIMIT %(limit)s"""
+
+
+def messages_page_query(after, since=None, until=None):
+    """
+    Build the keyset pagination query for a user's messages, newest first.
+
+    Each UNION ALL branch reads at most `limit` rows from its index in (creation_date, id) order,
+    so a page costs the same at any depth.
+
+    :param after: Key of the last message of the previous page, or None for the first page.
+    :param since: Lower bound (inclusive) of creation_date, or None.
+    :param until: Upper bound (exclusive) of creation_date, or None.
+    :rtype: str
+    :return: Query taking the user_id, limit and (when given) after_date/after_id and since/until parameters.
+    """
+    seek = " AND (creation_date, id) < (%(after_date)s, %(after_id)s)" if after is not None else ""
+    seek += date_range_filter(since, until)
+    return f"""SELECT {MESSAGE_COLUMNS} FROM (
+        (SELECT {MESSAGE_COLUMNS} FROM messages WHERE from_id=%(user_id)s{seek}
+         ORDER BY creation_date DESC, id DESC LIMIT %(limit)s)
+        UNION ALL
+        (SELECT {MESSAGE_COLUMNS} FROM messages
+         WHERE to_id=%(user_id)s AND from_id IS DISTINCT FROM %(user_id)s{seek}
+         ORDER BY creation_date DESC, id DESC LIMIT %(limit)s)
+    ) AS page ORDER BY creation_date DESC, id DESC LIMIT %(limit)s"""
+
 
 def hash_password(password, salt=None):
     """
@@ -70,8 +204,13 @@ def check_password(pass_to_check, hashed):
     # hash password with extracted salt
     new_hash = hash_password(pass_to_check, salt)
 
-    # compare hashes. If equal, return True
-    return new_hash[16:] == hash_to_check
+    # compare hashes in constant time. If equal, return True
+    return hmac.compare_digest(new_hash[16:], hash_to_check)
+
+
+# Hasło porównywane przy logowaniu na nieistniejącego użytkownika, aby czas odpowiedzi nie zdradzał,
+# czy nazwa istnieje
+DUMMY_HASH = hash_password('', 'a' * 16)
 
 
 def generate_salt():
@@ -81,14 +220,422 @@ def generate_salt():
     :rtype: str
     :return: str with generated salt
     """
-    salt = ""
-    for i in range(0, 16):
-        # get a random element from the iterable
-        salt += random.choice(ALPHABET)
-    return salt
+    return generate_salts(1)[0]
+
+
+def generate_salts(count):
+    """
+    Generates `count` 16-character random salts at once.
+
+    Random bytes are read from the OS in one call and mapped onto ALPHABET;
+    bytes that would make some characters more likely than others are skipped.
+
+    :param int count: number of salts to generate
+
+    :rtype: list
+    :return: list of str with generated salts
+    """
+    # 248 = 4 * len(ALPHABET): bajty >= 248 odrzucamy, aby każdy znak był równie prawdopodobny
+    limit = 256 - 256 % len(ALPHABET)
+    needed = 16 * count
+    chars = []
+    while len(chars) < needed:
+        chars.extend(ALPHABET[byte % len(ALPHABET)] for byte in os.urandom(needed - len(chars) + 16) if byte < limit)
+    salt_chars = ''.join(chars[:needed])
+    return [salt_chars[i:i + 16] for i in range(0, needed, 16)]
+
+
+def _hash_chunk(pairs):
+    return [hash_password(password, salt) for password, salt in pairs]
+
+
+def _check_chunk(pairs):
+    return [check_password(password, hashed) for password, hashed in pairs]
+
+
+def _map_in_chunks(function, items, workers, chunk_size):
+    """
+    Applies `function` to chunks of `items` in a process pool and joins the results in input order.
+    Runs in the current process when the input is small or workers == 1.
+    """
+    if workers == 1 or len(items) < PARALLEL_HASH_THRESHOLD:
+        return function(items)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return [result for chunk_result in executor.map(function, chunks) for result in chunk_result]
+
+
+def hash_passwords(passwords, salts=None, workers=None, chunk_size=DEFAULT_HASH_CHUNK):
+    """
+    Hashes many passwords at once, spreading the work over a process pool.
+
+    :param passwords: passwords to hash
+    :param salts: salts to use, one per password; generated in batch if not provided
+    :param int workers: number of processes, default os.cpu_count()
+    :param int chunk_size: passwords hashed per task
+
+    :rtype: list
+    :return: hashed passwords, in the same order as `passwords`
+    :raises ValueError: if `salts` is given and its length differs from that of `passwords`
+    """
+    passwords = list(passwords)
+    if salts is None:
+        salts = generate_salts(len(passwords))
+    else:
+        salts = list(salts)
+        if len(salts) != len(passwords):
+            # zip() obciąłby dłuższą listę - część haseł nie dostałaby hasha, a kolejne wiersze by się przesunęły
+            raise ValueError(f"Liczba soli ({len(salts)}) różni się od liczby haseł ({len(passwords)}).")
+    return _map_in_chunks(_hash_chunk, list(zip(passwords, salts)), workers, chunk_size)
+
+
+def check_passwords(pairs, workers=None, chunk_size=DEFAULT_HASH_CHUNK):
+    """
+    Checks many passwords at once, spreading the work over a process pool.
+
+    :param pairs: (pass_to_check, hashed) pairs
+    :param int workers: number of processes, default os.cpu_count()
+    :param int chunk_size: pairs checked per task
+
+    :rtype: list
+    :return: list of bool, True for each correct password, in input order
+    """
+    return _map_in_chunks(_check_chunk, list(pairs), workers, chunk_size)
+
+
+@contextlib.contextmanager
+def transaction(connection):
+    """
+    Run a block inside a single transaction, even on a connection in autocommit mode.
+
+    Commits on success, rolls back on error and restores the previous autocommit setting.
+    If the connection is already inside a transaction, the block simply joins it.
+
+    :param connection: The database connection.
+
+    Wykonuje blok w jednej transakcji, także na połączeniu w trybie autocommit.
+
+    Zatwierdza przy powodzeniu, wycofuje przy błędzie i przywraca poprzednie ustawienie autocommit.
+    Jeśli połączenie jest już w transakcji, blok po prostu do niej dołącza.
+
+    :param connection: Połączenie z bazą danych.
+    """
+    if not connection.autocommit:
+        yield connection
+        return
+    connection.autocommit = False
+    try:
+        yield connection
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.autocommit = True
+
+
+def execute_statement(cursor, name, query, values=None):
+    """
+    Execute a hot query through the connection's prepared statement registry, if it has one.
+
+    Connections from connection_db's pool carry a StatementCache that PREPAREs the query once per
+    connection and EXECUTEs it afterwards; any other connection runs the query as plain text.
+
+    :param cursor: The database cursor.
+    :param str name: Name of the prepared statement, unique per query text.
+    :param str query: The query with psycopg2 placeholders.
+    :param values: Query parameters.
+
+    Wykonuje gorące zapytanie przez rejestr przygotowanych zapytań połączenia, jeśli go ma.
+
+    Połączenia z puli connection_db mają StatementCache, który przygotowuje (PREPARE) zapytanie raz
+    na połączenie, a potem je wykonuje (EXECUTE); inne połączenia wysyłają zapytanie jako tekst.
+    """
+    statements = getattr(cursor.connection, 'statements', None)
+    if statements is None:
+        cursor.execute(query, values)
+    else:
+        statements.execute(cursor, name, query, values)
+
+
+def allocate_ids(cursor, table, count):
+    """
+    Reserve `count` values of a table's id sequence in one round trip.
+
+    Multi-row inserts take their IDs from here and insert them explicitly, because PostgreSQL does not
+    guarantee that INSERT ... RETURNING returns rows in the order of the VALUES list.
+
+    :param cursor: The database cursor.
+    :param str table: Table whose SERIAL id column's sequence is used.
+    :param int count: Number of IDs to reserve.
+    :rtype: list[int]
+
+    Rezerwuje `count` wartości sekwencji id tabeli w jednym zapytaniu.
+
+    Wielowierszowe INSERT biorą ID stąd i wstawiają je jawnie, bo PostgreSQL nie gwarantuje,
+    że INSERT ... RETURNING zwróci wiersze w kolejności listy VALUES.
+    """
+    cursor.execute(f"SELECT nextval(pg_get_serial_sequence('{table}', 'id')) FROM generate_series(1, %s)", (count,))
+    return [id_ for (id_,) in cursor.fetchall()]
+
+
+def iter_query(cursor, query, values=None, itersize=DEFAULT_ITERSIZE):
+    """
+    Execute a query on a named server-side cursor and yield rows as they arrive.
+
+    Only itersize rows are held in memory at a time. The server-side cursor needs a transaction,
+    so one is opened on the cursor's connection for the lifetime of the generator.
+
+    :param cursor: A database cursor; its connection is used to open the server-side cursor.
+    :param str query: The query to execute.
+    :param values: Query parameters.
+    :param int itersize: Number of rows fetched per round trip.
+
+    Wykonuje zapytanie na nazwanym kursorze po stronie serwera i zwraca wiersze w miarę ich napływu.
+
+    W pamięci trzymanych jest naraz tylko itersize wierszy. Kursor serwerowy wymaga transakcji,
+    więc na czas działania generatora otwierana jest transakcja na połączeniu kursora.
+    """
+    connection = cursor.connection
+    with transaction(connection):
+        with connection.cursor(name=f"iter_cursor_{next(_cursor_names)}") as server_cursor:
+            server_cursor.itersize = itersize
+            server_cursor.execute(query, values)
+            for row in server_cursor:
+                yield row
+
+
+class UserCache:
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+               Initialize an in-process identity map of users, bounded with LRU eviction.
+
+               :param int maxsize: Maximum number of cached users.
+               :param float ttl: Seconds after which an entry expires (default None - never).
+
+               Inicjalizuje mapę tożsamości użytkowników w pamięci procesu, ograniczoną z usuwaniem LRU.
+
+               :param int maxsize: Maksymalna liczba użytkowników w pamięci podręcznej.
+               :param float ttl: Po ilu sekundach wpis wygasa (domyślnie None - nigdy).
+               """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # id -> (User, czas wygaśnięcia lub None), najdawniej używane na początku
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(id_):
+        """
+               Normalize a user ID to the cache key (IDs typed by the user arrive as strings).
+
+               :return: The ID as int, or None if it is not a valid ID.
+
+               Normalizuje ID użytkownika do klucza (ID wpisane przez użytkownika są napisami).
+
+               :return: ID jako int lub None, jeśli nie jest poprawnym ID.
+               """
+        try:
+            return int(id_)
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, id_):
+        """
+               Return the cached user with the given ID, or None on a miss.
+
+               Zwraca użytkownika o danym ID z pamięci podręcznej lub None, jeśli go nie ma.
+               """
+        key = self.key(id_)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user):
+        """
+               Store a user under its ID, evicting the least recently used entry if the cache is full.
+
+               Zapisuje użytkownika pod jego ID, usuwając najdawniej używany wpis, gdy pamięć jest pełna.
+               """
+        key = self.key(user.id)
+        if key is None or key == -1:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (user, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, id_):
+        """
+               Remove the user with the given ID from the cache.
+
+               Usuwa użytkownika o danym ID z pamięci podręcznej.
+               """
+        with self._lock:
+            self._entries.pop(self.key(id_), None)
+
+    def clear(self):
+        """
+               Remove all entries and reset the counters.
+
+               Usuwa wszystkie wpisy i zeruje liczniki.
+               """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+               Return cache size and hit/miss counters.
+
+               :rtype: dict
+
+               Zwraca rozmiar pamięci podręcznej oraz liczniki trafień i chybień.
+
+               :rtype: dict
+               """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class MissingUsernames:
+    def __init__(self, maxsize=10000, ttl=30.0):
+        """
+               Initialize a negative cache of usernames known not to exist, bounded with LRU eviction.
+
+               Entries expire after ttl seconds, because users created by other processes are not seen here.
+               A discarded (just saved) username is not added again for ttl seconds: a lookup that started
+               before the save was committed may still report it missing.
+
+               :param int maxsize: Maximum number of remembered usernames.
+               :param float ttl: Seconds after which a username is looked up in the database again.
+
+               Inicjalizuje pamięć podręczną nieistniejących nazw użytkowników, ograniczoną z usuwaniem LRU.
+
+               Wpisy wygasają po ttl sekundach, bo użytkownicy dodani przez inne procesy nie są tu widoczni.
+               Nazwa usunięta przez discard (właśnie zapisana) nie jest ponownie dodawana przez ttl sekund:
+               wyszukiwanie rozpoczęte przed zatwierdzeniem zapisu może jeszcze zgłosić ją jako nieistniejącą.
+
+               :param int maxsize: Maksymalna liczba zapamiętanych nazw.
+               :param float ttl: Po ilu sekundach nazwa jest ponownie sprawdzana w bazie.
+               """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._expires = OrderedDict()  # nazwa -> czas wygaśnięcia, najdawniej używane na początku
+        self._saved = OrderedDict()  # nazwa właśnie zapisana -> do kiedy add() ją pomija, najstarsze na początku
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, username):
+        """
+               Tell whether the username is known to be missing; counts a hit or a miss.
+
+               Sprawdza, czy wiadomo, że nazwa nie istnieje; liczy trafienie lub chybienie.
+               """
+        with self._lock:
+            expires = self._expires.get(username)
+            if expires is not None and expires < time.monotonic():
+                del self._expires[username]
+                expires = None
+            if expires is None:
+                self.misses += 1
+                return False
+            self._expires.move_to_end(username)
+            self.hits += 1
+            return True
+
+    def add(self, username):
+        """
+               Remember a username that does not exist, evicting the least recently used one if full.
+
+               Zapamiętuje nieistniejącą nazwę, usuwając najdawniej używaną, gdy pamięć jest pełna.
+               """
+        with self._lock:
+            now = time.monotonic()
+            saved_until = self._saved.get(username)
+            if saved_until is not None:
+                if saved_until >= now:
+                    return  # Zapisana przed chwilą - wynik wyszukiwania mógł być nieaktualny
+                del self._saved[username]
+            self._expires[username] = now + self.ttl
+            self._expires.move_to_end(username)
+            while len(self._expires) > self.maxsize:
+                self._expires.popitem(last=False)
+
+    def discard(self, username):
+        """
+               Forget a username after a user with this name was saved; add() ignores it for ttl seconds.
+
+               Zapomina nazwę po zapisaniu użytkownika o tej nazwie; add() pomija ją przez ttl sekund.
+               """
+        with self._lock:
+            self._expires.pop(username, None)
+            self._saved[username] = time.monotonic() + self.ttl
+            self._saved.move_to_end(username)
+            while len(self._saved) > self.maxsize:
+                self._saved.popitem(last=False)
+
+    def clear(self):
+        """
+               Remove all entries and reset the counters.
+
+               Usuwa wszystkie wpisy i zeruje liczniki.
+               """
+        with self._lock:
+            self._expires.clear()
+            self._saved.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+               Return the number of remembered usernames and hit/miss counters.
+
+               :rtype: dict
+
+               Zwraca liczbę zapamiętanych nazw oraz liczniki trafień i chybień.
+
+               :rtype: dict
+               """
+        with self._lock:
+            return {
+                'size': len(self._expires),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
 
 
 class User:
+    # Pamięć podręczna użytkowników według ID; włączana przez User.enable_cache()
+    cache = None
+
+    # Nazwy użytkowników, których nie ma w bazie; włączana przez User.enable_missing_cache()
+    missing_usernames = None
+
+    # Stały zestaw atrybutów zamiast __dict__ - mniej pamięci na obiekt przy dużych listach
+    __slots__ = ('_id', 'username', '_hashed_password')
+
     def __init__(self, username="", password="", salt=""):
         """
                Initialize a new User instance.
@@ -107,6 +654,31 @@ class User:
         self.username = username
         self._hashed_password = hash_password(password, salt)
 
+    @classmethod
+    def from_row(cls, row):
+        """
+               Builds a User from a database row without hashing a password.
+
+               Used by every load_* method: the stored hash is taken as is, so no salt is generated
+               and no SHA-256 is computed for rows that already have one.
+
+               :param tuple row: The (id, username, hashed_password) row.
+               :return: Returns the loaded User instance.
+               :rtype: User
+
+               Tworzy Użytkownika z wiersza bazy danych bez hashowania hasła.
+
+               Używana przez wszystkie metody load_*: zapisany hash jest przyjmowany bez zmian, więc dla
+               wierszy z bazy nie jest generowana sól ani liczony SHA-256.
+
+               :param tuple row: Wiersz (id, username, hashed_password).
+               :return: Zwraca załadowaną instancję Użytkownika.
+               :rtype: User
+               """
+        user = cls.__new__(cls)
+        user._id, user.username, user._hashed_password = row
+        return user
+
     @property
     def id(self):
         """
@@ -180,24 +752,171 @@ class User:
                 :return: Zwraca True, jeśli operacja się powiodła.
                 :rtype: bool
                 """
-        if self._id == -1:
-            query = """INSERT INTO users(username, hashed_password)
-                            VALUES(%s, %s) RETURNING id"""
-            values = (self.username, self.hashed_password)
-            cursor.execute(query, values)
-            self._id = cursor.fetchone()[0]  # or cursor.fetchone()['id']
-            return True
-        else:
-            query = """UPDATE Users SET username=%s, hashed_password=%s
-                           WHERE id=%s"""
-            values = (self.username, self.hashed_password, self.id)
-            cursor.execute(query, values)
-            return True
+        try:
+            if self._id == -1:
+                values = (self.username, self.hashed_password)
+                execute_statement(cursor, 'user_insert', USER_INSERT_QUERY, values)
+                self._id = cursor.fetchone()[0]  # or cursor.fetchone()['id']
+            else:
+                values = (self.username, self.hashed_password, self.id)
+                execute_statement(cursor, 'user_update', USER_UPDATE_QUERY, values)
+        except BaseException:
+            # Obiekt mógł zostać zmieniony w pamięci, ale nie w bazie - nie trzymaj go w pamięci podręcznej
+            if User.cache is not None:
+                User.cache.invalidate(self._id)
+            raise
+        if User.cache is not None:
+            User.cache.put(self)
+        if User.missing_usernames is not None:
+            User.missing_usernames.discard(self.username)
+        return True
+
+    @classmethod
+    def enable_cache(cls, maxsize=1024, ttl=None):
+        """
+                Turns on the identity-map cache consulted by load_user_by_id.
+
+                The cache is kept coherent with writes made through save_to_db, save_many and delete
+                in this process; use ttl to bound staleness caused by other processes.
+
+                :param int maxsize: Maximum number of cached users.
+                :param float ttl: Seconds after which an entry expires (default None - never).
+                :return: Returns the cache, e.g. to read its stats().
+                :rtype: UserCache
+
+                Włącza pamięć podręczną (mapę tożsamości) używaną przez load_user_by_id.
+
+                Pamięć jest spójna z zapisami przez save_to_db, save_many i delete w tym procesie;
+                ttl ogranicza nieaktualność wynikającą ze zmian z innych procesów.
+
+                :param int maxsize: Maksymalna liczba użytkowników w pamięci podręcznej.
+                :param float ttl: Po ilu sekundach wpis wygasa (domyślnie None - nigdy).
+                :return: Zwraca pamięć podręczną, np. aby odczytać jej stats().
+                :rtype: UserCache
+                """
+        cls.cache = UserCache(maxsize, ttl)
+        return cls.cache
+
+    @classmethod
+    def disable_cache(cls):
+        """
+                Turns off the identity-map cache.
+
+                Wyłącza pamięć podręczną użytkowników.
+                """
+        cls.cache = None
+
+    @classmethod
+    def enable_missing_cache(cls, maxsize=10000, ttl=30.0):
+        """
+                Turns on the negative cache consulted by load_user_by_username.
+
+                Usernames not found in the database are remembered for ttl seconds, so repeated lookups
+                of missing names (typos, brute-force logins) do not reach the database. A username is
+                forgotten as soon as a user with that name is saved through save_to_db or save_many.
+
+                :param int maxsize: Maximum number of remembered usernames.
+                :param float ttl: Seconds after which a missing username is looked up again.
+                :return: Returns the cache, e.g. to read its stats().
+                :rtype: MissingUsernames
+
+                Włącza pamięć podręczną nieistniejących nazw używaną przez load_user_by_username.
+
+                Nazwy nieznalezione w bazie są pamiętane przez ttl sekund, więc powtarzane wyszukiwania
+                nieistniejących nazw (literówki, próby zgadywania haseł) nie trafiają do bazy. Nazwa jest
+                zapominana, gdy tylko użytkownik o tej nazwie zostanie zapisany przez save_to_db lub save_many.
+
+                :param int maxsize: Maksymalna liczba zapamiętanych nazw.
+                :param float ttl: Po ilu sekundach nieistniejąca nazwa jest ponownie sprawdzana.
+                :return: Zwraca pamięć podręczną, np. aby odczytać stats().
+                :rtype: MissingUsernames
+                """
+        cls.missing_usernames = MissingUsernames(maxsize, ttl)
+        return cls.missing_usernames
+
+    @classmethod
+    def disable_missing_cache(cls):
+        """
+                Turns off the negative cache of usernames.
+
+                Wyłącza pamięć podręczną nieistniejących nazw.
+                """
+        cls.missing_usernames = None
+
+    @staticmethod
+    def save_many(cursor, users, page_size=DEFAULT_BATCH_SIZE, update_cache=True):
+        """
+                Saves many users in batched multi-row statements, inside one transaction.
+
+                New users (ID -1) get IDs reserved from the sequence in one query (allocate_ids) and are
+                inserted with them by INSERT ... VALUES; the others are updated with a single
+                UPDATE ... FROM (VALUES ...) per batch. If anything fails, the transaction is rolled back
+                and new users keep ID -1.
+
+                :param cursor: The database cursor.
+                :param users: The users to save.
+                :param int page_size: Number of rows per statement.
+                :param bool update_cache: Store the saved users in User.cache; False only removes them from it,
+                    for callers that commit later, so that the cache never holds uncommitted values.
+                :return: Returns True if the operation was successful.
+                :rtype: bool
+
+                Zapisuje wielu użytkowników wielowierszowymi poleceniami, w jednej transakcji.
+
+                Nowi użytkownicy (ID -1) dostają ID zarezerwowane z sekwencji jednym zapytaniem (allocate_ids)
+                i są z nimi wstawiani przez INSERT ... VALUES; pozostali są aktualizowani jednym
+                UPDATE ... FROM (VALUES ...) na porcję.
+                W razie błędu transakcja jest wycofywana, a nowi użytkownicy zachowują ID -1.
+
+                :param cursor: Kursor bazy danych.
+                :param users: Użytkownicy do zapisania.
+                :param int page_size: Liczba wierszy na polecenie.
+                :param bool update_cache: Zapisz użytkowników w User.cache; False tylko usuwa ich z pamięci
+                    podręcznej - dla wywołujących, którzy zatwierdzają później, aby nie trafiły tam
+                    niezatwierdzone dane.
+                :return: Zwraca True, jeśli operacja się powiodła.
+                :rtype: bool
+                """
+        new_users = [user for user in users if user._id == -1]
+        existing_users = [user for user in users if user._id != -1]
+        try:
+            with transaction(cursor.connection):
+                if new_users:
+                    for user, id_ in zip(new_users, allocate_ids(cursor, 'users', len(new_users))):
+                        user._id = id_
+                    execute_values(cursor, "INSERT INTO users(id, username, hashed_password) VALUES %s",
+                                   [(user._id, user.username, user._hashed_password) for user in new_users],
+                                   page_size=page_size)
+                if existing_users:
+                    execute_values(cursor, """UPDATE users
+                                              SET username=data.username, hashed_password=data.hashed_password
+                                              FROM (VALUES %s) AS data(id, username, hashed_password)
+                                              WHERE users.id = data.id""",
+                                   [(user._id, user.username, user._hashed_password) for user in existing_users],
+                                   template="(%s::integer, %s, %s)", page_size=page_size)
+        except BaseException:
+            if User.cache is not None:
+                for user in existing_users:
+                    User.cache.invalidate(user._id)
+            for user in new_users:
+                user._id = -1
+            raise
+        if User.cache is not None:
+            for user in users:
+                if update_cache:
+                    User.cache.put(user)
+                else:
+                    User.cache.invalidate(user._id)
+        if User.missing_usernames is not None:
+            for user in users:
+                User.missing_usernames.discard(user.username)
+        return True
 
     @staticmethod
     def load_user_by_id(cursor, id_):
         """
                Loads a user from the database by the user ID.
+               If the cache is enabled (User.enable_cache), a cached user is returned without a query.
 
                :param cursor: The database cursor.
                :param int id_: The ID of the user to load.
@@ -205,22 +924,91 @@ class User:
                :rtype: User or None
 
                Ładuje użytkownika z bazy danych po ID użytkownika.
+               Jeśli pamięć podręczna jest włączona (User.enable_cache), zwraca użytkownika z niej bez zapytania.
 
                :param cursor: Kursor bazy danych.
                :param int id_: ID użytkownika do załadowania.
                :return: Zwraca instancję Użytkownika jeśli znajdzie, w przeciwnym razie None.
                :rtype: User or None
                """
-        query = "SELECT id, username, hashed_password FROM users WHERE id=%s"
-        cursor.execute(query, (id_,))  # (id_, ) - cause we need a tuple
+        if User.cache is not None:
+            cached_user = User.cache.get(id_)
+            if cached_user is not None:
+                return cached_user
+        execute_statement(cursor, 'user_by_id', USER_BY_ID_QUERY, (id_,))  # (id_, ) - cause we need a tuple
         data = cursor.fetchone()
         if data:
-            id_, username, hashed_password = data
-            loaded_user = User(username)
-            loaded_user._id = id_
-            loaded_user._hashed_password = hashed_password
+            loaded_user = User.from_row(data)
+            if User.cache is not None:
+                User.cache.put(loaded_user)
             return loaded_user
 
+    @staticmethod
+    def load_user_by_username(cursor, username):
+        """
+               Loads a user from the database by username, using the UNIQUE index on users.username.
+
+               A username remembered as missing (User.enable_missing_cache) returns None without a query;
+               a found user is also stored in the ID cache (User.enable_cache).
+
+               :param cursor: The database cursor.
+               :param str username: The username of the user to load.
+               :return: Returns the loaded User instance or None if not found.
+               :rtype: User or None
+
+               Wczytuje użytkownika z bazy danych według nazwy, korzystając z indeksu UNIQUE na users.username.
+
+               Nazwa zapamiętana jako nieistniejąca (User.enable_missing_cache) zwraca None bez zapytania;
+               znaleziony użytkownik trafia też do pamięci podręcznej według ID (User.enable_cache).
+
+               :param cursor: Kursor bazy danych.
+               :param str username: Nazwa użytkownika do wczytania.
+               :return: Zwraca wczytaną instancję Użytkownika lub None, jeśli nie znaleziono.
+               :rtype: User or None
+               """
+        missing = User.missing_usernames
+        if missing is not None and username in missing:
+            return None
+        execute_statement(cursor, 'user_by_username', USER_BY_USERNAME_QUERY, (username,))
+        data = cursor.fetchone()
+        if data is None:
+            if missing is not None:
+                missing.add(username)
+            return None
+        loaded_user = User.from_row(data)
+        if User.cache is not None:
+            User.cache.put(loaded_user)
+        return loaded_user
+
+    @staticmethod
+    def authenticate(cursor, username, password):
+        """
+               Checks a login: loads the user by username and verifies the password. A missing user is
+               checked against DUMMY_HASH, so the response time does not tell whether the username exists.
+
+               :param cursor: The database cursor.
+               :param str username: The username given at login.
+               :param str password: The password given at login.
+               :return: Returns the User if the username exists and the password is correct, otherwise None.
+               :rtype: User or None
+
+               Sprawdza logowanie: wczytuje użytkownika według nazwy i weryfikuje hasło. Dla nieistniejącego
+               użytkownika hasło jest sprawdzane z DUMMY_HASH, aby czas odpowiedzi nie zdradzał, czy nazwa istnieje.
+
+               :param cursor: Kursor bazy danych.
+               :param str username: Nazwa podana przy logowaniu.
+               :param str password: Hasło podane przy logowaniu.
+               :return: Zwraca Użytkownika, jeśli nazwa istnieje i hasło jest poprawne, w przeciwnym razie None.
+               :rtype: User or None
+               """
+        user = User.load_user_by_username(cursor, username)
+        if user is None:
+            check_password(password, DUMMY_HASH)  # Ten sam koszt co dla istniejącej nazwy
+            return None
+        if not check_password(password, user.hashed_password):
+            return None
+        return user
+
     @staticmethod
     def load_all_users(cursor):
         """
@@ -236,17 +1024,65 @@ class User:
                :return: Zwraca listę instancji Użytkowników.
                :rtype: list of User
                """
-        query = "SELECT id, username, hashed_password FROM Users"
-        users = []
-        cursor.execute(query)
-        for row in cursor.fetchall():
-            id_, username, hashed_password = row
-            loaded_user = User()
-            loaded_user._id = id_
-            loaded_user.username = username
-            loaded_user._hashed_password = hashed_password
-            users.append(loaded_user)
-        return users
+        cursor.execute(ALL_USERS_QUERY)
+        return [User.from_row(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def iter_all_users(cursor, itersize=DEFAULT_ITERSIZE):
+        """
+               Iterates over all users using a server-side cursor, in constant memory.
+
+               :param cursor: The database cursor.
+               :param int itersize: Number of rows fetched from the server per round trip.
+               :return: Yields User instances one by one.
+               :rtype: Iterator[User]
+
+               Iteruje po wszystkich użytkownikach kursorem po stronie serwera, w stałej pamięci.
+
+               :param cursor: Kursor bazy danych.
+               :param int itersize: Liczba wierszy pobieranych z serwera naraz.
+               :return: Zwraca kolejno instancje Użytkowników.
+               :rtype: Iterator[User]
+               """
+        for row in iter_query(cursor, ALL_USERS_QUERY, itersize=itersize):
+            yield User.from_row(row)
+
+    @staticmethod
+    def load_users_page(cursor, after=None, limit=DEFAULT_PAGE_SIZE):
+        """
+               Loads one page of users ordered by ID, using keyset pagination.
+
+               The page starts right after the user with ID `after`, so the cost of fetching a page does not
+               depend on how deep into the list it is (no OFFSET). Pass the ID of the last user of a page to get
+               the next one.
+
+               :param cursor: The database cursor.
+               :param int after: ID of the last user of the previous page, None for the first page.
+               :param int limit: Maximum number of users on the page.
+               :return: Returns a list of at most `limit` User instances.
+               :rtype: list of User
+
+               Ładuje jedną stronę użytkowników uporządkowanych po ID, stronicując po kluczu.
+
+               Strona zaczyna się tuż za użytkownikiem o ID `after`, więc koszt pobrania strony nie zależy od tego,
+               jak daleko jest na liście (bez OFFSET). Aby pobrać następną stronę, podaj ID ostatniego użytkownika.
+
+               :param cursor: Kursor bazy danych.
+               :param int after: ID ostatniego użytkownika poprzedniej strony, None dla pierwszej strony.
+               :param int limit: Maksymalna liczba użytkowników na stronie.
+               :return: Zwraca listę co najwyżej `limit` instancji Użytkowników.
+               :rtype: list of User
+               """
+        if after is None:
+            name = 'users_page_first'
+            query = "SELECT id, username, hashed_password FROM users ORDER BY id LIMIT %s"
+            values = (limit,)
+        else:
+            name = 'users_page_next'
+            query = "SELECT id, username, hashed_password FROM users WHERE id > %s ORDER BY id LIMIT %s"
+            values = (after, limit)
+        execute_statement(cursor, name, query, values)
+        return [User.from_row(row) for row in cursor.fetchall()]
 
     def delete(self, cursor):
         """
@@ -262,13 +1098,19 @@ class User:
               :return: Zwraca True, jeśli użytkownik został pomyślnie usunięty.
               :rtype: bool
               """
-        query = "DELETE FROM Users WHERE id=%s"
-        cursor.execute(query, (self.id,))
+        if User.cache is not None:
+            User.cache.invalidate(self._id)
+        execute_statement(cursor, 'user_delete', USER_DELETE_QUERY, (self.id,))
         self._id = -1
         return True
 
 
 class Message:
+    # Stały zestaw atrybutów zamiast __dict__ - mniej pamięci na obiekt przy dużych skrzynkach.
+    # _stored_date: creation_date zapisana w bazie - kieruje UPDATE po id do jednej partycji, także gdy
+    # creation_date zmieniono w pamięci
+    __slots__ = ('_id', 'from_id', 'to_id', 'text', 'creation_date', 'read_at', '_stored_date')
+
     def __init__(self, from_id, to_id, text, creation_date=None):
         """
                Initializes a new instance of the Message class.
@@ -291,6 +1133,27 @@ class Message:
         self.to_id = to_id
         self.text = text
         self.creation_date = creation_date if creation_date else datetime.datetime.now()
+        self.read_at = None  # Kiedy odbiorca przeczytał wiadomość (None - nieprzeczytana)
+        self._stored_date = None
+
+    @classmethod
+    def from_row(cls, row):
+        """
+               Builds a Message from a database row.
+
+               EN: Takes the stored creation date as is instead of calling datetime.now() first, as __init__ does.
+               PL: Przyjmuje zapisaną datę utworzenia bez wcześniejszego wywołania datetime.now(), jak robi __init__.
+
+               :param row: The (id, from_id, to_id, text, creation_date, read_at) row.
+               :type row: tuple
+
+               :rtype: Message
+               :return: The loaded message.
+               """
+        message = cls.__new__(cls)
+        message._id, message.from_id, message.to_id, message.text, message.creation_date, message.read_at = row
+        message._stored_date = message.creation_date
+        return message
 
     @property
     def id(self):
@@ -319,48 +1182,147 @@ class Message:
                :return: True if the message was saved successfully, False otherwise.
                """
         if self._id == -1:
-            query = """INSERT INTO messages(from_id, to_id, text, creation_date)
-                     VALUES(%s, %s, %s, %s) RETURNING id"""
             values = (self.from_id, self.to_id, self.text, self.creation_date)
-            cursor.execute(query, values)
+            execute_statement(cursor, 'message_insert', MESSAGE_INSERT_QUERY, values)
             self._id = cursor.fetchone()[0]
-            return True
         else:
-            query = """UPDATE messages SET from_id=%s, to_id=%s, text=%s, creation_date=%s
-                      WHERE id=%s"""
-            values = (self.from_id, self.to_id, self.text, self.creation_date, self._id)
-            cursor.execute(query, values)
-            return True
+            values = (self.from_id, self.to_id, self.text, self.creation_date, self._id, self._stored_date)
+            execute_statement(cursor, 'message_update', MESSAGE_UPDATE_QUERY, values)
+        self._stored_date = self.creation_date
+        return True
 
     @staticmethod
-    def load_message_by_id(cursor, id_):
+    def save_many(cursor, messages, page_size=DEFAULT_BATCH_SIZE):
+        """
+               Saves many messages in batched multi-row statements, inside one transaction.
+
+               EN: Reserves IDs for new messages (ID -1) from the sequence in one query (allocate_ids) and inserts
+               them with INSERT ... VALUES; updates the others with one UPDATE ... FROM (VALUES ...) per batch.
+               On error the transaction is rolled back and new messages keep ID -1.
+               PL: Rezerwuje ID dla nowych wiadomości (ID -1) z sekwencji jednym zapytaniem (allocate_ids) i wstawia
+               je przez INSERT ... VALUES; pozostałe aktualizuje jednym UPDATE ... FROM (VALUES ...) na porcję.
+               W razie błędu transakcja jest wycofywana, a nowe wiadomości zachowują ID -1.
+
+               :param cursor: The database cursor to use for the operation.
+               :param messages: The messages to save.
+               :param page_size: Number of rows per statement.
+               :type cursor: cursor
+               :type messages: list[Message]
+               :type page_size: int
+
+               :rtype: bool
+               :return: True if the messages were saved successfully.
+               """
+        new_messages = [message for message in messages if message._id == -1]
+        existing_messages = [message for message in messages if message._id != -1]
+        try:
+            with transaction(cursor.connection):
+                if new_messages:
+                    for message, id_ in zip(new_messages, allocate_ids(cursor, 'messages', len(new_messages))):
+                        message._id = id_
+                    execute_values(cursor, """INSERT INTO messages(id, from_id, to_id, text, creation_date)
+                                              VALUES %s""",
+                                   [(message._id, message.from_id, message.to_id, message.text, message.creation_date)
+                                    for message in new_messages],
+                                   template="(%s::integer, %s::integer, %s::integer, %s, %s::timestamp)",
+                                   page_size=page_size)
+                if existing_messages:
+                    execute_values(cursor, """UPDATE messages SET from_id=data.from_id, to_id=data.to_id,
+                                              text=data.text, creation_date=data.creation_date
+                                              FROM (VALUES %s) AS data(id, stored_date, from_id, to_id, text,
+                                                                       creation_date)
+                                              WHERE messages.id = data.id
+                                                AND messages.creation_date = data.stored_date""",
+                                   [(message._id, message._stored_date, message.from_id, message.to_id, message.text,
+                                     message.creation_date) for message in existing_messages],
+                                   template="(%s::integer, %s::timestamp, %s::integer, %s::integer, %s, %s::timestamp)",
+                                   page_size=page_size)
+        except BaseException:
+            for message in new_messages:
+                message._id = -1
+            raise
+        for message in messages:
+            message._stored_date = message.creation_date
+        return True
+
+    @staticmethod
+    def load_message_by_id(cursor, id_, creation_date=None):
         """
                Loads a message by its identifier.
 
-               EN: Retrieves a message from the database using its unique identifier.
-               PL: Pobiera wiadomość z bazy danych za pomocą jej unikalnego identyfikatora.
+               EN: Retrieves a message from the database using its unique identifier. With the creation date
+               only one monthly partition of messages is read; without it every partition's index is checked.
+               PL: Pobiera wiadomość z bazy danych za pomocą jej unikalnego identyfikatora. Z datą utworzenia
+               czytana jest tylko jedna miesięczna partycja messages; bez niej sprawdzany jest indeks każdej partycji.
 
                :param cursor: The database cursor to use for the query.
                :param id_: The unique identifier of the message to retrieve.
+               :param creation_date: The creation date of the message, if known.
 
                :type cursor: cursor
                :type id_: int
+               :type creation_date: datetime or None
 
                :rtype: Message or None
                :return: The loaded message if found, None otherwise.
                """
-        query = "SELECT id, from_id, to_id, text, creation_date FROM messages WHERE id=%s"
-        cursor.execute(query, (id_,))
+        if creation_date is not None:
+            execute_statement(cursor, 'message_by_key', MESSAGE_BY_KEY_QUERY, (id_, creation_date))
+        else:
+            execute_statement(cursor, 'message_by_id', MESSAGE_BY_ID_QUERY, (id_,))
         data = cursor.fetchone()
         if data:
-            id_, from_id, to_id, text, creation_date = data
-            loaded_message = Message(from_id, to_id, text, creation_date)
-            loaded_message._id = id_
-            return loaded_message
+            return Message.from_row(data)
         return None
 
     @staticmethod
-    def load_all_messages(cursor, user_id):
+    def load_new_messages(cursor, user_id, after_id, limit=DEFAULT_BATCH_SIZE):
+        """
+                Loads messages received by a user with an ID greater than after_id, oldest first.
+
+                EN: Reads only the new part of the inbox through the (to_id, id) index, instead of the whole history.
+                PL: Czyta tylko nową część skrzynki przez indeks (to_id, id), zamiast całej historii.
+
+                :param cursor: The database cursor to use for the query.
+                :param user_id: The ID of the recipient.
+                :param after_id: ID of the last message already seen.
+                :param limit: Maximum number of messages returned.
+                :type cursor: cursor
+                :type user_id: int
+                :type after_id: int
+                :type limit: int
+
+                :rtype: list[Message]
+                :return: At most `limit` messages, in ID order.
+                """
+        execute_statement(cursor, 'messages_new', NEW_MESSAGES_QUERY, (user_id, after_id, limit))
+        return [Message.from_row(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def load_messages_by_ids(cursor, user_id, ids):
+        """
+                Loads the messages with the given IDs received by a user, in ID order.
+
+                EN: Looks every ID up in the (to_id, id) index; IDs of messages that do not exist (any more)
+                or were sent to someone else are skipped.
+                PL: Wyszukuje każde ID w indeksie (to_id, id); ID wiadomości nieistniejących (już) lub wysłanych
+                do kogoś innego są pomijane.
+
+                :param cursor: The database cursor to use for the query.
+                :param user_id: The ID of the recipient.
+                :param ids: IDs of the messages.
+                :type cursor: cursor
+                :type user_id: int
+                :type ids: list[int]
+
+                :rtype: list[Message]
+                :return: The messages found, in ID order.
+                """
+        execute_statement(cursor, 'messages_by_ids', MESSAGES_BY_IDS_QUERY, (user_id, list(ids)))
+        return [Message.from_row(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def load_all_messages(cursor, user_id, since=None, until=None):
         """
                 Loads all messages for a given user from the database.
 
@@ -369,19 +1331,198 @@ class Message:
 
                 :param cursor: The database cursor to use for the query.
                 :param user_id: The ID of the user whose messages to retrieve.
+                :param since: Only messages created at or after this time, None for no lower bound.
+                :param until: Only messages created before this time, None for no upper bound.
                 :type cursor: cursor
                 :type user_id: int
+                :type since: datetime or None
+                :type until: datetime or None
 
                 :rtype: list[Message]
                 :return: A list of all loaded messages for the given user.
                 """
-        query = "SELECT id, from_id, to_id, text, creation_date FROM messages WHERE from_id=%s OR to_id=%s"
-        messages = []
-        cursor.execute(query, (user_id, user_id))
-        for row in cursor.fetchall():
-            id_, from_id, to_id, text, creation_date = row
-            loaded_message = Message(from_id, to_id, text, creation_date)
-            loaded_message._id = id_
-            messages.append(loaded_message)
-        return messages
+        values = {'user_id': user_id, 'since': since, 'until': until}
+        execute_statement(cursor, 'user_messages' + date_range_suffix(since, until),
+                          user_messages_query(since, until), values)
+        return [Message.from_row(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def iter_messages(cursor, user_id, itersize=DEFAULT_ITERSIZE, since=None, until=None):
+        """
+                Iterates over all messages of a given user using a server-side cursor.
+
+                EN: Yields Message objects as rows arrive from the server, keeping only itersize rows in memory.
+                PL: Zwraca obiekty Message w miarę napływu wierszy z serwera, trzymając w pamięci tylko
+                itersize wierszy.
+
+                :param cursor: The database cursor to use for the query.
+                :param user_id: The ID of the user whose messages to retrieve.
+                :param itersize: Number of rows fetched from the server per round trip.
+                :param since: Only messages created at or after this time, None for no lower bound.
+                :param until: Only messages created before this time, None for no upper bound.
+                :type cursor: cursor
+                :type user_id: int
+                :type itersize: int
+                :type since: datetime or None
+                :type until: datetime or None
+
+                :rtype: Iterator[Message]
+                :return: An iterator over the messages of the given user.
+                """
+        values = {'user_id': user_id, 'since': since, 'until': until}
+        for row in iter_query(cursor, user_messages_query(since, until), values, itersize):
+            yield Message.from_row(row)
+
+    @staticmethod
+    def load_messages_page(cursor, user_id, after=None, limit=DEFAULT_PAGE_SIZE, since=None, until=None):
+        """
+                Loads one page of a user's messages, newest first, using keyset pagination.
+
+                EN: Returns messages older than the `after` key (creation_date, id) in descending order. Pass
+                Message.page_key() of the last message of a page to get the next one. Unlike OFFSET, the cost of
+                a page does not grow with its depth.
+                PL: Zwraca wiadomości starsze niż klucz `after` (creation_date, id) w kolejności malejącej. Aby
+                pobrać następną stronę, podaj Message.page_key() ostatniej wiadomości. W odróżnieniu od OFFSET koszt
+                strony nie rośnie wraz z jej numerem.
+
+                :param cursor: The database cursor to use for the query.
+                :param user_id: The ID of the user whose messages to retrieve.
+                :param after: Key (creation_date, id) of the last message of the previous page, None for the first page.
+                :param limit: Maximum number of messages on the page.
+                :param since: Only messages created at or after this time, None for no lower bound.
+                :param until: Only messages created before this time, None for no upper bound.
+                :type cursor: cursor
+                :type user_id: int
+                :type after: tuple or None
+                :type limit: int
+                :type since: datetime or None
+                :type until: datetime or None
+
+                :rtype: list[Message]
+                :return: A list of at most `limit` messages.
+                """
+        values = {'user_id': user_id, 'limit': limit, 'since': since, 'until': until}
+        if after is not None:
+            values['after_date'], values['after_id'] = after
+        name = ('messages_page_first' if after is None else 'messages_page_next') + date_range_suffix(since, until)
+        execute_statement(cursor, name, messages_page_query(after, since, until), values)
+        return [Message.from_row(row) for row in cursor.fetchall()]
+
+    def page_key(self):
+        """
+                EN: Returns the keyset pagination key of this message.
+                PL: Zwraca klucz stronicowania tej wiadomości.
+
+                :rtype: tuple
+                :return: The (creation_date, id) pair to pass as `after` to load_messages_page.
+                """
+        return self.creation_date, self._id
 
+    @staticmethod
+    def search(cursor, user_id, query, limit=DEFAULT_PAGE_SIZE):
+        """
+                Searches the text of messages sent or received by a user.
+
+                EN: Uses the full-text index on messages.text_tsv; results are ranked by relevance (ts_rank),
+                then newest first. The query accepts web search syntax: words, "quoted phrases", OR and -excluded.
+                PL: Korzysta z indeksu pełnotekstowego messages.text_tsv; wyniki są uporządkowane według trafności
+                (ts_rank), a potem od najnowszych. Zapytanie przyjmuje składnię wyszukiwarek: słowa, "frazy",
+                OR i -wykluczenia.
+
+                :param cursor: The database cursor to use for the query.
+                :param user_id: The ID of the user whose messages to search.
+                :param query: The text to search for.
+                :param limit: Maximum number of results.
+                :type cursor: cursor
+                :type user_id: int
+                :type query: str
+                :type limit: int
+
+                :rtype: list[Message]
+                :return: The best matching messages, at most `limit`.
+                """
+        values = {'user_id': user_id, 'query': query, 'limit': limit}
+        execute_statement(cursor, 'messages_search', SEARCH_MESSAGES_QUERY, values)
+        return [Message.from_row(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def mark_read(cursor, user_id, partner_id):
+        """
+                Marks all unread messages from a conversation partner as read.
+
+                EN: Sets read_at on the user's unread messages from partner_id and decreases the conversation's
+                unread counter by the number of marked messages, in one statement.
+                PL: Ustawia read_at nieprzeczytanym wiadomościom od partner_id i zmniejsza licznik nieprzeczytanych
+                rozmowy o liczbę oznaczonych wiadomości, w jednym poleceniu.
+
+                :param cursor: The database cursor to use for the operation.
+                :param user_id: The ID of the recipient.
+                :param partner_id: The ID of the sender whose messages are marked as read.
+                :type cursor: cursor
+                :type user_id: int
+                :type partner_id: int
+
+                :rtype: int
+                :return: The number of messages marked as read.
+                """
+        query = """WITH marked AS (
+                       UPDATE messages SET read_at = CURRENT_TIMESTAMP
+                       WHERE to_id=%(user_id)s AND from_id=%(partner_id)s AND read_at IS NULL
+                       RETURNING 1
+                   ), counted AS (
+                       SELECT count(*) AS n FROM marked
+                   ), updated AS (
+                       UPDATE conversations SET unread_count = GREATEST(unread_count - (SELECT n FROM counted), 0)
+                       WHERE user_id=%(user_id)s AND partner_id=%(partner_id)s
+                   )
+                   SELECT n FROM counted"""
+        execute_statement(cursor, 'messages_mark_read', query, {'user_id': user_id, 'partner_id': partner_id})
+        return cursor.fetchone()[0]
+
+
+class Conversation:
+    # Wiersz podsumowania skrzynki odbiorczej: jedna rozmowa użytkownika z jednym rozmówcą
+    __slots__ = ('user_id', 'partner_id', 'last_message_id', 'last_from_id', 'last_text', 'last_date',
+                 'unread_count')
+
+    @classmethod
+    def from_row(cls, row):
+        """
+               Builds a Conversation from a row of the conversations table.
+
+               EN: The conversations table is maintained by triggers on messages, so it is only ever read here.
+               PL: Tabela conversations jest utrzymywana przez wyzwalacze na messages, więc tu jest tylko czytana.
+
+               :param row: The (user_id, partner_id, last_message_id, last_from_id, last_text, last_date,
+                           unread_count) row.
+               :type row: tuple
+
+               :rtype: Conversation
+               :return: The loaded conversation.
+               """
+        conversation = cls.__new__(cls)
+        (conversation.user_id, conversation.partner_id, conversation.last_message_id, conversation.last_from_id,
+         conversation.last_text, conversation.last_date, conversation.unread_count) = row
+        return conversation
+
+    @staticmethod
+    def load_inbox(cursor, user_id):
+        """
+                Loads the inbox of a user: one entry per conversation partner, most recent first.
+
+                EN: Reads the incrementally maintained summary, so the cost depends on the number of conversations,
+                not on the number of messages.
+                PL: Czyta przyrostowo utrzymywane podsumowanie, więc koszt zależy od liczby rozmów, a nie wiadomości.
+
+                :param cursor: The database cursor to use for the query.
+                :param user_id: The ID of the user whose inbox to load.
+                :type cursor: cursor
+                :type user_id: int
+
+                :rtype: list[Conversation]
+                :return: The user's conversations with last message, its date and unread count.
+                """
+        query = """SELECT user_id, partner_id, last_message_id, last_from_id, last_text, last_date, unread_count
+                   FROM conversations WHERE user_id=%s ORDER BY last_date DESC, last_message_id DESC"""
+        execute_statement(cursor, 'conversations_inbox', query, (user_id,))
+        return [Conversation.from_row(row) for row in cursor.fetchall()]
@@ -0,0 +1,179 @@
+"""Real-time delivery of new messages with LISTEN/NOTIFY.
+
+Every insert into messages sends, at commit, a notification on the channel inbox_<to_id> whose payload
+lists the IDs of the inserted messages (trigger from migration 8). An InboxSubscriber LISTENs on the
+channel of one user, waits for notifications without polling the database, and fetches exactly the
+notified messages by ID. IDs are assigned at insert but become visible at commit, so a message with a
+smaller ID can be committed after one with a larger ID; fetching by the notified IDs does not depend on
+that order. Messages committed while nobody listened are picked up by the catch-up query for IDs above
+the newest one seen, run on entering and every RECONCILE_INTERVAL seconds.
+
+    with connect() as conn:
+        with InboxSubscriber(conn, user_id) as subscriber:
+            for message in subscriber.listen():
+                print(message.text)
+
+Dostarczanie nowych wiadomości w czasie rzeczywistym przez LISTEN/NOTIFY. Każde wstawienie do messages
+wysyła przy zatwierdzeniu powiadomienie na kanale inbox_<to_id> z ID wstawionych wiadomości; subskrybent
+czeka na powiadomienia bez odpytywania bazy i pobiera dokładnie te wiadomości po ID, więc nie gubi
+wiadomości zatwierdzonych w innej kolejności niż kolejność ID.
+"""
+import select
+import time
+
+from models import Message, DEFAULT_BATCH_SIZE
+
+# Co ile sekund subskrybent dodatkowo sprawdza wiadomości o ID większym niż ostatnio widziane - zabezpieczenie
+# na wypadek powiadomień, które nie dotarły (np. wiadomości wstawione przed LISTEN)
+RECONCILE_INTERVAL = 60.0
+
+
+def inbox_channel(user_id):
+    """Return the name of the notification channel of a user's inbox."""
+    return f"inbox_{int(user_id)}"
+
+
+class InboxSubscriber:
+    def __init__(self, connection, user_id, last_seen_id=None):
+        """
+        Initialize a subscription to new messages received by a user.
+
+        :param connection: A connection in autocommit mode used only by this subscriber while it is open.
+        :param int user_id: The recipient whose inbox is watched.
+        :param int last_seen_id: ID of the last message the client has already seen; None starts from now.
+
+        Inicjalizuje subskrypcję nowych wiadomości odbieranych przez użytkownika.
+
+        :param connection: Połączenie w trybie autocommit, używane tylko przez tego subskrybenta, gdy jest otwarty.
+        :param int user_id: Odbiorca, którego skrzynka jest obserwowana.
+        :param int last_seen_id: ID ostatniej wiadomości, którą klient już widział; None - od teraz.
+        """
+        self.connection = connection
+        self.user_id = int(user_id)
+        self.last_seen_id = last_seen_id
+        self.cursor = None
+        self._notified = set()  # ID z powiadomień, jeszcze niepobrane
+        self._caught_up = set()  # ID zwrócone przez zapytanie doganiające, których powiadomienie może jeszcze nadejść
+        self._reconcile_at = 0.0  # Chwila (time.monotonic) następnego zapytania doganiającego
+
+    def __enter__(self):
+        """
+        LISTEN on the user's channel, then fix the starting point, so that every message committed
+        afterwards is notified.
+
+        Rozpoczyna nasłuch (LISTEN) na kanale użytkownika, a dopiero potem ustala punkt startowy,
+        aby każda wiadomość zatwierdzona później została zgłoszona powiadomieniem.
+        """
+        self.cursor = self.connection.cursor()
+        self.cursor.execute(f"LISTEN {inbox_channel(self.user_id)}")
+        if self.last_seen_id is None:
+            self.cursor.execute("SELECT coalesce(max(id), 0) FROM messages WHERE to_id=%s", (self.user_id,))
+            self.last_seen_id = self.cursor.fetchone()[0]
+        self._reconcile_at = 0.0
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Stop listening, so that the connection can go back to the pool without pending notifications.
+
+        Kończy nasłuch, aby połączenie mogło wrócić do puli bez oczekujących powiadomień.
+        """
+        try:
+            if not self.connection.closed:
+                self.cursor.execute(f"UNLISTEN {inbox_channel(self.user_id)}")
+                self.connection.notifies.clear()
+        finally:
+            self.cursor.close()
+            self.cursor = None
+
+    def fetch_new(self, limit=DEFAULT_BATCH_SIZE):
+        """
+        Fetch the messages received since the last call, in ID order: when the reconcile interval has
+        passed, first those with an ID above the newest one seen, then the notified ones by ID.
+
+        :param int limit: Maximum number of messages fetched at once; call again while it is reached.
+        :rtype: list[Message]
+
+        Pobiera wiadomości odebrane od poprzedniego wywołania, w kolejności ID: po upływie RECONCILE_INTERVAL
+        najpierw te o ID większym niż ostatnio widziane, potem zgłoszone powiadomieniami (po ID).
+        """
+        self._collect()
+        messages = []
+        if time.monotonic() >= self._reconcile_at:
+            messages = Message.load_new_messages(self.cursor, self.user_id, self.last_seen_id, limit)
+            for message in messages:
+                if message.id in self._notified:
+                    self._notified.discard(message.id)
+                else:
+                    self._caught_up.add(message.id)  # Powiadomienie o niej może jeszcze nadejść
+            if len(messages) == limit:
+                # Nie wszystko dogonione: ID powyżej ostatnio widzianego muszą przyjść po kolei, więc
+                # powiadomienia zaczekają na następne wywołanie
+                self.last_seen_id = messages[-1].id
+                return messages
+            self._reconcile_at = time.monotonic() + RECONCILE_INTERVAL
+        if self._notified and len(messages) < limit:
+            ids = sorted(self._notified)[:limit - len(messages)]
+            self._notified.difference_update(ids)
+            messages = sorted(messages + Message.load_messages_by_ids(self.cursor, self.user_id, ids),
+                              key=lambda message: message.id)
+        if messages:
+            self.last_seen_id = max(self.last_seen_id, messages[-1].id)
+        return messages
+
+    def _collect(self):
+        """Move the IDs from the notifications received on the user's channel to the set to fetch;
+        return whether any notification arrived."""
+        channel = inbox_channel(self.user_id)
+        arrived = False
+        for notify in self.connection.notifies:
+            if notify.channel != channel:
+                continue
+            arrived = True
+            for id_ in (int(part) for part in notify.payload.split(',') if part):
+                if id_ in self._caught_up:
+                    self._caught_up.discard(id_)  # Już zwrócona przez zapytanie doganiające
+                elif id_ > 0:
+                    self._notified.add(id_)
+        self.connection.notifies.clear()
+        return arrived
+
+    def wait(self, timeout=None):
+        """
+        Wait for a notification on the user's channel.
+
+        :param float timeout: Seconds to wait; None waits until a notification arrives.
+        :return: True if a notification arrived, False on timeout.
+        :rtype: bool
+
+        Czeka na powiadomienie na kanale użytkownika.
+        """
+        while True:
+            self.connection.poll()
+            if self._collect() or self._notified:
+                return True
+            if select.select([self.connection], [], [], timeout) == ([], [], []):
+                return False
+
+    def listen(self, timeout=None):
+        """
+        Yield new messages as they arrive. With a timeout, stops after `timeout` seconds without messages.
+
+        Zwraca nowe wiadomości w miarę ich nadejścia. Z timeout kończy po `timeout` sekundach bez wiadomości.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            messages = self.fetch_new()
+            yield from messages
+            now = time.monotonic()
+            if messages:
+                if timeout is not None:
+                    deadline = now + timeout
+                continue  # Mogło być więcej niż limit - pobierz resztę przed czekaniem
+            if deadline is not None and now >= deadline:
+                return
+            # Czekaj na powiadomienie, najdłużej do następnego zapytania doganiającego lub do końca timeout
+            wait = self._reconcile_at - now
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            self.wait(max(0.0, wait))
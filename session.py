@@ -0,0 +1,354 @@
+"""Unit of work for User and Message objects.
+
+A Session runs in one explicit transaction on one connection. It records the new, changed and
+deleted objects and writes them at flush: one batched save_many per table for the new and changed
+objects and one DELETE ... WHERE id = ANY(...) per table for the deleted ones. commit() flushes and
+commits, so any number of writes costs a single commit instead of one per save_to_db in autocommit.
+
+    with connect() as conn:
+        with Session(conn) as session:
+            session.add(User("alice", "secret"))
+            user = session.get(User, 7)    # a private copy, never the instance from User.cache
+            user.username = "bob"          # changed objects are found by comparing snapshots
+            session.delete(session.get(Message, 12))
+        # commit on leaving the block, rollback on error
+
+flush() compares only the objects obtained through get() or add() since the previous flush, so
+flushing before every command of a long batch stays linear; commit() compares every tracked object.
+New objects get their IDs at flush, so a new message cannot yet refer to a user added in the same
+flush; flush() first when it needs the user's ID.
+
+savepoint() undoes, on error, only the changes made inside its block - both in the database and in
+the session's bookkeeping - so one failing step does not cost the whole transaction.
+
+Jednostka pracy dla obiektów User i Message: sesja działa w jednej jawnej transakcji, zapamiętuje
+nowe, zmienione i usunięte obiekty i zapisuje je przy flush() zbiorczo, po jednym poleceniu na tabelę.
+"""
+import contextlib
+
+from models import User, Message, DEFAULT_BATCH_SIZE, USER_BY_ID_QUERY, execute_statement, transaction
+
+# Pola porównywane przy wykrywaniu zmian; zapisywane przez save_many danej klasy
+SNAPSHOT_FIELDS = {
+    User: ('username', '_hashed_password'),
+    Message: ('from_id', 'to_id', 'text', 'creation_date'),
+}
+
+# Kolejność zapisu: użytkownicy przed wiadomościami (klucze obce), usuwanie w odwrotnej kolejności
+FLUSH_ORDER = (User, Message)
+
+# Usuwanie wiadomości po samym id sprawdza indeks (id, creation_date) każdej miesięcznej partycji messages -
+# jedno wyszukiwanie w indeksie na partycję, akceptowalne przy zbiorczym DELETE raz na flush()
+DELETE_QUERIES = {
+    User: "DELETE FROM users WHERE id = ANY(%s)",
+    Message: "DELETE FROM messages WHERE id = ANY(%s)",
+}
+
+
+def load_user(cursor, id_):
+    """Load a user by ID past User.cache: the session changes its objects before commit, so it must not
+    share them with other readers of the cache."""
+    execute_statement(cursor, 'user_by_id', USER_BY_ID_QUERY, (id_,))
+    row = cursor.fetchone()
+    return User.from_row(row) if row else None
+
+
+LOADERS = {
+    User: load_user,
+    Message: Message.load_message_by_id,
+}
+
+
+def model_of(obj):
+    """Return the model class (User or Message) an object is persisted as."""
+    for model in FLUSH_ORDER:
+        if isinstance(obj, model):
+            return model
+    raise TypeError(f"Sesja obsługuje tylko obiekty User i Message, nie {type(obj).__name__}.")
+
+
+def snapshot(obj):
+    return tuple(getattr(obj, field) for field in SNAPSHOT_FIELDS[model_of(obj)])
+
+
+class Session:
+    def __init__(self, connection, page_size=DEFAULT_BATCH_SIZE):
+        """
+        Initialize a unit of work on a connection.
+
+        :param connection: The database connection; the session switches it to an explicit transaction.
+        :param int page_size: Number of rows per statement at flush.
+
+        Inicjalizuje jednostkę pracy na połączeniu.
+
+        :param connection: Połączenie z bazą danych; sesja przełącza je na jawną transakcję.
+        :param int page_size: Liczba wierszy na polecenie przy zapisie.
+        """
+        self.connection = connection
+        self.page_size = page_size
+        self.cursor = None
+        self._autocommit = None
+        self._new = {model: [] for model in FLUSH_ORDER}
+        self._clean = {}  # (model, id) -> (obiekt, migawka pól z chwili ostatniego zapisu lub odczytu)
+        self._deleted = {model: {} for model in FLUSH_ORDER}  # id -> obiekt
+        self._touched = set()  # Klucze z _clean pobrane przez get() lub add() od ostatniego flush()
+        self._flushed_new = []  # Obiekty wstawione w bieżącej transakcji - przy rollback wracają do ID -1
+        self._flushed_deleted = []  # (obiekt, id) usunięte w bieżącej transakcji - przy rollback odzyskują ID
+        # (wiadomość, zapisana data) zmienione w bieżącej transakcji - przy rollback odzyskują datę
+        self._flushed_dates = []
+        self._savepoints = []  # Otwarte punkty zapisu, od najstarszego; każdy z dziennikiem zmian _clean
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self.close()
+
+    def begin(self):
+        """Switch the connection to an explicit transaction and open the session's cursor."""
+        if self.cursor is None:
+            self._autocommit = self.connection.autocommit
+            self.connection.autocommit = False
+            self.cursor = self.connection.cursor()
+
+    def close(self):
+        """Close the cursor and restore the connection's autocommit setting. Pending changes are dropped."""
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
+            self.connection.autocommit = self._autocommit
+
+    def add(self, obj):
+        """
+        Register a new object for insertion, or start tracking changes of a loaded one.
+
+        Rejestruje nowy obiekt do wstawienia albo zaczyna śledzić zmiany obiektu wczytanego.
+        """
+        model = model_of(obj)
+        if obj.id == -1:
+            if not any(pending is obj for pending in self._new[model]):
+                self._new[model].append(obj)
+        else:
+            self._deleted[model].pop(obj.id, None)
+            if (model, obj.id) not in self._clean:
+                self._track((model, obj.id), (obj, snapshot(obj)))
+            self._touch((model, obj.id))
+        return obj
+
+    def get(self, model, id_):
+        """
+        Load a User or Message by ID and track it; an object already in the session is returned as is.
+
+        Wczytuje User lub Message według ID i śledzi go; obiekt już obecny w sesji jest zwracany bez zapytania.
+        """
+        tracked = self._clean.get((model, int(id_)))
+        if tracked is not None:
+            self._touch((model, int(id_)))
+            return tracked[0]
+        if int(id_) in self._deleted[model]:
+            return None
+        obj = LOADERS[model](self.cursor, id_)
+        return self.add(obj) if obj is not None else None
+
+    def delete(self, obj):
+        """
+        Mark an object for deletion; a new object that was never flushed is simply forgotten.
+
+        Oznacza obiekt do usunięcia; nowy, jeszcze niezapisany obiekt jest po prostu pomijany.
+        """
+        model = model_of(obj)
+        if obj.id == -1:
+            self._new[model] = [pending for pending in self._new[model] if pending is not obj]
+            return
+        self._track((model, obj.id), None)
+        self._deleted[model][obj.id] = obj
+
+    def _track(self, key, tracked):
+        """Set (or with None remove) the tracked state of a key, journaling the old one for savepoint()."""
+        if self._savepoints:
+            frame = self._savepoints[-1]
+            frame['journal'].append((key, self._clean.get(key)))
+            frame['keys'].add(key)
+        if tracked is None:
+            self._clean.pop(key, None)
+        else:
+            self._clean[key] = tracked
+
+    def _touch(self, key):
+        self._touched.add(key)
+        if self._savepoints:
+            self._savepoints[-1]['keys'].add(key)
+
+    @contextlib.contextmanager
+    def savepoint(self):
+        """
+        Run a block inside a SAVEPOINT. On error the database changes of the block are rolled back, and so
+        is the session: objects added or deleted in the block are pending again as before it, objects
+        inserted by a flush in the block get ID -1 back, and objects obtained in the block stop being
+        tracked, since their in-memory changes cannot be undone - get() them again. Flush before the block
+        to keep earlier changes of those objects. Savepoints may be nested.
+
+        Wykonuje blok w punkcie zapisu (SAVEPOINT). Przy błędzie wycofuje zmiany bloku w bazie i w sesji:
+        obiekty dodane lub usunięte w bloku wracają do stanu sprzed niego, obiekty wstawione w bloku
+        odzyskują ID -1, a obiekty pobrane w bloku przestają być śledzone. Punkty zapisu można zagnieżdżać.
+        """
+        name = f"session_{len(self._savepoints)}"
+        frame = {
+            'new': {model: list(objs) for model, objs in self._new.items()},
+            'deleted': {model: dict(objs) for model, objs in self._deleted.items()},
+            'touched': set(self._touched),
+            'flushed': (len(self._flushed_new), len(self._flushed_deleted), len(self._flushed_dates)),
+            'journal': [],  # (klucz, poprzedni stan w _clean lub None)
+            'keys': set(),  # Klucze pobrane, dodane lub zmienione w bloku
+        }
+        self.cursor.execute(f"SAVEPOINT {name}")
+        self._savepoints.append(frame)
+        try:
+            yield self
+        except BaseException:
+            self._savepoints.pop()
+            self.cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            self.cursor.execute(f"RELEASE SAVEPOINT {name}")
+            self._undo(frame)
+            raise
+        self._savepoints.pop()
+        self.cursor.execute(f"RELEASE SAVEPOINT {name}")
+        if self._savepoints:
+            outer = self._savepoints[-1]
+            outer['journal'].extend(frame['journal'])
+            outer['keys'] |= frame['keys']
+
+    def _undo(self, frame):
+        """Restore the session's bookkeeping to the start of a savepoint rolled back by savepoint()."""
+        for key, tracked in reversed(frame['journal']):
+            if tracked is None:
+                self._clean.pop(key, None)
+            else:
+                self._clean[key] = tracked
+        for key in frame['keys']:
+            self._clean.pop(key, None)
+        self._new = frame['new']
+        self._deleted = frame['deleted']
+        self._touched = frame['touched'] - frame['keys']
+        new_mark, deleted_mark, dates_mark = frame['flushed']
+        for obj in self._flushed_new[new_mark:]:
+            obj._id = -1
+        for obj, id_ in self._flushed_deleted[deleted_mark:]:
+            obj._id = id_
+        for obj, stored_date in reversed(self._flushed_dates[dates_mark:]):
+            obj._stored_date = stored_date
+        del self._flushed_new[new_mark:]
+        del self._flushed_deleted[deleted_mark:]
+        del self._flushed_dates[dates_mark:]
+        if self._savepoints:
+            # Obiekty przestały być śledzone także z punktu widzenia zewnętrznego punktu zapisu
+            self._savepoints[-1]['keys'] |= frame['keys']
+
+    def dirty(self, model, keys=None):
+        """Return the tracked objects of a model changed since they were loaded or last flushed;
+        with `keys`, only those (model, id) keys are compared."""
+        if keys is None:
+            keys = self._clean
+        changed = []
+        for key in keys:
+            tracked = self._clean.get(key)
+            if key[0] is model and tracked is not None and snapshot(tracked[0]) != tracked[1]:
+                changed.append(tracked[0])
+        return changed
+
+    @property
+    def pending(self):
+        """Whether flush() may have something to write: new or deleted objects, or objects obtained
+        through get() or add() since the last flush. Cheap - no snapshots are compared."""
+        return any(self._new.values()) or any(self._deleted.values()) or bool(self._touched)
+
+    def flush(self):
+        """
+        Write the pending changes in the current transaction, without committing.
+
+        EN: Per table, new and changed objects are saved with one save_many and deleted objects are removed
+        with one DELETE ... WHERE id = ANY(...). Only objects obtained through get() or add() since the last
+        flush are compared for changes; commit() compares all of them. If a statement fails, the transaction
+        is aborted: call rollback().
+        PL: Dla każdej tabeli nowe i zmienione obiekty są zapisywane jednym save_many, a usunięte jednym
+        DELETE ... WHERE id = ANY(...). Zmiany są szukane tylko w obiektach pobranych przez get() lub add()
+        od ostatniego flush(); commit() porównuje wszystkie. Jeśli polecenie się nie powiedzie, transakcja
+        jest przerwana: wywołaj rollback().
+        """
+        self._flush(self._touched)
+
+    def _flush(self, keys):
+        with transaction(self.connection):
+            for model in FLUSH_ORDER:
+                new, dirty = self._new[model], self.dirty(model, keys)
+                if new or dirty:
+                    if model is Message:
+                        self._flushed_dates.extend((obj, obj._stored_date) for obj in dirty)
+                        model.save_many(self.cursor, new + dirty, self.page_size)
+                    else:
+                        # Do pamięci podręcznej trafiają dopiero zatwierdzone dane - tu tylko unieważnienie
+                        model.save_many(self.cursor, new + dirty, self.page_size, update_cache=False)
+                    self._flushed_new.extend(new)
+                    for obj in new + dirty:
+                        self._track((model, obj.id), (obj, snapshot(obj)))
+                    self._new[model] = []
+            for model in reversed(FLUSH_ORDER):
+                deleted = self._deleted[model]
+                if not deleted:
+                    continue
+                self.cursor.execute(DELETE_QUERIES[model], (list(deleted),))
+                for id_, obj in deleted.items():
+                    if model is User and User.cache is not None:
+                        User.cache.invalidate(id_)
+                    self._flushed_deleted.append((obj, id_))
+                    obj._id = -1
+                self._deleted[model] = {}
+            self._touched = set()
+
+    def commit(self):
+        """
+        Flush pending changes and commit them in one transaction. The session then stops tracking
+        the committed objects; get() or add() them again to make further changes.
+
+        Zapisuje zmiany i zatwierdza je w jednej transakcji. Zatwierdzone obiekty przestają być śledzone.
+        """
+        self._flush(None)
+        self.connection.commit()
+        self._flushed_new = []
+        self._flushed_deleted = []
+        self._flushed_dates = []
+        self._clean = {}
+        self._touched = set()
+
+    def rollback(self):
+        """
+        Roll back the transaction and forget pending changes.
+
+        Objects inserted in this transaction get ID -1 back and deleted ones their old IDs. User.cache
+        needs no clearing: the session never stores uncommitted users in it.
+
+        Wycofuje transakcję i porzuca niezapisane zmiany. Obiekty wstawione w tej transakcji wracają do ID -1,
+        a usunięte odzyskują dawne ID.
+        """
+        self.connection.rollback()
+        for obj in self._flushed_new:
+            obj._id = -1
+        for obj, id_ in self._flushed_deleted:
+            obj._id = id_
+        for obj, stored_date in reversed(self._flushed_dates):
+            obj._stored_date = stored_date
+        self._flushed_new = []
+        self._flushed_deleted = []
+        self._flushed_dates = []
+        self._new = {model: [] for model in FLUSH_ORDER}
+        self._deleted = {model: {} for model in FLUSH_ORDER}
+        self._clean = {}
+        self._touched = set()
+        self._savepoints = []